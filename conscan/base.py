@@ -34,9 +34,9 @@
 
 from molmod import PairSearchIntra, Rotation
 
-from interface import ProgressMessage
+from interface import QualityEvaluator, ProgressMessage, PartialResults
 
-import math, numpy, copy
+import math, numpy, copy, multiprocessing, heapq
 
 
 __all__ = ["Scanner"]
@@ -56,13 +56,75 @@ class EmptyGeometry(Exception):
     pass
 
 
+# The scanner that is used by the worker processes in a parallel scan. It is
+# assigned before the process pool is created, such that each (forked) worker
+# inherits a copy of it.
+_worker_scanner = None
+
+
+def _init_worker():
+    # The workers must not write to the pipe of the parent process.
+    _worker_scanner.send = lambda message: None
+
+
+def _compare_environments_shard(ids1):
+    scanner = _worker_scanner
+    scanner.connections = []
+    environments2 = scanner.geometry2.environments
+    for id1 in ids1:
+        environment1 = scanner.geometry1.environments[id1]
+        for environment2 in environments2.itervalues():
+            scanner.compare_environments(environment1, environment2)
+    return len(ids1), scanner.connections
+
+
+class BestQualities(object):
+    """Keeps track of the best qualities of at most size distinct connections.
+
+    The connections are identified by a key. When a key is added twice, only
+    the best quality is retained. Outdated entries in the heap are discarded
+    lazily.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.qualities = {}
+        self.heap = []
+
+    def add(self, key, quality):
+        """Add a quality, returns True when the best qualities have changed"""
+        current = self.qualities.get(key)
+        if current is not None and current >= quality:
+            return False
+        self.qualities[key] = quality
+        heapq.heappush(self.heap, (quality, key))
+        while len(self.qualities) > self.size:
+            worst_quality, worst_key = heapq.heappop(self.heap)
+            if self.qualities.get(worst_key) == worst_quality:
+                del self.qualities[worst_key]
+        while len(self.heap) > 0 and self.qualities.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.qualities.get(key) == quality
+
+    def get_qualities(self):
+        return sorted(self.qualities.itervalues(), reverse=True)
+
+    def get_threshold(self):
+        if len(self.qualities) < self.size:
+            return None
+        else:
+            return self.heap[0][0]
+
+
 class Scanner(object):
-    def __init__(self, send, geometry1, geometry2, action_radius, hit_tolerance):
+    def __init__(self, send, geometry1, geometry2, action_radius, hit_tolerance, num_processes=1, max_results=None, min_quality=None):
         self.send = send
         self.geometry1 = geometry1
         self.geometry2 = geometry2
         self.action_radius = action_radius
         self.hit_tolerance = hit_tolerance
+        self.num_processes = num_processes
+        self.max_results = max_results
+        self.min_quality = min_quality
 
         self.egoscan = (geometry2 is None)
         if self.egoscan:
@@ -79,6 +141,8 @@ class Scanner(object):
         self.eliminate_duplicate_connections()
         # send them to the parent process
         self.connections.sort(key=(lambda c: -c.quality))
+        if self.max_results is not None:
+            del self.connections[self.max_results:]
         maximum = len(self.connections)
         for progress, connection in enumerate(self.connections):
             self.send(ProgressMessage("send_con", progress, maximum))
@@ -127,6 +191,10 @@ class Scanner(object):
                 env.distances = numpy.array(env.distances)
                 env.neighbors = numpy.array(env.neighbors)
                 env.directions = (env.deltas.transpose() / (env.distances + (env.distances == 0.0))).transpose()
+                # sorted distance index, used to find matching distances with
+                # a binary search
+                env.distance_order = env.distances.argsort()
+                env.sorted_distances = env.distances[env.distance_order]
 
             return environments
 
@@ -169,6 +237,10 @@ class Scanner(object):
     def compare_environments_pairwise(self):
         #self.output("     Number of environment comparisons: %i\n" % (len(self.geometrys[0].environment) * len(self.geometrys[1].environment)))
 
+        if self.num_processes > 1:
+            self.compare_environments_parallel()
+            return
+
         environments1 = self.geometry1.environments
         environments2 = self.geometry2.environments
         maximum = len(environments1)
@@ -181,6 +253,33 @@ class Scanner(object):
         #self.output("     Number of accepted triangles: %i\n" % len(self.connections))
         #self.output("     Average of accepted triangles per environment-pair: %.2f\n" % (len(self.connections) / (len(self.geometrys[0].environment) * len(self.geometrys[1].environment))))
 
+    def compare_environments_parallel(self):
+        # The environments of geometry1 are divided in shards that are
+        # processed by a pool of worker processes. The shards are small enough
+        # to get a reasonable load balancing and a smooth progress report. The
+        # results are merged in the same order as in the serial algorithm.
+        global _worker_scanner
+        ids1 = list(self.geometry1.environments.iterkeys())
+        maximum = len(ids1)
+        shard_size = max(1, maximum/(self.num_processes*8))
+        shards = [ids1[i:i+shard_size] for i in xrange(0, maximum, shard_size)]
+
+        self.send(ProgressMessage("comp_env", 0, maximum))
+        _worker_scanner = self
+        try:
+            pool = multiprocessing.Pool(self.num_processes, _init_worker)
+            try:
+                progress = 0
+                for size, connections in pool.imap(_compare_environments_shard, shards):
+                    self.connections.extend(connections)
+                    progress += size
+                    self.send(ProgressMessage("comp_env", progress, maximum))
+            finally:
+                pool.close()
+                pool.join()
+        finally:
+            _worker_scanner = None
+
     def compare_environments(self, environment1, environment2):
         raise NotImplementedError
 
@@ -205,15 +304,55 @@ class Scanner(object):
     def evaluate_connections(self):
         maximum = len(self.connections)
         if maximum > 0:
-            for progress, connection in enumerate(self.connections):
-                self.send(ProgressMessage("eval_con", progress, maximum))
-                connection.compute_quality(self.geometry1, self.geometry2)
+            quality_evaluator = QualityEvaluator(self.geometry1, self.geometry2)
+            if self.max_results is None and self.min_quality is None:
+                for progress, connection in enumerate(self.connections):
+                    self.send(ProgressMessage("eval_con", progress, maximum))
+                    quality_evaluator.compute_quality(connection)
+            else:
+                self.evaluate_best_connections(quality_evaluator)
         self.send(ProgressMessage("eval_con", maximum, maximum))
 
+    def evaluate_best_connections(self, quality_evaluator):
+        # Only the connections that can still make it into the final results
+        # are retained. The threshold is the minimum quality, or the quality of
+        # the worst of the max_results best distinct connections found so far.
+        # The quality evaluation of a connection is aborted as soon as it can
+        # no longer reach this threshold.
+        if self.max_results is not None:
+            best_qualities = BestQualities(self.max_results)
+        retained = []
+        maximum = len(self.connections)
+        for progress, connection in enumerate(self.connections):
+            self.send(ProgressMessage("eval_con", progress, maximum))
+            threshold = self.min_quality
+            if self.max_results is not None:
+                best_threshold = best_qualities.get_threshold()
+                if threshold is None or (best_threshold is not None and best_threshold > threshold):
+                    threshold = best_threshold
+            if quality_evaluator.compute_quality(connection, threshold):
+                retained.append(connection)
+                if self.max_results is not None:
+                    key = self.get_duplicate_key(connection, connection.pairs)
+                    if self.egoscan:
+                        # a connection and its inverse are one result
+                        inverse_pairs = frozenset((second, first) for first, second in connection.pairs)
+                        key = frozenset([key, self.get_duplicate_key(connection, inverse_pairs)])
+                    if best_qualities.add(key, connection.quality):
+                        # a provisional top of the results for the report
+                        self.send(PartialResults(best_qualities.get_qualities()))
+        self.connections = retained
+
     #
     # eliminate_duplicate_connections
     #
 
+    def get_duplicate_key(self, connection, pairs):
+        if isinstance(connection.transformation, Rotation):
+            return (pairs, numpy.linalg.det(connection.transformation.r) > 0)
+        else:
+            return pairs
+
     def eliminate_duplicate_connections(self):
         # Stage 1 searches for duplicates that arise because certain pairs of
         # matching triangles simply lead to the same relative orientation. Two
@@ -226,10 +365,7 @@ class Scanner(object):
         maximum = len(self.connections)
         for connection in self.connections:
             self.send(ProgressMessage("elim_dup", progress, maximum))
-            if isinstance(connection.transformation, Rotation):
-                key = (connection.pairs, numpy.linalg.det(connection.transformation.r) > 0)
-            else:
-                key = connection.pairs
+            key = self.get_duplicate_key(connection, connection.pairs)
             existing = stage1.get(key)
             if existing is None:
                 progress += 1
@@ -250,15 +386,8 @@ class Scanner(object):
             while len(stage1) > 0:
                 self.send(ProgressMessage("elim_dup", len(stage2), len(stage1) + len(stage2)))
                 key, connection = stage1.popitem()
-                if isinstance(connection.transformation, Rotation):
-                    pairs = key[0]
-                else:
-                    pairs = key
                 inverse_pairs = frozenset((second, first) for first, second in connection.pairs)
-                if isinstance(connection.transformation, Rotation):
-                    inverse_key = (inverse_pairs, key[1])
-                else:
-                    inverse_key = inverse_pairs
+                inverse_key = self.get_duplicate_key(connection, inverse_pairs)
                 if inverse_key in stage1:
                     del stage1[inverse_key]
                     connection.invertible = True
@@ -37,7 +37,8 @@ from molmod import PairSearchInter
 import numpy, sys, copy
 
 
-__all__  = ["Geometry", "Connection", "ProgressMessage"]
+__all__  = ["Geometry", "Connection", "QualityEvaluator", "ProgressMessage",
+            "PartialResults"]
 
 
 class Geometry(object):
@@ -89,6 +90,118 @@ class Connection(object):
         self.pairs = frozenset(pairs)
 
 
+class QualityEvaluator(object):
+    """Computes the quality of connections with a cell list of geometry1.
+
+    The cell list is built once, and is reused for every connection. This
+    gives the same quality and pairs as Connection.compute_quality.
+    """
+    def __init__(self, geometry1, geometry2):
+        self.geometry1 = geometry1
+        self.geometry2 = geometry2
+        self.cutoff = max(geometry1.radii.max(), geometry2.radii.max())
+
+        # The cells have the size of the cutoff radius. One layer of empty
+        # cells is added on each side such that points of geometry2 just
+        # outside the bounding box of geometry1 are also found.
+        self.origin = geometry1.coordinates.min(axis=0)
+        cells1 = self.get_cells(geometry1.coordinates)
+        self.shape = cells1.max(axis=0) + 2
+        self.strides = numpy.array([self.shape[1]*self.shape[2], self.shape[2], 1])
+
+        # For each cell, the points of geometry1 in the cell itself and in
+        # the 26 surrounding cells are stored in one array.
+        neighborhoods = {}
+        offsets = numpy.array([
+            (dx, dy, dz)
+            for dx in (-1, 0, 1)
+            for dy in (-1, 0, 1)
+            for dz in (-1, 0, 1)
+        ])
+        for index1, cell1 in enumerate(cells1):
+            for code in numpy.dot(cell1 + offsets, self.strides):
+                neighborhood = neighborhoods.get(code)
+                if neighborhood is None:
+                    neighborhood = []
+                    neighborhoods[code] = neighborhood
+                neighborhood.append(index1)
+        self.neighborhoods = dict(
+            (code, numpy.array(neighborhood))
+            for code, neighborhood in neighborhoods.iteritems()
+        )
+        # the number of connecting points in each neighborhood, used to
+        # compute an upper bound for the quality
+        self.num_connects = dict(
+            (code, geometry1.connect_masks[neighborhood].sum())
+            for code, neighborhood in self.neighborhoods.iteritems()
+        )
+
+    def get_cells(self, coordinates):
+        return numpy.floor((coordinates - self.origin)/self.cutoff).astype(int) + 1
+
+    def compute_quality(self, connection, threshold=None):
+        """Compute the quality and the pairs of the connection.
+
+        When a threshold is given, the evaluation is aborted as soon as the
+        quality can no longer reach the threshold. In that case, False is
+        returned and the quality and pairs of the connection are not set.
+        """
+        geometry1 = self.geometry1
+        geometry2 = self.geometry2
+        transformed_coordinates2 = connection.transformation*geometry2.coordinates
+
+        # assign the points of geometry2 to the cells, and group them
+        cells2 = self.get_cells(transformed_coordinates2)
+        indices2 = ((cells2 >= 0) & (cells2 < self.shape)).all(axis=1).nonzero()[0]
+        codes = numpy.dot(cells2[indices2], self.strides)
+        order = codes.argsort()
+        codes = codes[order]
+        indices2 = indices2[order]
+        bounds = [0] + list((codes[1:] != codes[:-1]).nonzero()[0] + 1) + [len(codes)]
+        groups = [
+            (begin, end) for begin, end in zip(bounds[:-1], bounds[1:])
+            if begin < end and codes[begin] in self.neighborhoods
+        ]
+
+        if threshold is not None:
+            # Each pair of connecting points contributes at most one to the
+            # quality. This gives an upper bound for the quality that can
+            # still be gained with the remaining groups.
+            potentials = numpy.array([
+                geometry2.connect_masks[indices2[begin:end]].sum()*self.num_connects[codes[begin]]
+                for begin, end in groups
+            ] + [0], float)
+            potentials = potentials[::-1].cumsum()[::-1]
+            if potentials[0] < threshold:
+                return False
+
+        quality = 0.0
+        pairs = []
+        for counter, (begin, end) in enumerate(groups):
+            if threshold is not None and quality + potentials[counter] < threshold:
+                return False
+            candidates1 = self.neighborhoods[codes[begin]]
+            group2 = indices2[begin:end]
+            # vectorized distance and radius tests for all candidate pairs
+            deltas = transformed_coordinates2[group2,numpy.newaxis,:] - geometry1.coordinates[numpy.newaxis,candidates1,:]
+            distances = numpy.sqrt((deltas**2).sum(axis=2))
+            radii = geometry2.radii[group2,numpy.newaxis] + geometry1.radii[numpy.newaxis,candidates1]
+            hits2, hits1 = ((distances < self.cutoff) & (distances < radii)).nonzero()
+            if len(hits1) == 0: continue
+            terms = 1 - (distances[hits2, hits1]/radii[hits2, hits1])**2
+            hits1 = candidates1[hits1]
+            hits2 = group2[hits2]
+            connect = geometry1.connect_masks[hits1] & geometry2.connect_masks[hits2]
+            quality += terms[connect].sum() - 2*terms[~connect].sum()
+            pairs.extend(zip(hits1[connect].tolist(), hits2[connect].tolist()))
+
+        if threshold is not None and quality < threshold:
+            return False
+        connection.quality = quality
+        connection.pairs = frozenset(pairs)
+        return True
+
+
 class ProgressMessage(object):
     def __init__(self, label, progress, maximum):
         self.label = label
@@ -96,3 +209,7 @@ class ProgressMessage(object):
         self.maximum = maximum
 
 
+class PartialResults(object):
+    """The qualities of the best connections found so far, in decreasing order"""
+    def __init__(self, qualities):
+        self.qualities = qualities
@@ -44,18 +44,52 @@ __all__ = ["PairScanner"]
 
 
 class PairScanner(Scanner):
-    def __init__(self, send, geometry1, geometry2, action_radius, hit_tolerance, rotation2):
-        Scanner.__init__(self, send, geometry1, geometry2, action_radius, hit_tolerance)
+    def __init__(self, send, geometry1, geometry2, action_radius, hit_tolerance, rotation2, vectorized=True, num_processes=1, max_results=None, min_quality=None):
+        Scanner.__init__(self, send, geometry1, geometry2, action_radius, hit_tolerance, num_processes, max_results, min_quality)
         if rotation2 is None:
             self.rotation2 = Rotation.identity()
         else:
             self.rotation2 = rotation2
+        self.vectorized = vectorized
 
     #
     # generate_connections
     #
 
     def compare_environments(self, environment1, environment2):
+        if self.vectorized:
+            self.compare_environments_vectorized(environment1, environment2)
+        else:
+            self.compare_environments_reference(environment1, environment2)
+
+    def compare_environments_vectorized(self, environment1, environment2):
+        # avoiding duplicates, only the deltas towards neighbors with a higher
+        # id are considered in environment1
+        indices1 = (environment1.neighbors > environment1.id).nonzero()[0]
+        if len(indices1) == 0:
+            return
+        deltas1 = environment1.deltas[indices1]
+        rotated_deltas2 = self.rotation2*environment2.deltas
+        # all differences between the deltas in one broadcast operation
+        diff_deltas = deltas1[:,numpy.newaxis,:] - rotated_deltas2[numpy.newaxis,:,:]
+        diff_distances = numpy.sqrt((diff_deltas**2).sum(axis=2))
+        hits1, hits2 = (diff_distances < self.hit_tolerance).nonzero()
+        if len(hits1) == 0:
+            return
+        # only create connections for the hits
+        t0 = environment1.coordinate - self.rotation2*environment2.coordinate
+        for hit1, hit2 in zip(hits1, hits2):
+            index1 = indices1[hit1]
+            connection = Connection(set([
+                (environment1.id, environment2.id),
+                (environment1.neighbors[index1], environment2.neighbors[hit2])
+            ]))
+            connection.t = t0 + 0.5*diff_deltas[hit1, hit2]
+            self.connections.append(connection)
+
+    def compare_environments_reference(self, environment1, environment2):
+        # Straightforward loop over all pairs of deltas. This is slow, but it
+        # is kept as a reference for the vectorized implementation.
         #self.output("*** COMPARING: %s %s\n" % (point1.id.name, point2.id.name))
         for index1, delta1 in enumerate(environment1.deltas):
             for index2, delta2 in enumerate(environment2.deltas):
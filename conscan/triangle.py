@@ -80,8 +80,8 @@ class Triangle(object):
 
 
 class TriangleScanner(Scanner):
-    def __init__(self, send, geometry1, geometry2, action_radius, hit_tolerance, allow_inversions, minimum_trianlge_area):
-        Scanner.__init__(self, send, geometry1, geometry2, action_radius, hit_tolerance)
+    def __init__(self, send, geometry1, geometry2, action_radius, hit_tolerance, allow_inversions, minimum_trianlge_area, num_processes=1, max_results=None, min_quality=None):
+        Scanner.__init__(self, send, geometry1, geometry2, action_radius, hit_tolerance, num_processes, max_results, min_quality)
         self.allow_inversions = allow_inversions
         self.minimum_trianlge_area = minimum_trianlge_area
 
@@ -92,18 +92,22 @@ class TriangleScanner(Scanner):
     def compare_environments(self, environment1, environment2):
         #print "*** COMPARING: %3i with %3i" % (environment1.id, environment2.id)
         # first do a distance compare test
+        # avoiding duplicates part 1
+        indices1 = (environment1.neighbors > environment1.id).nonzero()[0]
+        distances1 = environment1.distances[indices1]
+        # only the distances in environment2 that lie within a window of width
+        # hit_tolerance are candidates. These windows are found with a binary
+        # search in the sorted distances.
+        lows = environment2.sorted_distances.searchsorted(distances1 - self.hit_tolerance, 'left')
+        highs = environment2.sorted_distances.searchsorted(distances1 + self.hit_tolerance, 'right')
         matching_pairs = []
-        for index1, distance1 in enumerate(environment1.distances):
-            for index2, distance2 in enumerate(environment2.distances):
-                # avoiding duplicates part 1
-                if environment1.id < environment1.neighbors[index1]:
-                    # pairs of distances must match within a certain accuracy
-                    #print "(%i,%i) = %6.3f with (%i,%i) = %6.3f" % (environment1.id, environment1.neighbors[index1], distance1, environment2.id, environment2.neighbors[index2], distance2),
-                    if self.hit(distance1 - distance2):
-                    #    print "    match"
-                        matching_pairs.append((environment1.neighbors[index1], environment2.neighbors[index2]))
-                    #else:
-                    #    print
+        for index1, distance1, low, high in zip(indices1, distances1, lows, highs):
+            if low == high: continue
+            # keep the original order of the neighbors in environment2
+            for index2 in numpy.sort(environment2.distance_order[low:high]):
+                # pairs of distances must match within a certain accuracy
+                if self.hit(distance1 - environment2.distances[index2]):
+                    matching_pairs.append((environment1.neighbors[index1], environment2.neighbors[index2]))
 
         # the pairs of matching distances can be further examined for the third side of the triangle
         n = len(matching_pairs)
@@ -116,8 +120,9 @@ class TriangleScanner(Scanner):
                 third_sides = [-1.0, -1.0]
                 for k, geometry in enumerate([self.geometry1, self.geometry2]):
                     pointa = geometry.environments[pair1[k]]
-                    if pair2[k] in pointa.neighbors:
-                        third_sides[k] = pointa.distances[pointa.reverse_neighbors[pair2[k]]]
+                    index = pointa.reverse_neighbors.get(pair2[k])
+                    if index is not None:
+                        third_sides[k] = pointa.distances[index]
                     else:
                         third_sides = None
                         break
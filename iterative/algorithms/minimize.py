@@ -39,7 +39,8 @@ import math, numpy, sys
 
 
 __all__ = [
-    "Minimize", "SteepestDescent", "ConjugateGradient", "DefaultMinimize"
+    "Minimize", "SteepestDescent", "ConjugateGradient", "LBFGS",
+    "DefaultMinimize"
 ]
 
 
@@ -163,6 +164,139 @@ class ConjugateGradient(Minimize):
         return False
 
 
+class LBFGS(Minimize):
+    """Limited-memory BFGS minimizer.
+
+    The search direction is computed with the two-loop recursion from the
+    last memory steps and gradient changes. Unlike ConjugateGradient, this
+    requires no extra gradient evaluation to estimate the curvature. When
+    wolfe is True, the step length is determined with a line search that
+    imposes the Wolfe conditions instead of the plain backtracking line
+    search.
+    """
+    def __init__(self, root_expression, max_step, step_threshold, memory=5, wolfe=False):
+        Minimize.__init__(self, root_expression, max_step, step_threshold)
+        self.memory = memory
+        self.wolfe = wolfe
+
+    def initialize(self):
+        Minimize.initialize(self)
+        self.root_expression.clear_derivatives()
+        self.root_expression.add_derivatives()
+        self.gradient = self.root_expression.derivatives.copy()
+        self.history = []
+
+    def get_direction(self):
+        # two-loop recursion
+        direction = -self.gradient
+        alphas = []
+        for delta_state, delta_gradient, rho in reversed(self.history):
+            alpha = rho*numpy.dot(delta_state, direction)
+            direction = direction - alpha*delta_gradient
+            alphas.append(alpha)
+        if len(self.history) > 0:
+            delta_state, delta_gradient, rho = self.history[-1]
+            direction *= numpy.dot(delta_state, delta_gradient)/numpy.dot(delta_gradient, delta_gradient)
+        for (delta_state, delta_gradient, rho), alpha in zip(self.history, reversed(alphas)):
+            beta = rho*numpy.dot(delta_gradient, direction)
+            direction = direction + (alpha - beta)*delta_state
+        return direction
+
+    def wolfe_line_search(self, step, c1=1e-4, c2=0.9, max_iter=20):
+        """Searches a step length that satisfies the Wolfe conditions.
+
+        The step is first limited to the maximum step size. The step length
+        is then bisected until the sufficient decrease and the curvature
+        conditions are met. The derivatives at the accepted state are
+        computed on the way. When the curvature condition can not be met
+        within max_iter steps, the longest step with a sufficient decrease is
+        accepted. Only when there is no such step, True is returned.
+        """
+        self.limit_step(step)
+        self.status.num_shakes = 0
+
+        self.root_expression.clear_outputs()
+        self.root_expression.add_outputs()
+        self.original_state = self.root_expression.state.copy()
+        self.original_value = self.root_expression.outputs[0]
+        original_slope = numpy.dot(self.gradient, step)
+
+        low = 0.0
+        high = None
+        length = 1.0
+        stop = True
+        for counter in xrange(max_iter):
+            if self.stop_criterion(length*step):
+                break
+            self.root_expression.state[:] = self.original_state + length*step
+            self.status.num_shakes += self.root_expression.shake()
+            self.root_expression.clear_outputs()
+            self.root_expression.add_outputs()
+            value = self.root_expression.outputs[0]
+            if value > self.original_value + c1*length*original_slope:
+                # not enough decrease, the step is too long
+                high = length
+            else:
+                self.root_expression.clear_derivatives()
+                self.root_expression.add_derivatives()
+                slope = numpy.dot(self.root_expression.derivatives, step)
+                if slope >= c2*original_slope or high is None:
+                    # The curvature condition is met, or the step can not
+                    # be made longer.
+                    stop = False
+                    break
+                # the step is too short
+                low = length
+            length = 0.5*(low + high)
+        if stop and low > 0:
+            # The curvature condition was not met in time, but the step at
+            # low has a sufficient decrease.
+            self.root_expression.state[:] = self.original_state + low*step
+            self.status.num_shakes += self.root_expression.shake()
+            self.root_expression.clear_outputs()
+            self.root_expression.add_outputs()
+            self.root_expression.clear_derivatives()
+            self.root_expression.add_derivatives()
+            stop = False
+        elif stop:
+            self.root_expression.state[:] = self.original_state
+            self.root_expression.outputs[0] = self.original_value
+        self.status.progress = self.stop_criterion.get_fraction()
+        self.status.value = self.root_expression.outputs[0]
+        return stop
+
+    def iterate(self):
+        step = self.get_direction()
+        if numpy.dot(step, self.gradient) >= 0:
+            # not a descent direction, start over with the gradient
+            self.history = []
+            step = -self.gradient
+        old_state = self.root_expression.state.copy()
+
+        if self.wolfe:
+            stop = self.wolfe_line_search(step)
+        else:
+            stop = self.line_search(step)
+        if stop: return True
+
+        if not self.wolfe:
+            # the Wolfe line search already computed the new derivatives
+            self.root_expression.clear_derivatives()
+            self.root_expression.add_derivatives()
+        new_gradient = self.root_expression.derivatives
+
+        delta_state = self.root_expression.state - old_state
+        delta_gradient = new_gradient - self.gradient
+        curvature = numpy.dot(delta_state, delta_gradient)
+        if curvature > 0:
+            self.history.append((delta_state, delta_gradient, 1.0/curvature))
+            if len(self.history) > self.memory:
+                del self.history[0]
+        self.gradient[:] = new_gradient
+
+        return False
+
+
 DefaultMinimize = ConjugateGradient
 
 
@@ -38,7 +38,7 @@ from iterative.variables.rigid_body import Frame, Translation
 import numpy
 
 
-__all__ = ["Orthonormality", "NoFrame", "Spring"]
+__all__ = ["Orthonormality", "NoFrame", "Spring", "SpringSet"]
 
 
 class Error(Exception):
@@ -158,7 +158,101 @@ class Spring(Terminus):
         helper(frame2, frame1, coordinate2, coordinate1)
 
 
+class SpringSet(Terminus):
+    """A set of springs that is evaluated in one vectorized pass.
 
+    This gives the same outputs and derivatives as a Spring expression for
+    each spring, but the coordinates, the frame indices and the rest lengths
+    of all springs are stored in contiguous arrays.
+    """
+    output_dimension = 1
+
+    def __init__(self):
+        Terminus.__init__(self)
+        # The first frame is always the NoFrame, for the fixed coordinates.
+        self.frames = [NoFrame()]
+        self.frame_indices = []
+        self.coordinates = []
+        self.rest_lengths = []
+
+    def get_frame_index(self, variable):
+        for index, frame in enumerate(self.frames):
+            if frame is variable:
+                return index
+        if isinstance(variable, NoFrame):
+            return 0
+        if not (isinstance(variable, Frame) or isinstance(variable, Translation)):
+            raise Error("Expression requires iterative.var.Frame or iterative.var.Translation as variable")
+        self.frames.append(variable)
+        Terminus.register_input_variable(self, variable)
+        return len(self.frames) - 1
+
+    def add_spring(self, variable1, coordinate1, variable2, coordinate2, rest_length=0.0):
+        if rest_length < 0.0:
+            raise Error("The rest length of a spring must be zero or positive.")
+        for variable, coordinate in (variable1, coordinate1), (variable2, coordinate2):
+            if not isinstance(variable, NoFrame):
+                variable.add_mass(coordinate)
+        self.frame_indices.append((self.get_frame_index(variable1), self.get_frame_index(variable2)))
+        self.coordinates.append((coordinate1, coordinate2))
+        self.rest_lengths.append(rest_length)
 
+    def sanity_check(self):
+        if len(self.rest_lengths) == 0:
+            raise Error("A SpringSet expression must contain at least one spring.")
+        Terminus.sanity_check(self)
+        # convert everything to arrays. The endpoints of all springs are
+        # stored in one array: the first endpoints of all springs, followed
+        # by the second endpoints.
+        self.frame_indices = numpy.array(self.frame_indices, int)
+        self.coordinates = numpy.array(self.coordinates, float)
+        self.rest_lengths = numpy.array(self.rest_lengths, float)
+        self.endpoint_frame_indices = numpy.concatenate([self.frame_indices[:,0], self.frame_indices[:,1]])
+        self.endpoint_coordinates = numpy.concatenate([self.coordinates[:,0], self.coordinates[:,1]])
+        self.frame_endpoints = [
+            (self.endpoint_frame_indices == index).nonzero()[0]
+            for index in xrange(len(self.frames))
+        ]
 
+    def compute_deltas(self):
+        num_frames = len(self.frames)
+        rotation_matrices = numpy.zeros((num_frames, 3, 3), float)
+        rotation_matrices[0] = numpy.identity(3, float)
+        translation_vectors = numpy.zeros((num_frames, 3), float)
+        for index in xrange(1, num_frames):
+            rotation_matrices[index] = self.frames[index].rotation_matrix
+            translation_vectors[index] = self.frames[index].translation_vector
+        positions = (
+            (rotation_matrices[self.endpoint_frame_indices]*self.endpoint_coordinates[:,numpy.newaxis,:]).sum(axis=2) +
+            translation_vectors[self.endpoint_frame_indices]
+        )
+        num_springs = len(self.rest_lengths)
+        return positions[:num_springs] - positions[num_springs:]
 
+    def add_outputs(self):
+        deltas = self.compute_deltas()
+        norms = numpy.sqrt((deltas**2).sum(axis=1))
+        self.outputs[0] += ((norms - self.rest_lengths)**2).sum()
+
+    def add_derivatives(self):
+        deltas = self.compute_deltas()
+        norms = numpy.sqrt((deltas**2).sum(axis=1))
+        factors = 2*(norms - self.rest_lengths)/(norms + (norms == 0))
+        factors[self.rest_lengths == 0.0] = 2.0
+        alpha_columns = deltas*factors[:,numpy.newaxis]
+        # the second endpoint of a spring gets the opposite alpha column
+        endpoint_alpha_columns = numpy.concatenate([alpha_columns, -alpha_columns])
+
+        for index in xrange(1, len(self.frames)):
+            frame = self.frames[index]
+            endpoints = self.frame_endpoints[index]
+            if len(endpoints) == 0: continue
+            frame_alpha_columns = endpoint_alpha_columns[endpoints]
+            current_index = 0
+            if isinstance(frame, Frame):
+                frame.derivatives[0:9] += numpy.dot(
+                    frame_alpha_columns.transpose(),
+                    self.endpoint_coordinates[endpoints]
+                ).ravel()
+                current_index = 9
+            frame.derivatives[current_index:current_index+3] += frame_alpha_columns.sum(axis=0)
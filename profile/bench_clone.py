@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+"""Compares the time needed to copy the atoms and bonds of a zeolite with a
+round trip through the ZML format and with clone_subtree. The number of
+copies corresponds to a 4x4x4 super cell.
+
+Run this script from the profile directory.
+"""
+
+
+import os.path
+if not os.path.exists("init_files.py"):
+    os.symlink("../debug/init_files.py", "init_files.py")
+from init_files import init_files
+init_files()
+
+
+from zeobuilder.application import TestApplication
+from zeobuilder import context
+from zeobuilder.zml import dump_to_file, load_from_file, clone_subtree
+
+import StringIO, time
+
+
+num_copies = 4*4*4
+
+
+def copy_round_trip(nodes):
+    serialized = StringIO.StringIO()
+    dump_to_file(serialized, nodes)
+    for i in xrange(num_copies):
+        serialized.seek(0)
+        load_from_file(serialized)
+
+
+def copy_clone(nodes):
+    for i in xrange(num_copies):
+        clone_subtree(nodes)
+
+
+def measure_fn():
+    context.application.model.file_open("../test/input/lau_double.zml")
+    nodes = context.application.model.universe.children
+    print "Copying %i nodes %i times" % (len(nodes), num_copies)
+    timings = []
+    for copy_fn in copy_round_trip, copy_clone:
+        t0 = time.time()
+        copy_fn(nodes)
+        t1 = time.time()
+        timings.append(t1 - t0)
+        print "%20s %10.3f s" % (copy_fn.__name__, t1 - t0)
+    print "Speedup: %.1fx" % (timings[0]/timings[1])
+
+
+if __name__ == "__main__":
+    application = TestApplication(measure_fn)
+    if application.error_message is not None:
+        print "An Error occured while running the test application:"
+        print application.error_message
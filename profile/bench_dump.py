@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+
+"""Measures the time needed by the XYZ, PDB and G03XYZ dump filters on a
+super cell of test/input/lau.zml.
+
+Run this script from the profile directory.
+"""
+
+
+import os.path
+if not os.path.exists("init_files.py"):
+    os.symlink("../debug/init_files.py", "init_files.py")
+from init_files import init_files
+init_files()
+
+
+from zeobuilder.application import HeadlessApplication
+from zeobuilder.batch import run_action
+from zeobuilder import context
+import tempfile, shutil, time
+
+
+repetitions = 8
+extensions = ["xyz", "pdb", "g03xyz"]
+
+
+if __name__ == "__main__":
+    work = tempfile.mkdtemp("_zeobuilder_bench")
+    application = HeadlessApplication()
+    try:
+        context.application.model.file_open("../test/input/lau.zml")
+        universe = context.application.model.universe
+        run_action("SuperCell", [universe],
+            repetitions_a=repetitions, repetitions_b=repetitions,
+            repetitions_c=repetitions,
+        )
+        print "%i children in the universe" % len(universe.children)
+        for extension in extensions:
+            t0 = time.time()
+            context.application.model.file_save(os.path.join(work, "lau.%s" % extension))
+            t1 = time.time()
+            print "%10s %10.3f s" % (extension, t1 - t0)
+    finally:
+        application.model.file_close()
+        shutil.rmtree(work)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+
+"""Compares the time needed to run a small structure-generation job in the
+test application (with main window and OpenGL) and in the headless
+application.
+
+Run this script from the profile directory.
+"""
+
+
+import os.path
+if not os.path.exists("init_files.py"):
+    os.symlink("../debug/init_files.py", "init_files.py")
+from init_files import init_files
+init_files()
+
+
+from zeobuilder.application import TestApplication, HeadlessApplication
+from zeobuilder import context
+import tempfile, shutil, time
+
+
+num_jobs = 5
+
+
+def job_fn():
+    context.application.model.file_open("../test/input/lau.zml")
+    universe = context.application.model.universe
+    context.application.main.select_nodes([universe])
+    SuperCell = context.application.plugins.get_action("SuperCell")
+    parameters = SuperCell.default_parameters()
+    parameters.repetitions_a = 2
+    parameters.repetitions_b = 2
+    parameters.repetitions_c = 2
+    SuperCell(parameters)
+    context.application.main.select_nodes([universe])
+    AutoConnectPhysical = context.application.plugins.get_action("AutoConnectPhysical")
+    AutoConnectPhysical()
+    context.application.model.file_save(os.path.join(work, "lau_super.zml"))
+
+
+def run_gui_job():
+    application = TestApplication(job_fn)
+    if application.error_message is not None:
+        print "An Error occured while running the test application:"
+        print application.error_message
+    del context.application
+
+
+def run_headless_job():
+    application = HeadlessApplication()
+    job_fn()
+    application.model.file_close()
+    del context.application
+
+
+if __name__ == "__main__":
+    work = tempfile.mkdtemp("_zeobuilder_bench")
+    try:
+        timings = []
+        for run_fn in run_gui_job, run_headless_job:
+            t0 = time.time()
+            for i in xrange(num_jobs):
+                run_fn()
+            t1 = time.time()
+            timings.append(t1 - t0)
+            print "%20s %10.3f s per job" % (run_fn.__name__, (t1 - t0)/num_jobs)
+        print "Speedup: %.1fx" % (timings[0]/timings[1])
+    finally:
+        shutil.rmtree(work)
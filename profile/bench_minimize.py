@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+"""Compares the number of iterations and function evaluations of the
+minimizers in iterative.alg on the spring problems from the unit tests.
+
+Run this script from the profile directory.
+"""
+
+
+import sys
+sys.path.insert(0, "..")
+sys.path.insert(0, "../test/test_iterative")
+
+import iterative
+from test_rigid_body import define_cost_function1, define_cost_function2, \
+    define_cost_function3
+
+import numpy
+
+
+class Counter(object):
+    def __init__(self, method):
+        self.method = method
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        self.method()
+
+
+def benchmark(label, define_cost_function, max_step, Minimize, **kwargs):
+    cost_function = define_cost_function()
+    outputs = Counter(cost_function.add_outputs)
+    cost_function.add_outputs = outputs
+    derivatives = Counter(cost_function.add_derivatives)
+    cost_function.add_derivatives = derivatives
+
+    minimize = Minimize(cost_function, max_step, max_step*1e-8, **kwargs)
+    def report(status):
+        pass
+    minimize.run(report)
+    print "%-30s %-20s %8i %8i %8i %15.8e" % (
+        label, Minimize.__name__ + {True: "+wolfe", False: ""}[kwargs.get("wolfe", False)],
+        minimize.status.step, outputs.count, derivatives.count,
+        cost_function.outputs[0],
+    )
+
+
+problems = [
+    ("Frames with constraints", define_cost_function1, ([0.1]*9 + [1.0]*3)*2),
+    ("Translations", define_cost_function2, [1.0]*6),
+    ("Spring set (50 springs)", lambda: define_cost_function3(True), ([0.1]*9 + [1.0]*3)*3 + [1.0]*6),
+]
+
+
+print "%-30s %-20s %8s %8s %8s %15s" % ("Problem", "Minimizer", "Iter", "Energy", "Gradient", "Final value")
+for label, define_cost_function, max_step in problems:
+    max_step = numpy.array(max_step, float)
+    benchmark(label, define_cost_function, max_step, iterative.alg.SteepestDescent)
+    benchmark(label, define_cost_function, max_step, iterative.alg.ConjugateGradient)
+    benchmark(label, define_cost_function, max_step, iterative.alg.LBFGS)
+    benchmark(label, define_cost_function, max_step, iterative.alg.LBFGS, wolfe=True)
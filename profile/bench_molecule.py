@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+"""Compares the time needed to extract the coordinates of a zeolite super cell
+by transforming every atom separately and with moltools.get_coordinates.
+
+Run this script from the profile directory.
+"""
+
+
+import os.path
+if not os.path.exists("init_files.py"):
+    os.symlink("../debug/init_files.py", "init_files.py")
+from init_files import init_files
+init_files()
+
+
+from zeobuilder.application import TestApplication
+from zeobuilder import context
+from zeobuilder.moltools import iter_atoms, get_coordinates
+from zeobuilder.zml import clone_subtree
+import zeobuilder.actions.primitive as primitive
+
+import numpy, time
+
+
+num_copies = 4*4*4
+
+
+def coordinates_per_atom(atoms, parent):
+    return numpy.array([atom.get_frame_relative_to(parent).t for atom in atoms])
+
+
+def coordinates_batched(atoms, parent):
+    return get_coordinates(atoms, parent)
+
+
+def measure_fn():
+    context.application.model.file_open("../test/input/lau_double.zml")
+    universe = context.application.model.universe
+    # put copies of the zeolite in frames
+    context.application.action_manager.record_primitives = False
+    Frame = context.application.plugins.get_node("Frame")
+    originals = list(universe.children)
+    frames = []
+    for i in xrange(num_copies):
+        frame = Frame(name="Copy %i" % i)
+        frame.set_transformation(frame.transformation.copy_with(t=numpy.random.uniform(0, 100, 3)))
+        primitive.Add(frame, universe)
+        primitive.AddMany(clone_subtree(originals), frame)
+        frames.append(frame)
+    atoms = list(iter_atoms(frames))
+    print "Extracting the coordinates of %i atoms in %i frames" % (len(atoms), num_copies)
+    results = []
+    timings = []
+    for extract_fn in coordinates_per_atom, coordinates_batched:
+        t0 = time.time()
+        results.append(extract_fn(atoms, universe))
+        t1 = time.time()
+        timings.append(t1 - t0)
+        print "%20s %10.3f s" % (extract_fn.__name__, t1 - t0)
+    print "Max deviation: %.1e" % abs(results[0] - results[1]).max()
+    print "Speedup: %.1fx" % (timings[0]/timings[1])
+
+
+if __name__ == "__main__":
+    application = TestApplication(measure_fn)
+    if application.error_message is not None:
+        print "An Error occured while running the test application:"
+        print application.error_message
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+"""Measures the time to rebuild the display lists and the frame rate for a
+super cell of a zeolite, with and without batched rendering.
+
+Run this script from the profile directory.
+"""
+
+
+import os.path
+if not os.path.exists("init_files.py"):
+    os.symlink("../debug/init_files.py", "init_files.py")
+from init_files import init_files
+init_files()
+
+
+from zeobuilder.application import TestApplication
+from zeobuilder.actions.composed import Parameters
+from zeobuilder import context
+
+from OpenGL.GL import glFinish
+
+import time
+
+
+num_frames = 20
+
+
+def render():
+    drawing_area = context.application.main.drawing_area
+    drawable = drawing_area.get_gl_drawable()
+    drawable.gl_begin(drawing_area.get_gl_context())
+    context.application.vis_backend.draw(drawing_area.allocation.width, drawing_area.allocation.height)
+    glFinish()
+    drawable.gl_end()
+
+
+def measure_fn():
+    context.application.model.file_open("../test/input/lau_double.zml")
+    parameters = Parameters()
+    parameters.repetitions_a = 3
+    parameters.repetitions_b = 3
+    parameters.repetitions_c = 3
+    SuperCell = context.application.plugins.get_action("SuperCell")
+    SuperCell(parameters)
+    context.application.main.select_nodes([context.application.model.universe])
+    AutoConnectPhysical = context.application.plugins.get_action("AutoConnectPhysical")
+    AutoConnectPhysical()
+    context.application.main.select_nodes([])
+    print "Number of nodes: %i" % len(context.application.model.universe.children)
+
+    configuration = context.application.configuration
+    for batched_rendering in False, True:
+        configuration.batched_rendering = batched_rendering
+        # invalidate all draw lists
+        for node in context.application.model.universe.children:
+            node.invalidate_draw_list()
+        context.application.scene.update_render_settings()
+        t0 = time.time()
+        render()
+        t1 = time.time()
+        for i in xrange(num_frames):
+            render()
+        t2 = time.time()
+        print "batched_rendering=%s: rebuild %.3f s, %.1f frames per second" % (
+            batched_rendering, t1 - t0, num_frames/(t2 - t1)
+        )
+    configuration.batched_rendering = False
+
+
+if __name__ == "__main__":
+    application = TestApplication(measure_fn)
+    if application.error_message is not None:
+        print "An Error occured while running the test application:"
+        print application.error_message
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+"""Measures how the time to select and delete all atoms scales with the size
+of the model. Both operations should scale linearly with the number of atoms.
+
+Run this script from the profile directory.
+"""
+
+
+import os.path
+if not os.path.exists("init_files.py"):
+    os.symlink("../debug/init_files.py", "init_files.py")
+from init_files import init_files
+init_files()
+
+
+from zeobuilder.application import TestApplication
+from zeobuilder import context
+import zeobuilder.actions.primitive as primitive
+
+import numpy, time
+
+
+sizes = [1000, 4000, 16000, 64000]
+
+
+def add_atoms(size):
+    FileNew = context.application.plugins.get_action("FileNew")
+    FileNew()
+    universe = context.application.model.universe
+    Atom = context.application.plugins.get_node("Atom")
+    atoms = []
+    for i in xrange(size):
+        atom = Atom(name="C%i" % i)
+        atom.transformation.t[:] = numpy.random.uniform(0, 50, 3)
+        atoms.append(atom)
+    context.application.action_manager.record_primitives = False
+    primitive.AddMany(atoms, universe)
+    context.application.action_manager.record_primitives = True
+    return universe
+
+
+def select_all(universe):
+    context.application.main.select_nodes(universe.children)
+
+
+def delete_all(universe):
+    Delete = context.application.plugins.get_action("Delete")
+    assert Delete.analyze_selection()
+    Delete()
+
+
+def measure_fn():
+    print "%10s %12s %12s" % ("atoms", "select [s]", "delete [s]")
+    for size in sizes:
+        universe = add_atoms(size)
+        timings = []
+        for fn in select_all, delete_all:
+            t0 = time.time()
+            fn(universe)
+            t1 = time.time()
+            timings.append(t1 - t0)
+        assert len(universe.children) == 0
+        print "%10i %12.3f %12.3f" % (size, timings[0], timings[1])
+
+
+if __name__ == "__main__":
+    application = TestApplication(measure_fn)
+    if application.error_message is not None:
+        print "An Error occured while running the test application:"
+        print application.error_message
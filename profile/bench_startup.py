@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+
+"""Compares the startup time of the headless application when all plugin
+modules are imported at startup and when they are imported on first use.
+
+Each startup runs in a fresh interpreter, such that the module imports are
+included in the timings. The first run writes the plugin manifest.
+
+Run this script from the profile directory.
+"""
+
+
+import os.path
+if not os.path.exists("init_files.py"):
+    os.symlink("../debug/init_files.py", "init_files.py")
+
+import subprocess, sys, time
+
+
+num_runs = 5
+
+
+def startup(lazy):
+    t0 = time.time()
+    from init_files import init_files
+    init_files()
+    from zeobuilder.application import HeadlessApplication
+    application = HeadlessApplication(lazy_plugins=lazy)
+    t1 = time.time()
+    print t1 - t0, len(application.plugins.deferred)
+
+
+def run_startup(lazy):
+    p = subprocess.Popen(
+        [sys.executable, __file__, str(int(lazy))],
+        stdout=subprocess.PIPE
+    )
+    output = p.communicate()[0]
+    words = output.split()
+    return float(words[-2]), int(words[-1])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        startup(bool(int(sys.argv[1])))
+    else:
+        # make sure the manifest is up to date
+        run_startup(False)
+        timings = []
+        for lazy in False, True:
+            total = 0.0
+            for i in xrange(num_runs):
+                elapsed, num_deferred = run_startup(lazy)
+                total += elapsed
+            timings.append(total/num_runs)
+            print "%10s %10.3f s per startup, %3i modules deferred" % (
+                ["eager", "lazy"][lazy], total/num_runs, num_deferred
+            )
+        print "Speedup: %.1fx" % (timings[0]/timings[1])
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+"""Measures the load time and the peak memory usage of the ZML loader on
+scaled up copies of test/input/lau_double.zml.
+
+Run this script from the profile directory. Each scale factor is loaded in a
+separate process, such that the peak resident set sizes do not interfere.
+"""
+
+
+import os.path
+if not os.path.exists("init_files.py"):
+    os.symlink("../debug/init_files.py", "init_files.py")
+from init_files import init_files
+init_files()
+
+
+import re, resource, subprocess, sys, tempfile, time
+
+
+scale_factors = [1, 4, 16, 64]
+
+
+def make_scaled_file(scale):
+    f = file("../test/input/lau_double.zml")
+    content = f.read()
+    f.close()
+    # replicate the children of the universe
+    begin = content.index("<list label=\"children\">") + len("<list label=\"children\">")
+    end = content.index("</list>\n  <unit_cell")
+    content = content[:begin] + content[begin:end]*scale + content[end:]
+    # give all model objects a unique id
+    counter = iter(xrange(sys.maxint))
+    content = re.sub("id=\"\d+\"", (lambda match: "id=\"%i\"" % counter.next()), content)
+    handle, filename = tempfile.mkstemp(".zml")
+    os.write(handle, content)
+    os.close(handle)
+    return filename
+
+
+def measure(filename):
+    from zeobuilder.application import TestApplication
+    from zeobuilder import context
+    from zeobuilder.zml import load_from_file
+
+    def measure_fn():
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.time()
+        f = file(filename)
+        root = load_from_file(f)
+        f.close()
+        t1 = time.time()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        num_atoms = len(root[0].children)
+        print "%10i %10.3f %10i %10i" % (num_atoms, t1 - t0, rss_after, rss_after - rss_before)
+
+    application = TestApplication(measure_fn)
+    if application.error_message is not None:
+        print "An Error occured while running the test application:"
+        print application.error_message
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        measure(sys.argv[1])
+    else:
+        print "%10s %10s %10s %10s" % ("children", "time [s]", "peak [kB]", "load [kB]")
+        for scale in scale_factors:
+            filename = make_scaled_file(scale)
+            try:
+                sys.stdout.flush()
+                subprocess.call([sys.executable, __file__, filename])
+            finally:
+                os.remove(filename)
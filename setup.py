@@ -103,7 +103,7 @@ setup(
         'iterative.expressions',
         'iterative.variables',
     ],
-    scripts=['scripts/zeobuilder'],
+    scripts=['scripts/zeobuilder', 'scripts/zeobuilder-batch'],
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Environment :: Console',
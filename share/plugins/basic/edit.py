@@ -37,7 +37,7 @@ from zeobuilder.actions.composed import Immediate
 from zeobuilder.actions.collections.menu import MenuInfo, MenuInfoBase
 from zeobuilder.nodes.parent_mixin import ContainerMixin
 from zeobuilder.gui.fields_dialogs import FieldsDialogSimple
-from zeobuilder.zml import dump_to_file, load_from_string, load_from_file
+from zeobuilder.zml import dump_to_file, load_from_string, clone_subtree
 import zeobuilder.actions.primitive as primitive
 import zeobuilder.authors as authors
 
@@ -282,10 +282,7 @@ class Duplicate(Immediate):
         parent = cache.parent
         highest_index = cache.highest_index
 
-        serialized = StringIO.StringIO()
-        dump_to_file(serialized, originals)
-        serialized.seek(0)
-        duplicates = load_from_file(serialized)
+        duplicates = clone_subtree(originals)
 
         for duplicate in duplicates:
             highest_index += 1
@@ -134,6 +134,7 @@ class PluginsDialog(object):
         # empty the list store
         self.store.clear()
         # fill the list store
+        context.application.plugins.load_all()
         for category, plugins in context.application.plugins.all.iteritems():
             for plugin in plugins:
                 self.store.append((
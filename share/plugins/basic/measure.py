@@ -119,6 +119,9 @@ class MeasurementsWindow(GladeWrapper):
                 context.application.vis_backend.tool("clear")
 
     def on_action_ended(self, action_manager):
+        if len(self.model_objects) == 0:
+            # nothing is measured, e.g. when there is no main window
+            return
         if not isinstance(action_manager.current_action, Measure):
             self.reveal()
 
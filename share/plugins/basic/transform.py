@@ -723,9 +723,19 @@ class RotateWorldMouse(RotateWorldBase, RotateMouseMixin):
     interactive_info = InteractiveInfo("plugins/basic/rotate.svg", mouse=True, order=1)
     authors = [authors.toon_verstraelen]
 
+    def button_press(self, drawing_area, event):
+        RotateMouseMixin.button_press(self, drawing_area, event)
+        # draw coarse meshes while rotating
+        context.application.vis_backend.set_interactive(True)
+
     def button_motion(self, drawing_area, event, start_button):
         self.do_rotation(drawing_area, *RotateMouseMixin.button_motion(self, drawing_area, event, start_button))
 
+    def button_release(self, drawing_area, event):
+        context.application.vis_backend.set_interactive(False)
+        drawing_area.queue_draw()
+        RotateMouseMixin.button_release(self, drawing_area, event)
+
 
 class RotateWorldKeyboard(RotateWorldBase, RotateKeyboardMixin):
     description = "Rotate world"
@@ -906,9 +916,19 @@ class TranslateWorldMouse(TranslateWorldBase, TranslateMouseMixin):
     interactive_info = InteractiveInfo("plugins/basic/translate.svg", mouse=True, order=1)
     authors = [authors.toon_verstraelen]
 
+    def button_press(self, drawing_area, event):
+        TranslateMouseMixin.button_press(self, drawing_area, event)
+        # draw coarse meshes while translating
+        context.application.vis_backend.set_interactive(True)
+
     def button_motion(self, drawing_area, event, start_button):
         self.do_translation(TranslateMouseMixin.button_motion(self, drawing_area, event, start_button), drawing_area)
 
+    def button_release(self, drawing_area, event):
+        context.application.vis_backend.set_interactive(False)
+        drawing_area.queue_draw()
+        TranslateMouseMixin.button_release(self, drawing_area, event)
+
 
 class TranslateWorldKeyboard(TranslateWorldBase, TranslateKeyboardMixin):
     description = "Translate world"
@@ -46,7 +46,7 @@ from zeobuilder.nodes.reference import SpatialReference
 from zeobuilder.nodes.vector import Vector
 from zeobuilder.undefined import Undefined
 from zeobuilder.gui.fields_dialogs import FieldsDialogSimple, DialogFieldInfo
-from zeobuilder.zml import dump_to_file, load_from_file
+from zeobuilder.zml import clone_subtree
 import zeobuilder.actions.primitive as primitive
 import zeobuilder.gui.fields as fields
 import zeobuilder.authors as authors
@@ -55,8 +55,6 @@ from molmod import Translation, UnitCell, angstrom
 
 import numpy, gtk
 
-import StringIO
-
 
 default_unit_cell = UnitCell(numpy.identity(3, float)*10*angstrom, numpy.zeros(3, bool))
 
@@ -206,6 +204,9 @@ class Universe(GLPeriodicContainer, FrameAxes):
         self.box_list = vb.create_list()
         ##print "Created box list (%i): %s" % (self.box_list, self.get_name())
         self.box_list_valid = True
+        self.images_list = vb.create_list()
+        self.image_translations = numpy.zeros((0, 3), float)
+        self.visible_images = None
         GLPeriodicContainer.initialize_gl(self)
 
     def cleanup_gl(self):
@@ -215,6 +216,10 @@ class Universe(GLPeriodicContainer, FrameAxes):
         vb.delete_list(self.box_list)
         del self.box_list
         del self.box_list_valid
+        vb.delete_list(self.images_list)
+        del self.images_list
+        del self.image_translations
+        del self.visible_images
         self.unset_clip_planes()
 
     #
@@ -372,22 +377,67 @@ class Universe(GLPeriodicContainer, FrameAxes):
 
                 if self.box_visible: vb.call_list(self.box_list)
 
-                # repeat the draw list for all the unit cell images.
+                # repeat the draw list for all the unit cell images. The
+                # images list is compiled in update_images_list.
                 if self.clipping:
                     repetitions = (self.repetitions + 2) * self.cell.active + 1 - self.cell.active
                 else:
                     repetitions = self.repetitions * self.cell.active + 1 - self.cell.active
-                for position in iter_all_positions(repetitions):
-                    vb.push_matrix()
-                    t = numpy.dot(self.cell.matrix, numpy.array(position) - self.cell.active * self.clipping)
-                    vb.translate(*t)
-                    vb.call_list(self.draw_list)
-                    vb.pop_matrix()
+                positions = numpy.array(list(iter_all_positions(repetitions)), float)
+                positions -= self.cell.active * self.clipping
+                self.image_translations = numpy.dot(positions, self.cell.matrix.transpose())
+                self.visible_images = None
+                context.application.scene.geometry_revision += 1
+                vb.call_list(self.images_list)
 
                 vb.pop_name()
             vb.end_list()
             self.total_list_valid = True
 
+    def get_visible_images(self, frustum=None):
+        """Returns a mask for the images that may be visible
+
+        An image is hidden when its bounding box lies entirely outside the
+        frustum (see Camera.get_frustum_planes) or outside one of the clip
+        planes.
+        """
+        visible = numpy.ones(len(self.image_translations), bool)
+        corners = self.bounding_box.corners
+        if corners is not None:
+            center = 0.5*(corners[0] + corners[1])
+            half = 0.5*(corners[1] - corners[0])
+            centers = self.image_translations + center
+            planes = list(context.application.scene.clip_planes)
+            if frustum is not None:
+                planes.extend(frustum)
+            for plane in planes:
+                # the largest value of the plane equation in each box
+                extent = numpy.dot(abs(plane[:3]), half)
+                visible &= numpy.dot(centers, plane[:3]) + plane[3] + extent >= 0
+        return visible
+
+    def update_images_list(self, frustum=None):
+        """Compiles the draw list calls for the images that may be visible
+
+        The images list is only recompiled when the set of visible images
+        changes, see get_visible_images. This must be called when no list is
+        being compiled.
+        """
+        if self.gl_active == 0:
+            return
+        visible = self.get_visible_images(frustum)
+        if self.visible_images is not None and (visible == self.visible_images).all():
+            return
+        vb = context.application.vis_backend
+        vb.begin_list(self.images_list)
+        for t in self.image_translations[visible]:
+            vb.push_matrix()
+            vb.translate(*t)
+            vb.call_list(self.draw_list)
+            vb.pop_matrix()
+        vb.end_list()
+        self.visible_images = visible
+
     def revalidate_bounding_box(self):
         GLPeriodicContainer.revalidate_bounding_box(self)
         FrameAxes.extend_bounding_box(self, self.bounding_box)
@@ -637,7 +687,7 @@ class SuperCell(ImmediateWithMemory):
 
         repetitions = numpy.array(repetitions, int)
 
-        # serialize the positioned children
+        # collect the positioned children
         universe = context.application.model.universe
 
         positioned = [
@@ -648,9 +698,6 @@ class SuperCell(ImmediateWithMemory):
         ]
         if len(positioned) == 0: return
 
-        serialized = StringIO.StringIO()
-        dump_to_file(serialized, positioned)
-
         # create the replica's
 
         # replicate the positioned objects
@@ -658,18 +705,13 @@ class SuperCell(ImmediateWithMemory):
         for cell_index in iter_all_positions(repetitions):
             cell_index = numpy.array(cell_index)
             cell_hash = tuple(cell_index)
-            serialized.seek(0)
-            nodes = load_from_file(serialized)
+            nodes = clone_subtree(positioned)
             new_children[cell_hash] = nodes
             for node in nodes:
                 t = node.transformation.t + numpy.dot(universe.cell.matrix, cell_index)
                 new_transformation = node.transformation.copy_with(t=t)
                 node.set_transformation(new_transformation)
 
-        # forget about serialized stuff
-        serialized.close()
-        del serialized
-
         new_connectors = []
         # replicate the objects that connect these positioned objects
         for cell_index in iter_all_positions(repetitions):
@@ -730,12 +772,11 @@ class SuperCell(ImmediateWithMemory):
         primitive.SetProperty(universe, "repetitions", numpy.array([1, 1, 1], int))
 
         # add the new nodes
+        new_nodes = []
         for nodes in new_children.itervalues():
-            for node in nodes:
-                primitive.Add(node, universe)
-
-        for connector in new_connectors:
-            primitive.Add(connector, universe)
+            new_nodes.extend(nodes)
+        new_nodes.extend(new_connectors)
+        primitive.AddMany(new_nodes, universe)
 
 
 class DefineUnitCellVectors(Immediate):
@@ -159,6 +159,14 @@ class RendererConfiguration(Immediate):
                 low=0.0,
                 low_inclusive=False,
             )),
+            fields.edit.CheckButton(
+                label_text="Draw atoms and bonds in batches (faster for large models)",
+                attribute_name="batched_rendering",
+            ),
+            fields.edit.CheckButton(
+                label_text="Reduce the detail of small or moving atoms and bonds",
+                attribute_name="level_of_detail",
+            ),
         ]),
         ((gtk.STOCK_CANCEL, gtk.RESPONSE_CANCEL), (gtk.STOCK_OK, gtk.RESPONSE_OK))
     )
@@ -62,8 +62,9 @@ class DumpZML(DumpFilter):
         DumpFilter.__init__(self, "Zeobuilder Markup Language (*.zml)")
 
     def __call__(self, f, universe, folder, nodes=None):
+        array_encoding = context.application.configuration.zml_array_encoding
         if nodes is None:
-            dump_to_file(f, [universe, folder])
+            dump_to_file(f, [universe, folder], array_encoding)
         else:
             Universe = context.application.plugins.get_node(name="Universe")
             new_universe = Universe()
@@ -71,7 +72,7 @@ class DumpZML(DumpFilter):
             Folder = context.application.plugins.get_node("Folder")
             new_folder = Folder(name="Root folder")
             new_folder.children = [node for node in nodes if node.is_indirect_child_of(folder)]
-            dump_to_file(f, [new_universe, new_folder])
+            dump_to_file(f, [new_universe, new_folder], array_encoding)
 
 
 load_filters = {
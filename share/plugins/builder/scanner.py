@@ -51,11 +51,11 @@ import zeobuilder.actions.primitive as primitive
 import zeobuilder.gui.fields as fields
 import zeobuilder.authors as authors
 
-from conscan import Geometry, ProgressMessage, Connection
+from conscan import Geometry, ProgressMessage, PartialResults, Connection
 
 from molmod import Rotation, Translation, angstrom
 
-import gtk, numpy, weakref
+import gtk, numpy, weakref, multiprocessing
 
 
 class ConscanResults(ReferentBase):
@@ -315,7 +315,7 @@ class ConscanReportDialog(ChildProcessDialog):
         )
         ChildProcessDialog.__init__(self, self.dialog, self.dialog.action_area.get_children())
 
-        table = gtk.Table(len(progress_items), 2, )
+        table = gtk.Table(len(progress_items)+1, 2)
         self.progress_bars = {}
         for index, (label, name) in enumerate(progress_items):
             l = gtk.Label("%s:" % name)
@@ -325,6 +325,15 @@ class ConscanReportDialog(ChildProcessDialog):
             self.progress_bars[label] = pb
             table.attach(pb, 1, 2, index, index+1)
 
+        # the qualities of the best connections found so far
+        l = gtk.Label("Best results so far:")
+        l.set_alignment(0.0, 0.5)
+        table.attach(l, 0, 1, len(progress_items), len(progress_items)+1)
+        self.la_partial_results = gtk.Label()
+        self.la_partial_results.set_alignment(0.0, 0.5)
+        self.la_partial_results.set_line_wrap(True)
+        table.attach(self.la_partial_results, 1, 2, len(progress_items), len(progress_items)+1)
+
         table.set_border_width(6)
         table.set_row_spacings(6)
         table.set_col_spacings(6)
@@ -337,6 +346,7 @@ class ConscanReportDialog(ChildProcessDialog):
         for pb in self.progress_bars.itervalues():
             pb.set_text("- / -")
             pb.set_fraction(0.0)
+        self.la_partial_results.set_text("-")
 
     def run(self, inp):
         self.clear_gui()
@@ -364,6 +374,10 @@ class ConscanReportDialog(ChildProcessDialog):
                 #print instance.label, "- / -"
                 pb.set_text("- / -")
                 pb.set_fraction(0.0)
+        elif isinstance(instance, PartialResults):
+            self.la_partial_results.set_text(", ".join(
+                "%.3f" % quality for quality in instance.qualities
+            ))
         elif isinstance(instance, Connection):
             self.connections.append(instance)
 
@@ -454,6 +468,21 @@ class ScanForConnections(ImmediateWithMemory):
                         low=0.0,
                         low_inclusive=False,
                     ),
+                    fields.faulty.Int(
+                        label_text="Number of processes",
+                        attribute_name="num_processes",
+                        minimum=1,
+                        maximum=multiprocessing.cpu_count(),
+                    ),
+                    fields.optional.CheckOptional(fields.faulty.Int(
+                        label_text="Maximum number of results",
+                        attribute_name="max_results",
+                        minimum=1,
+                    )),
+                    fields.optional.CheckOptional(fields.faulty.Float(
+                        label_text="Minimum quality",
+                        attribute_name="min_quality",
+                    )),
                     fields.group.Table(fields=[
                         fields.optional.RadioOptional(slave=fields.group.Table(fields=[
                             fields.edit.CheckButton(
@@ -524,6 +553,10 @@ class ScanForConnections(ImmediateWithMemory):
         result.action_radius = 7*angstrom
         result.distance_tolerance = 0.1*angstrom
         result.hit_tolerance = 0.1*angstrom
+        # a process pool is only started when the user asks for it
+        result.num_processes = 1
+        result.max_results = Undefined(50)
+        result.min_quality = Undefined(0.0)
         result.allow_inversions = True
         result.minimum_triangle_size = 0.1*angstrom
         result.rotation_tolerance = 0.05
@@ -611,6 +644,11 @@ class ScanForConnections(ImmediateWithMemory):
             inp["geometry2"] = None
         inp["action_radius"] = self.parameters.action_radius
         inp["hit_tolerance"] = self.parameters.hit_tolerance
+        inp["num_processes"] = self.parameters.num_processes
+        if not isinstance(self.parameters.max_results, Undefined):
+            inp["max_results"] = self.parameters.max_results
+        if not isinstance(self.parameters.min_quality, Undefined):
+            inp["min_quality"] = self.parameters.min_quality
         if not isinstance(self.parameters.allow_inversions, Undefined):
             inp["allow_rotations"] = True
             inp["allow_inversions"] = self.parameters.allow_inversions
@@ -226,6 +226,8 @@ class OptimizationReportDialog(ChildProcessDialog, GladeWrapper):
             [context.get_share_filename("helpers/iterative")],
             self.minimize, pickle=True
         )
+        # the last status may have been skipped by conditional_update_gui
+        self.update_gui()
 
         # just to avoid confusion
         del self.minimize
@@ -266,7 +268,8 @@ class OptimizationReportDialog(ChildProcessDialog, GladeWrapper):
                     t = variable.extract_state(state_index, self.status.state)
                     new_transformation = frame.transformation.copy_with(t=t)
                     frame.set_transformation(new_transformation)
-            context.application.main.drawing_area.queue_draw()
+            if context.parent_window is not None:
+                context.application.main.drawing_area.queue_draw()
 
     def on_receive(self, instance):
         if isinstance(instance, iterative.alg.Status):
@@ -278,10 +281,6 @@ class OptimizationReportDialog(ChildProcessDialog, GladeWrapper):
         else:
             self.state_indices = instance
 
-    def on_done(self):
-        ChildProcessDialog.on_done(self)
-        self.update_gui()
-
 
 def get_spring_problem(cache):
     class SpringProblem:
@@ -330,6 +329,18 @@ class OptimizeSprings(ImmediateWithMemory):
                 label_text="Allow free rotation",
                 attribute_name="allow_rotation",
             ),
+            fields.edit.ComboBox(
+                choices=[
+                    ("ConjugateGradient", "Conjugate gradient"),
+                    ("LBFGS", "L-BFGS"),
+                ],
+                label_text="Minimizer",
+                attribute_name="minimizer",
+            ),
+            fields.edit.CheckButton(
+                label_text="Wolfe line search (only L-BFGS)",
+                attribute_name="wolfe_line_search",
+            ),
             fields.faulty.Float(
                 label_text="Update interval [s]",
                 attribute_name="update_interval",
@@ -366,6 +377,8 @@ class OptimizeSprings(ImmediateWithMemory):
     def default_parameters(cls):
         result = Parameters()
         result.allow_rotation = True
+        result.minimizer = "ConjugateGradient"
+        result.wolfe_line_search = False
         result.update_interval = 0.4
         result.update_steps = 1
         return result
@@ -407,26 +420,33 @@ class OptimizeSprings(ImmediateWithMemory):
             else:
                 raise UserError("The involved frames shoud be at least capable of being translated.")
 
+        spring_set = iterative.expr.SpringSet()
         for spring, frames in springs.iteritems():
-            spring_term = iterative.expr.Spring(spring.rest_length)
+            endpoints = []
             for target, frame in frames.iteritems():
                 if frame is None:
-                    spring_term.register_input_variable(
-                        iterative.expressions.NoFrame(),
-                        target.get_frame_up_to(parent).t
-                    )
+                    endpoints.append(iterative.expressions.NoFrame())
+                    endpoints.append(target.get_frame_up_to(parent).t)
                 else:
-                    spring_term.register_input_variable(
-                        cost_function.state_variables[variable_indices[frame]],
-                        target.get_frame_up_to(frame).t
-                    )
+                    endpoints.append(cost_function.state_variables[variable_indices[frame]])
+                    endpoints.append(target.get_frame_up_to(frame).t)
+            spring_set.add_spring(*(endpoints + [spring.rest_length]))
 
         max_step = numpy.array(max_step, float)
-        minimize = iterative.alg.DefaultMinimize(
-            cost_function,
-            max_step,
-            max_step*1e-8,
-        )
+        Minimize = getattr(iterative.alg, self.parameters.minimizer)
+        if Minimize is iterative.alg.LBFGS:
+            minimize = Minimize(
+                cost_function,
+                max_step,
+                max_step*1e-8,
+                wolfe=self.parameters.wolfe_line_search,
+            )
+        else:
+            minimize = Minimize(
+                cost_function,
+                max_step,
+                max_step*1e-8,
+            )
 
         result = self.report_dialog.run(
             minimize,
@@ -437,8 +457,7 @@ class OptimizeSprings(ImmediateWithMemory):
         )
         if result != gtk.RESPONSE_OK:
             for frame, transformation in old_transformations:
-                frame.transformation = transformation
-                frame.invalidate_transformation_list()
+                frame.set_transformation(transformation)
             raise CancelException
 
         for frame, transformation in old_transformations:
@@ -241,6 +241,7 @@ class CreateTube(ImmediateWithMemory):
 
         # add the new atoms
         Atom = context.application.plugins.get_node("Atom")
+        atoms = []
         if self.parameters.flat:
             rot_a = numpy.dot(rotation, big_a)
             rot_b = numpy.dot(rotation, big_b)
@@ -256,7 +257,7 @@ class CreateTube(ImmediateWithMemory):
                     coordinate[:2] += p
                     coordinate[:2] = numpy.dot(rotation, coordinate[:2])
                     translation = Translation(coordinate)
-                    primitive.Add(Atom(number=number, transformation=translation), universe)
+                    atoms.append(Atom(number=number, transformation=translation))
         else:
             tube_length = numpy.linalg.norm(big_b)
             big_matrix = numpy.diag([radius*2, radius*2, tube_length])
@@ -271,7 +272,8 @@ class CreateTube(ImmediateWithMemory):
                         (radius+coordinate[2])*numpy.sin(coordinate[0]/radius),
                         coordinate[1],
                     ]))
-                    primitive.Add(Atom(number=number, transformation=translation), universe)
+                    atoms.append(Atom(number=number, transformation=translation))
+        primitive.AddMany(atoms, universe)
 
 
 
@@ -47,7 +47,7 @@ import zeobuilder.gui.fields as fields
 import zeobuilder.actions.primitive as primitive
 import zeobuilder.authors as authors
 
-from molmod import Translation, UnitCell, PairSearchIntra, ClusterFactory
+from molmod import Translation, ClusterFactory
 from molmod.periodic import periodic
 
 import numpy
@@ -56,6 +56,7 @@ import numpy
 class Atom(GLGeometricBase, UserColorMixin):
     info = ModelObjectInfo("plugins/molecular/atom.svg")
     authors = [authors.toon_verstraelen]
+    batchable = True
 
     #
     # State
@@ -141,6 +142,9 @@ class Atom(GLGeometricBase, UserColorMixin):
         vb = context.application.vis_backend
         vb.draw_sphere(self.get_radius(), self.quality)
 
+    def add_to_batch(self, batch):
+        batch.add_sphere(self.transformation.t, self.get_radius(), self.get_color(), self.quality)
+
     #
     # Revalidation
     #
@@ -218,23 +222,12 @@ class MergeOverlappingAtoms(Immediate):
         cache = context.application.cache
         parent = cache.node
 
-        unit_cell = None
-        if isinstance(parent, UnitCell):
-            unit_cell = parent
-
         Atom = context.application.plugins.get_node("Atom")
-        atoms = []
-        coordinates = []
-        for child in parent.children:
-            if isinstance(child, Atom):
-                atoms.append(child)
-                coordinates.append(child.transformation.t)
-        coordinates = numpy.array(coordinates)
+        atoms = [child for child in parent.children if isinstance(child, Atom)]
 
         cf = ClusterFactory()
-        for i0, i1, delta, distance in PairSearchIntra(coordinates, periodic.max_radius*0.4, unit_cell):
-            atom0 = atoms[i0]
-            atom1 = atoms[i1]
+        spatial_index = parent.get_spatial_index()
+        for atom0, atom1, delta, distance in spatial_index.iter_pairs(periodic.max_radius*0.4, atoms):
             if atom0.number == atom1.number:
                 if distance < periodic[atom0.number].vdw_radius*0.4:
                     cf.add_related(atom0, atom1)
@@ -51,6 +51,7 @@ import numpy, gtk
 class Bond(Vector):
     info = ModelObjectInfo("plugins/molecular/bond.svg")
     authors = [authors.toon_verstraelen]
+    batchable = True
 
     #
     # State
@@ -148,6 +149,25 @@ class Bond(Vector):
         vb.set_color(*end.get_color())
         vb.draw_cone(half_radius, self.end_radius, half_length, self.quality)
 
+    def add_to_batch(self, batch):
+        self.calc_vector_dimensions()
+        if self.length <= 0: return
+        half_length = 0.5 * (self.end_position - self.begin_position)
+        if half_length <= 0: return
+        half_radius = 0.5 * (self.begin_radius + self.end_radius)
+
+        begin = self.children[0].target
+        end = self.children[1].target
+
+        batch.add_cone(
+            self.orientation, self.begin_position, half_length,
+            self.begin_radius, half_radius, begin.get_color(), self.quality
+        )
+        batch.add_cone(
+            self.orientation, self.begin_position + half_length, half_length,
+            half_radius, self.end_radius, end.get_color(), self.quality
+        )
+
     #
     # Revalidation
     #
@@ -35,7 +35,7 @@
 from zeobuilder import context
 from zeobuilder.actions.composed import ImmediateWithMemory, Parameters, UserError
 from zeobuilder.actions.collections.menu import MenuInfo
-from zeobuilder.moltools import create_molecular_graph
+from zeobuilder.moltools import get_molecular_graph
 from zeobuilder.gui.fields_dialogs import FieldsDialogSimple
 from zeobuilder.gui.glade_wrapper import GladeWrapper
 from zeobuilder.gui.simple import ask_save_filename
@@ -264,7 +264,7 @@ class DistributionBondLengths(ImmediateWithMemory):
         if parent is None:
             parent = context.application.model.universe
         lengths = []
-        graph = create_molecular_graph(context.application.cache.nodes)
+        graph = get_molecular_graph(context.application.cache.nodes)
 
         match_definition = BondPattern(
             criteria_sets=[CriteriaSet(
@@ -383,7 +383,7 @@ class DistributionBendingAngles(ImmediateWithMemory):
         if parent is None:
             parent = context.application.model.universe
         angles = []
-        graph = create_molecular_graph(context.application.cache.nodes)
+        graph = get_molecular_graph(context.application.cache.nodes)
 
         match_definition = BendingAnglePattern(
             criteria_sets=[CriteriaSet(
@@ -526,7 +526,7 @@ class DistributionDihedralAngles(ImmediateWithMemory):
         if parent is None:
             parent = context.application.model.universe
         angles = []
-        graph = create_molecular_graph(context.application.cache.nodes)
+        graph = get_molecular_graph(context.application.cache.nodes)
 
         match_definition = DihedralAnglePattern(
             criteria_sets=[CriteriaSet(
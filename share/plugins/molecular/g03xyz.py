@@ -36,7 +36,7 @@ import numpy
 
 from zeobuilder import context
 from zeobuilder.filters import LoadFilter, DumpFilter, FilterError
-from zeobuilder.nodes.glcontainermixin import GLContainerMixin
+from zeobuilder.moltools import get_coordinates
 import zeobuilder.authors as authors
 
 
@@ -113,8 +113,10 @@ class DumpG03XYZ(DumpFilter):
         Atom = context.application.plugins.get_node("Atom")
         Point = context.application.plugins.get_node("Point")
 
-        def atom_line(atom):
-            coordinate = atom.get_frame_relative_to(universe).t/angstrom
+        atoms = self.collect_nodes(nodes, (Atom, Point))
+        coordinates = get_coordinates(atoms, universe, exact=True)/angstrom
+        rows = []
+        for atom, coordinate in zip(atoms, coordinates.tolist()):
             if isinstance(atom, Point):
                 symbol = "X"
             else:
@@ -124,19 +126,8 @@ class DumpG03XYZ(DumpFilter):
             if atom.extra.get("fixed", 0):
                 symbol += " -1"
             oniom = str(atom.extra.get("oniom", ""))
-            print >> f, "  %s % 13.6f% 13.6f% 13.6f %s" % (
-                symbol.ljust(7), coordinate[0], coordinate[1], coordinate[2], oniom
-            )
-
-        def write_xyz_lines(nodes):
-            for node in nodes:
-                if isinstance(node, Atom) or isinstance(node, Point):
-                    atom_line(node)
-                else:
-                    if isinstance(node, GLContainerMixin):
-                        write_xyz_lines(node.children)
-
-        write_xyz_lines(nodes)
+            rows.append([symbol.ljust(7)] + coordinate + [oniom])
+        self.write_lines(f, "  %s % 13.6f% 13.6f% 13.6f %s", rows)
 
 
 load_filters = {
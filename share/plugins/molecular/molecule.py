@@ -44,14 +44,15 @@ from zeobuilder.gui.simple import ok_information, ok_error, ask_save_filename
 from zeobuilder.gui.fields_dialogs import FieldsDialogSimple
 from zeobuilder.gui.glade_wrapper import GladeWrapper
 from zeobuilder.expressions import Expression
-from zeobuilder.moltools import iter_atoms, chemical_formula, create_molecular_graph
+from zeobuilder.moltools import iter_atoms, chemical_formula, create_molecular_graph, \
+    get_molecular_graph, get_rings
 import zeobuilder.gui.fields as fields
 import zeobuilder.actions.primitive as primitive
 import zeobuilder.authors as authors
 
 from molmod.periodic import periodic
 from molmod.bonds import bonds, BOND_SINGLE, BOND_DOUBLE, BOND_TRIPLE
-from molmod import Translation, Complete, Rotation, EqualPattern, RingPattern, \
+from molmod import Translation, Complete, Rotation, EqualPattern, \
     GraphSearch, random_orthonormal, deg, GraphError
 
 import numpy, gtk, sys, traceback
@@ -824,9 +825,7 @@ class StrongRingDistribution(Immediate):
         return True
 
     def do(self):
-        graph = create_molecular_graph(context.application.cache.nodes)
-        match_generator = GraphSearch(RingPattern(20))
-        rings = list(match_generator(graph))
+        graph, rings = get_rings(context.application.cache.nodes, 20)
 
         ring_distribution_window = RingDistributionWindow()
         ring_distribution_window.show(rings, graph)
@@ -891,7 +890,7 @@ class FrameMolecules(Immediate):
     def do(self):
         cache = context.application.cache
 
-        graph = create_molecular_graph(cache.nodes)
+        graph = get_molecular_graph(cache.nodes)
         parent = cache.node
 
         Frame = context.application.plugins.get_node("Frame")
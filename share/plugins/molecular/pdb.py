@@ -40,7 +40,7 @@ import numpy
 
 from zeobuilder import context
 from zeobuilder.filters import LoadFilter, DumpFilter, FilterError
-from zeobuilder.nodes.glcontainermixin import GLContainerMixin
+from zeobuilder.moltools import get_coordinates
 import zeobuilder.authors as authors
 
 from molmod.periodic import periodic
@@ -59,29 +59,19 @@ class LoadPDB(LoadFilter):
         Folder = context.application.plugins.get_node("Folder")
         folder = Folder()
 
-        Atom = context.application.plugins.get_node("Atom")
+        # A) collect the records, the ATOM and HETATM lines are parsed in bulk
+        atom_lines = []
+        atom_counters = []
+        conect_lines = []
         counter = 1
-        atom_index =  0
         for line in f:
             #if len(line) != 81:
             #    raise FilterError("Each line in a PDB file must count 80 characters, error at line %i, len=%i" % (counter, len(line)-1))
-            if line.startswith("ATOM"):
-                extra = {"index": atom_index}
-                atom_info = periodic[line[76:78].strip()]
-                try:
-                    t = numpy.array([
-                            float(line[30:38].strip()),
-                            float(line[38:46].strip()),
-                            float(line[46:54].strip())
-                    ]) * angstrom
-                except ValueError:
-                    raise FilterError("Error while reading PDB file: could not read coordinates at line %i." % counter)
-                atom = Atom(
-                    name=line[12:16].strip(), number=atom_info.number,
-                    transformation=Translation(t), extra=extra
-                )
-                universe.add(atom)
-                atom_index += 1
+            if line.startswith("ATOM") or line.startswith("HETATM"):
+                atom_lines.append(line)
+                atom_counters.append(counter)
+            elif line.startswith("CONECT"):
+                conect_lines.append((counter, line))
             elif line.startswith("CRYST1"):
                 space_group = line[55:66].strip().upper()
                 if space_group != "P 1":
@@ -95,8 +85,78 @@ class LoadPDB(LoadFilter):
                 universe.set_cell(UnitCell.from_parameters3([a, b, c], [alpha, beta, gamma]))
             counter += 1
 
+        coordinates = self.parse_columns(atom_lines, atom_counters, [(30, 38), (38, 46), (46, 54)], float, "coordinates")*angstrom
+        numbers = self.parse_elements(atom_lines, atom_counters)
+
+        # B) create all nodes and add them at once
+        Atom = context.application.plugins.get_node("Atom")
+        atoms = [
+            Atom(
+                name=line[12:16].strip(), number=number,
+                transformation=Translation(coordinate), extra={"index": atom_index}
+            ) for atom_index, line, number, coordinate
+            in zip(xrange(len(atom_lines)), atom_lines, numbers, coordinates)
+        ]
+        bonds = self.create_bonds(atom_lines, atom_counters, atoms, conect_lines)
+        universe.add_many(atoms + bonds)
+
         return [universe, folder]
 
+    def parse_columns(self, lines, counters, columns, dtype, what):
+        # the fixed-width fields are converted by numpy in one go
+        fields = numpy.array([
+            [line[begin:end] for begin, end in columns] for line in lines
+        ], str).reshape((len(lines), len(columns)))
+        try:
+            return fields.astype(dtype)
+        except ValueError:
+            for counter, row in zip(counters, fields):
+                try:
+                    row.astype(dtype)
+                except ValueError:
+                    raise FilterError("Error while reading PDB file: could not read %s at line %i." % (what, counter))
+            raise
+
+    def parse_elements(self, lines, counters):
+        # there are only a few different symbols
+        symbols = [line[76:78].strip() for line in lines]
+        numbers = {}
+        for symbol in set(symbols):
+            atom_info = periodic[symbol]
+            if atom_info is None:
+                counter = counters[symbols.index(symbol)]
+                raise FilterError("Error while reading PDB file: unknown element '%s' at line %i." % (symbol, counter))
+            numbers[symbol] = atom_info.number
+        return [numbers[symbol] for symbol in symbols]
+
+    def create_bonds(self, atom_lines, atom_counters, atoms, conect_lines):
+        if len(conect_lines) == 0:
+            return []
+        serials = self.parse_columns(atom_lines, atom_counters, [(6, 11)], int, "the atom serial number")
+        atoms_by_serial = dict(zip(serials[:,0], atoms))
+        # each bond is usually listed twice
+        pairs = set([])
+        for counter, line in conect_lines:
+            fields = [line[begin:begin+5].strip() for begin in xrange(6, 31, 5)]
+            try:
+                fields = [int(field) for field in fields if len(field) > 0]
+                first = atoms_by_serial[fields[0]]
+                for serial in fields[1:]:
+                    other = atoms_by_serial[serial]
+                    if first.extra["index"] < other.extra["index"]:
+                        pairs.add((first, other))
+                    elif first is not other:
+                        pairs.add((other, first))
+            except (ValueError, IndexError, KeyError):
+                raise FilterError("Error while reading PDB file: invalid CONECT record at line %i." % counter)
+
+        Bond = context.application.plugins.get_node("Bond")
+        bonds = []
+        for first, second in sorted(pairs, key=(lambda pair: (pair[0].extra["index"], pair[1].extra["index"]))):
+            name = "Bond %i" % len(bonds)
+            bonds.append(Bond(name=name, targets=[first, second]))
+        return bonds
+
 
 class DumpPDB(DumpFilter):
     authors = [authors.toon_verstraelen]
@@ -118,18 +178,13 @@ class DumpPDB(DumpFilter):
                 a, b, c, alpha, beta, gamma
             )
         print >> f, "MODEL        1                                                                  "
-        self.counter = 1
-        def write_xyz_lines(nodes):
-            for node in nodes:
-                if isinstance(node, Atom):
-                    x, y, z = node.get_frame_relative_to(universe).t/angstrom
-                    s = periodic[node.number].symbol.upper()
-                    print >> f, "ATOM  % 5i % 4s FOO     1    % 8.3f% 8.3f% 8.3f  1.00  1.00          % 2s 0" % (self.counter, s, x, y, z, s)
-                    self.counter += 1
-                else:
-                    if isinstance(node, GLContainerMixin):
-                        write_xyz_lines(node.children)
-        write_xyz_lines(nodes)
+        atoms = self.collect_nodes(nodes, Atom)
+        coordinates = get_coordinates(atoms, universe, exact=True)/angstrom
+        rows = []
+        for counter, atom, (x, y, z) in zip(xrange(1, len(atoms)+1), atoms, coordinates.tolist()):
+            s = periodic[atom.number].symbol.upper()
+            rows.append((counter, s, x, y, z, s))
+        self.write_lines(f, "ATOM  % 5i % 4s FOO     1    % 8.3f% 8.3f% 8.3f  1.00  1.00          % 2s 0", rows)
         print >> f, "ENDMDL                                                                          "
 
 
@@ -33,7 +33,7 @@
 
 
 from zeobuilder.filters import DumpFilter
-from zeobuilder.moltools import create_molecular_graph
+from zeobuilder.moltools import get_molecular_graph
 import zeobuilder.authors as authors
 
 from molmod.io import PSFFile
@@ -50,7 +50,7 @@ class DumpPSF(DumpFilter):
         if nodes is None:
             nodes = [universe]
 
-        graph = create_molecular_graph([universe])
+        graph = get_molecular_graph([universe])
         names = [atom.name for atom in graph.molecule.atoms]
         charges = [atom.extra.get("charge", 0.0) for atom in graph.molecule.atoms]
         psf_file = PSFFile()
@@ -33,14 +33,91 @@
 
 
 from zeobuilder import context
+from zeobuilder.actions.composed import ImmediateWithMemory, UserError, Parameters
+from zeobuilder.actions.collections.menu import MenuInfo
 from zeobuilder.filters import LoadFilter, DumpFilter, FilterError
+from zeobuilder.moltools import get_coordinates
 from zeobuilder.nodes.glcontainermixin import GLContainerMixin
+from zeobuilder.gui.fields_dialogs import FieldsDialogSimple
+import zeobuilder.gui.fields as fields
+import zeobuilder.actions.primitive as primitive
 import zeobuilder.authors as authors
 
 from molmod.io import XYZReader
 from molmod.periodic import periodic
 from molmod import angstrom, Translation
 
+import numpy, gtk, os
+
+
+class XYZTrajectory(object):
+    """The frames of a multi-frame XYZ file, loaded on demand
+
+    Only the offsets of the frames in the file are kept in memory.
+    """
+    chunk_size = 4*1024*1024
+
+    def __init__(self, filename, size):
+        """
+        Arguments:
+            filename  --  an uncompressed XYZ file
+            size  --  the number of atoms in each frame
+        """
+        self.filename = filename
+        self.size = size
+        self.offsets = self.scan_offsets()
+        self.current = 0
+
+    def scan_offsets(self):
+        # Every frame has size+2 lines. Only the positions of the newlines
+        # are needed to locate the frames, which is done in large chunks.
+        lines_per_frame = self.size + 2
+        ends = []
+        num_lines = 0
+        offset = 0
+        f = file(self.filename, "rb")
+        try:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if len(chunk) == 0:
+                    break
+                newlines = numpy.flatnonzero(numpy.frombuffer(chunk, numpy.uint8) == 10)
+                # the newlines that end a frame
+                first = (-num_lines - 1) % lines_per_frame
+                ends.append(newlines[first::lines_per_frame] + offset)
+                num_lines += len(newlines)
+                offset += len(chunk)
+                last = chunk[-1]
+        finally:
+            f.close()
+        if offset > 0 and last != "\n" and (num_lines + 1) % lines_per_frame == 0:
+            # the last line has no newline
+            ends.append(numpy.array([offset]))
+        # an incomplete last frame is ignored
+        ends = numpy.concatenate([numpy.array([-1])] + ends)
+        return ends[:-1] + 1
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get_frame(self, index):
+        """Returns the title and the coordinates of a frame"""
+        f = file(self.filename, "rb")
+        try:
+            f.seek(self.offsets[index])
+            lines = [f.readline() for counter in xrange(self.size + 2)]
+        finally:
+            f.close()
+        try:
+            if int(lines[0]) != self.size:
+                raise ValueError
+            coordinates = numpy.array([
+                line.split()[1:4] for line in lines[2:]
+            ], float)*angstrom
+        except ValueError:
+            raise FilterError("Could not read frame %i from the XYZ file." % index)
+        return lines[1].strip(), coordinates
+
 
 class LoadXYZ(LoadFilter):
     authors = [authors.toon_verstraelen]
@@ -76,9 +153,12 @@ class LoadXYZ(LoadFilter):
                 atom = Atom(name=symbol, number=number, extra=extra, transformation=transl)
             universe.add(atom)
 
-        geometries = []
-        for title, coordinates in xyz_reader:
-            geometries.append(coordinates)
+        # Only uncompressed files can be indexed. The other frames are read
+        # with the action TrajectoryFrame.
+        if isinstance(f, file):
+            trajectory = XYZTrajectory(os.path.abspath(f.name), molecule.size)
+            if len(trajectory) > 1:
+                universe.trajectory = trajectory
 
         return [universe, folder]
 
@@ -97,43 +177,98 @@ class DumpXYZ(DumpFilter):
         Atom = context.application.plugins.get_node("Atom")
         Point = context.application.plugins.get_node("Point")
 
-        def count_xyz_lines(nodes):
-            result = 0
-            for node in nodes:
-                if isinstance(node, Atom):
-                    result += 1
-                if isinstance(node, Point):
-                    result += 1
-                else:
-                    if isinstance(node, GLContainerMixin):
-                        result += count_xyz_lines(node.children)
-            return result
-
-        def atom_line(atom):
-            coordinate = atom.get_frame_relative_to(universe).t
-            print >> f, "% 2s % 13.6f% 13.6f% 13.6f" % (
-                (periodic[atom.number].symbol,) + tuple(coordinate/angstrom)
-            )
-
-        def point_line(atom):
-            coordinate = atom.get_frame_relative_to(universe).t
-            print >> f, " X % 13.6f% 13.6f% 13.6f" % (
-                tuple(coordinate/angstrom)
-            )
-
-        def write_xyz_lines(nodes):
-            for node in nodes:
-                if isinstance(node, Atom):
-                    atom_line(node)
-                if isinstance(node, Point):
-                    point_line(node)
-                else:
-                    if isinstance(node, GLContainerMixin):
-                        write_xyz_lines(node.children)
-
-        print >> f, ("% 5u" % count_xyz_lines(nodes))
+        atoms = self.collect_nodes(nodes, (Atom, Point))
+        coordinates = get_coordinates(atoms, universe, exact=True)/angstrom
+        rows = []
+        for atom, coordinate in zip(atoms, coordinates.tolist()):
+            if isinstance(atom, Atom):
+                symbol = periodic[atom.number].symbol
+            else:
+                symbol = "X"
+            rows.append([symbol] + coordinate)
+
+        print >> f, ("% 5u" % len(atoms))
         print >> f, nodes[0].name
-        write_xyz_lines(nodes)
+        self.write_lines(f, "% 2s % 13.6f% 13.6f% 13.6f", rows)
+
+
+class SetTrajectoryFrame(primitive.Primitive):
+    # the current frame is part of the undo history, such that the default
+    # frame keeps following the coordinates shown in the model
+    def __init__(self, universe, frame):
+        self.victim = universe
+        self.new_frame = frame
+        self.old_frame = None
+        primitive.Primitive.__init__(self, False)
+
+    def redo(self):
+        primitive.Primitive.redo(self)
+        trajectory = self.victim.trajectory
+        self.old_frame = trajectory.current
+        trajectory.current = self.new_frame
+
+    def undo(self):
+        primitive.Primitive.undo(self)
+        self.victim.trajectory.current = self.old_frame
+
+
+class TrajectoryFrame(ImmediateWithMemory):
+    description = "Show another frame of the XYZ trajectory"
+    menu_info = MenuInfo("default/_Object:tools/_Molecular:rearrange", "_Trajectory frame", order=(0, 4, 1, 5, 0, 5))
+    authors = [authors.toon_verstraelen]
+    store_last_parameters = False
+
+    parameters_dialog = FieldsDialogSimple(
+        "Trajectory frame",
+        fields.faulty.Int(
+            attribute_name="frame",
+            label_text="Frame (counting from zero)",
+            minimum=0,
+        ),
+        ((gtk.STOCK_CANCEL, gtk.RESPONSE_CANCEL), (gtk.STOCK_OK, gtk.RESPONSE_OK))
+    )
+
+    @staticmethod
+    def analyze_selection(parameters=None):
+        # A) calling ancestor
+        if not ImmediateWithMemory.analyze_selection(parameters): return False
+        # B) validating
+        universe = context.application.model.universe
+        if getattr(universe, "trajectory", None) is None: return False
+        # C) passed all tests:
+        return True
+
+    @classmethod
+    def default_parameters(cls):
+        result = Parameters()
+        trajectory = context.application.model.universe.trajectory
+        result.frame = (trajectory.current + 1) % len(trajectory)
+        return result
+
+    def do(self):
+        universe = context.application.model.universe
+        trajectory = universe.trajectory
+        if self.parameters.frame >= len(trajectory):
+            raise UserError("The trajectory has only %i frames." % len(trajectory))
+        try:
+            title, coordinates = trajectory.get_frame(self.parameters.frame)
+        except (FilterError, IOError), e:
+            raise UserError(str(e))
+
+        # the atoms are updated in place, also when they are moved into frames
+        Atom = context.application.plugins.get_node("Atom")
+        Point = context.application.plugins.get_node("Point")
+        def update(nodes):
+            for node in nodes:
+                if isinstance(node, Atom) or isinstance(node, Point):
+                    index = node.extra.get("index")
+                    if index is not None and index < len(coordinates):
+                        translation = Translation(node.get_parentframe_up_to(universe).inv * coordinates[index])
+                        primitive.SetProperty(node, "transformation", translation)
+                elif isinstance(node, GLContainerMixin):
+                    update(node.children)
+        update(universe.children)
+        SetTrajectoryFrame(universe, self.parameters.frame)
 
 
 load_filters = {
@@ -144,4 +279,7 @@ dump_filters = {
     "xyz": DumpXYZ(),
 }
 
+actions = {
+    "TrajectoryFrame": TrajectoryFrame,
+}
 
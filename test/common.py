@@ -33,14 +33,14 @@
 
 
 from zeobuilder import context
-from zeobuilder.application import TestApplication
+from zeobuilder.application import TestApplication, HeadlessApplication
 
 import gtk, numpy
 
 import unittest
 
 
-__all__ = ["run_application", "assert_arrays_almost_equal"]
+__all__ = ["run_application", "run_headless", "assert_arrays_almost_equal"]
 
 
 def run_application(fn, quit=True):
@@ -55,6 +55,16 @@ def run_application(fn, quit=True):
             error_message,
         ))
 
+def run_headless(fn):
+    application = HeadlessApplication()
+    try:
+        fn()
+    finally:
+        application.model.file_close()
+        del context.application
+        del context.parent_window
+        del application
+
 def assert_arrays_almost_equal(a, b, err_threshold=1e-5, do_abserr=False, verbose=False):
     def log(s):
         if verbose: print s
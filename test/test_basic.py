@@ -39,7 +39,7 @@ from zeobuilder.actions.composed import Parameters
 from zeobuilder.expressions import Expression
 import zeobuilder.actions.primitive as primitive
 
-from molmod import Rotation, Translation, Complete
+from molmod import Rotation, Translation, Complete, UnitCell, angstrom
 
 import numpy
 
@@ -313,6 +313,264 @@ def test_connect_arrow():
         ConnectArrow()
     run_application(fn)
 
+def test_pick_rotated_arrow():
+    def fn():
+        from zeobuilder.gui.visual.picking import Picker
+        FileNew = context.application.plugins.get_action("FileNew")
+        FileNew()
+        universe = context.application.model.universe
+        for counter in xrange(2):
+            context.application.main.select_nodes([universe])
+            AddPoint = context.application.plugins.get_action("AddPoint")
+            AddPoint()
+        universe.children[1].set_transformation(Translation(numpy.array([5.0, 0.0, 0.0])))
+        context.application.main.select_nodes(universe.children)
+        ConnectArrow = context.application.plugins.get_action("ConnectArrow")
+        ConnectArrow()
+        arrow = universe.children[2]
+        # the arrow lies along the x-axis, its bounding box along the z-axis
+        # of its orientation frame.
+        arrow.revalidate_bounding_box() # normally done while drawing
+        picker = Picker()
+        picker.update()
+        direction = numpy.array([0.0, 0.0, -1.0])
+        distances, owners = picker.hit_boxes(numpy.array([2.5, 0.0, 10.0]), direction)
+        hits = [picker.nodes[owner] for owner in owners[distances >= 0]]
+        assert arrow in hits
+        distances, owners = picker.hit_boxes(numpy.array([0.0, 10.0, 4.0]), numpy.array([0.0, -1.0, 0.0]))
+        hits = [picker.nodes[owner] for owner in owners[distances >= 0]]
+        assert arrow not in hits
+    run_application(fn)
+
+def redraw():
+    # revalidates the nodes and the periodic images, as in an expose event
+    drawing_area = context.application.main.drawing_area
+    drawing_area.queue_draw()
+    drawing_area.window.process_updates(True)
+
+def set_test_camera():
+    # an orthographic view along the negative z-axis with 20 pixels per
+    # angstrom when the drawing area has 400x400 pixels.
+    camera = context.application.camera
+    camera.reset()
+    camera.opening_angle = 0.0
+    camera.window_size = 20*angstrom
+    camera.window_depth = 100*angstrom
+    camera.eye = Translation(numpy.array([0.0, 0.0, 50.0])*angstrom)
+
+def test_pick_atoms_and_bonds():
+    def fn():
+        from zeobuilder.gui.visual.picking import Picker
+        FileNew = context.application.plugins.get_action("FileNew")
+        FileNew()
+        universe = context.application.model.universe
+        Atom = context.application.plugins.get_node("Atom")
+        Frame = context.application.plugins.get_node("Frame")
+        def add_atom(parent, number, position, radius):
+            atom = Atom(
+                number=number, user_radius=radius*angstrom,
+                transformation=Translation(numpy.array(position)*angstrom)
+            )
+            parent.add(atom)
+            return atom
+        def add_bond(atoms):
+            context.application.main.select_nodes(atoms)
+            ConnectSingleBond = context.application.plugins.get_action("ConnectSingleBond")
+            ConnectSingleBond()
+            return atoms[0].parent.children[-1]
+        # a tapered bond along the x-axis
+        carbon = add_atom(universe, 6, [-3.0, -3.0, 0.0], 0.5)
+        oxygen = add_atom(universe, 8, [3.0, -3.0, 0.0], 0.8)
+        co_bond = add_bond([carbon, oxygen])
+        hidden = add_atom(universe, 1, [3.0, -3.0, -3.0], 0.5)
+        # a bond along the y-axis in a rotated frame
+        frame = Frame(transformation=Complete.from_properties(
+            0.5*numpy.pi, [0, 0, 1], False, numpy.array([-3.0, 3.0, 0.0])*angstrom
+        ))
+        universe.add(frame)
+        nitrogen = add_atom(frame, 7, [-1.5, -1.0, 0.0], 0.5)
+        hydrogen = add_atom(frame, 1, [1.5, -1.0, 0.0], 0.3)
+        nh_bond = add_bond([nitrogen, hydrogen])
+        redraw()
+        set_test_camera()
+
+        # the pixel coordinates are (200 + 20*x, 200 - 20*y)
+        picker = Picker()
+        assert picker.get_nearest(140, 260, 400, 400) is carbon
+        assert picker.get_nearest(260, 260, 400, 400) is oxygen
+        assert picker.get_nearest(200, 260, 400, 400) is co_bond
+        assert picker.get_nearest(200, 270, 400, 400) is None
+        assert picker.get_nearest(160, 170, 400, 400) is nitrogen
+        assert picker.get_nearest(160, 110, 400, 400) is hydrogen
+        assert picker.get_nearest(160, 140, 400, 400) is nh_bond
+        assert picker.get_nearest(180, 140, 400, 400) is None
+        # the origin of the frame
+        assert picker.get_nearest(140, 140, 400, 400) is frame
+        assert picker.get_nearest(340, 60, 400, 400) is None
+        # the bond consists of two cones that meet with flat ends in the
+        # middle. A ray just next to the middle only hits the second cone.
+        assert (picker.nodes[picker.cone_owners[0]], picker.nodes[picker.cone_owners[1]]) == (co_bond, co_bond)
+        origin = picker.cone_ends[0] + numpy.array([0.01, 0.1, 10.0])*angstrom
+        distances, owners = picker.hit_cones(origin, numpy.array([0.0, 0.0, -1.0]))
+        assert distances[0] < 0
+        assert distances[1] > 0
+
+        hits = set(picker.iter_hits((245, 245, 275, 275), 400, 400))
+        assert hits == set([oxygen, hidden, co_bond])
+        hits = set(picker.iter_hits((120, 240, 280, 280), 400, 400))
+        assert hits == set([carbon, oxygen, hidden, co_bond])
+        hits = set(picker.iter_hits((150, 95, 170, 105), 400, 400))
+        assert hits == set([hydrogen])
+        hits = set(picker.iter_hits((150, 80, 170, 180), 400, 400))
+        assert hits == set([nitrogen, hydrogen, nh_bond, frame])
+        hits = set(picker.iter_hits((300, 300, 390, 390), 400, 400))
+        assert len(hits) == 0
+    run_application(fn)
+
+def test_pick_periodic():
+    def fn():
+        from zeobuilder.gui.visual.picking import Picker
+        FileNew = context.application.plugins.get_action("FileNew")
+        FileNew()
+        universe = context.application.model.universe
+        universe.set_cell(UnitCell(numpy.identity(3, float)*5*angstrom))
+        universe.set_repetitions(numpy.array([2, 1, 1]))
+        universe.set_clipping(True)
+        Atom = context.application.plugins.get_node("Atom")
+        # the upper half of the top atom sticks out of the clip planes
+        top = Atom(number=6, user_radius=0.5*angstrom, transformation=Translation(numpy.array([1.0, 1.0, 4.8])*angstrom))
+        universe.add(top)
+        bottom = Atom(number=8, user_radius=0.5*angstrom, transformation=Translation(numpy.array([1.0, 1.0, 3.0])*angstrom))
+        universe.add(bottom)
+        redraw()
+        set_test_camera()
+
+        # the model center is (5, 2.5, 2.5) angstrom, so the pixel coordinates
+        # are (100 + 20*x, 250 - 20*y)
+        picker = Picker()
+        assert picker.get_nearest(120, 230, 400, 400) is bottom
+        # the image shifted along the a-axis
+        assert picker.get_nearest(220, 230, 400, 400) is bottom
+        # images outside the clip planes
+        assert picker.get_nearest(20, 230, 400, 400) is None
+        assert picker.get_nearest(320, 230, 400, 400) is None
+        assert picker.get_nearest(220, 130, 400, 400) is None
+        assert picker.get_nearest(220, 330, 400, 400) is None
+        hits = set(picker.iter_hits((205, 215, 235, 245), 400, 400))
+        assert hits == set([top, bottom])
+        hits = set(picker.iter_hits((5, 215, 35, 245), 400, 400))
+        assert len(hits) == 0
+        hits = set(picker.iter_hits((305, 215, 335, 245), 400, 400))
+        assert len(hits) == 0
+
+        universe.set_clipping(False)
+        redraw()
+        assert picker.get_nearest(120, 230, 400, 400) is top
+        assert picker.get_nearest(220, 230, 400, 400) is top
+        assert picker.get_nearest(20, 230, 400, 400) is None
+    run_application(fn)
+
+def test_frustum_planes():
+    def fn():
+        FileNew = context.application.plugins.get_action("FileNew")
+        FileNew()
+        camera = context.application.camera
+        def outside(planes, point):
+            # the indexes of the planes that exclude the point
+            values = numpy.dot(planes[:,:3], numpy.array(point)*angstrom) + planes[:,3]
+            return list((values < 0).nonzero()[0])
+        set_test_camera()
+        # orthographic: a box of 20x20 angstrom from z=50 to z=-50 angstrom
+        planes = camera.get_frustum_planes(400, 400)
+        assert planes.shape == (6, 4)
+        assert abs((planes[:,:3]**2).sum(axis=1) - 1).max() < 1e-10
+        assert outside(planes, [0.0, 0.0, 0.0]) == []
+        assert outside(planes, [9.9, -9.9, 49.9]) == []
+        assert outside(planes, [-10.1, 0.0, 0.0]) == [0]
+        assert outside(planes, [10.1, 0.0, 0.0]) == [1]
+        assert outside(planes, [0.0, -10.1, 0.0]) == [2]
+        assert outside(planes, [0.0, 10.1, 0.0]) == [3]
+        assert outside(planes, [0.0, 0.0, 50.1]) == [4]
+        assert outside(planes, [0.0, 0.0, -50.1]) == [5]
+        # the window is wider than high
+        planes = camera.get_frustum_planes(800, 400)
+        assert outside(planes, [19.9, 0.0, 0.0]) == []
+        assert outside(planes, [19.9, 10.1, 0.0]) == [3]
+        # perspective: the eye is at z=70 angstrom and the front clipping
+        # plane at z=50 angstrom, where the window is 20x20 angstrom.
+        camera.opening_angle = 2*numpy.arctan(0.5)
+        assert abs(camera.znear - 20*angstrom) < 1e-10
+        planes = camera.get_frustum_planes(400, 400)
+        assert abs((planes[:,:3]**2).sum(axis=1) - 1).max() < 1e-10
+        assert outside(planes, [0.0, 0.0, 0.0]) == []
+        assert outside(planes, [9.9, 9.9, 49.9]) == []
+        assert outside(planes, [10.1, 0.0, 49.9]) == [1]
+        assert outside(planes, [34.9, -34.9, 0.0]) == []
+        assert outside(planes, [-35.1, 0.0, 0.0]) == [0]
+        assert outside(planes, [0.0, -35.1, 0.0]) == [2]
+        assert outside(planes, [0.0, 0.0, 50.1]) == [4]
+        assert outside(planes, [0.0, 0.0, 70.0]) == [4]
+        assert outside(planes, [0.0, 0.0, -50.1]) == [5]
+    run_application(fn)
+
+def test_update_images_list():
+    def fn():
+        FileNew = context.application.plugins.get_action("FileNew")
+        FileNew()
+        universe = context.application.model.universe
+        universe.set_cell(UnitCell(numpy.identity(3, float)*5*angstrom))
+        universe.set_repetitions(numpy.array([3, 1, 1]))
+        Atom = context.application.plugins.get_node("Atom")
+        for position in [1.0, 1.0, 1.0], [4.0, 4.0, 4.0]:
+            atom = Atom(user_radius=0.5*angstrom, transformation=Translation(numpy.array(position)*angstrom))
+            universe.add(atom)
+        camera = context.application.camera
+        def get_visible_positions():
+            # the positions of the visible images in units of the cell
+            visible = universe.get_visible_images(camera.get_frustum_planes(400, 400))
+            positions = (universe.image_translations[visible]/(5*angstrom)).round().astype(int)
+            return [tuple(position) for position in positions]
+
+        for clipping in False, True:
+            universe.set_clipping(clipping)
+            redraw()
+            if clipping:
+                assert len(universe.image_translations) == 5*3*3
+                # the axes of the universe stick out of the cell at the
+                # origin, so the images at the far sides touch the clip planes
+                expected = [(a, b, c) for c in 0, 1 for b in 0, 1 for a in 0, 1, 2, 3]
+                depths = [0, 1]
+            else:
+                assert len(universe.image_translations) == 3
+                expected = [(0, 0, 0), (1, 0, 0), (2, 0, 0)]
+                depths = [0]
+            # without the frustum, only the clip planes hide images
+            assert universe.get_visible_images().sum() == len(expected)
+            # the view ranges from x=-2.5 to x=17.5 angstrom
+            set_test_camera()
+            assert get_visible_positions() == expected
+            # the view ranges from x=5.5 to x=9.5 and from y=0.5 to y=4.5
+            # angstrom, and it includes all images along the z-axis
+            camera.window_size = 4*angstrom
+            assert get_visible_positions() == [(1, 0, c) for c in depths]
+            # the view ranges from x=10.5 to x=14.5 angstrom
+            camera.eye = Translation(numpy.array([5.0, 0.0, 50.0])*angstrom)
+            assert get_visible_positions() == [(2, 0, c) for c in depths]
+
+        # the images list is only recompiled when the visible images change
+        set_test_camera()
+        redraw()
+        visible_images = universe.visible_images
+        assert visible_images.any()
+        redraw()
+        assert universe.visible_images is visible_images
+        # all images behind the camera
+        camera.eye = Translation(numpy.array([0.0, 0.0, -200.0])*angstrom)
+        redraw()
+        assert universe.visible_images is not visible_images
+        assert not universe.visible_images.any()
+    run_application(fn)
+
 def test_define_center():
     def fn():
         context.application.model.file_open("test/input/core_objects.zml")
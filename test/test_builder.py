@@ -81,6 +81,8 @@ def test_optimize_springs():
 
         parameters = Parameters()
         parameters.allow_rotation = True
+        parameters.minimizer = "ConjugateGradient"
+        parameters.wolfe_line_search = False
         parameters.update_interval = 0.4
         parameters.update_steps = 1
 
@@ -99,6 +101,8 @@ def test_optimize_springs_translation():
 
         parameters = Parameters()
         parameters.allow_rotation = False
+        parameters.minimizer = "ConjugateGradient"
+        parameters.wolfe_line_search = False
         parameters.update_interval = 0.4
         parameters.update_steps = 1
 
@@ -116,6 +120,28 @@ def test_optimize_springs_fixed():
         )
         parameters = Parameters()
         parameters.allow_rotation = True
+        parameters.minimizer = "ConjugateGradient"
+        parameters.wolfe_line_search = False
+        parameters.update_interval = 0.4
+        parameters.update_steps = 1
+
+        OptimizeSprings = context.application.plugins.get_action("OptimizeSprings")
+        assert OptimizeSprings.analyze_selection(parameters)
+        OptimizeSprings(parameters)
+    run_application(fn)
+
+def test_optimize_springs_wolfe():
+    def fn():
+        context.application.model.file_open("test/input/springs.zml")
+        context.application.main.select_nodes(
+            context.application.model.universe.children[2:6] +
+            context.application.model.universe.children[7:9]
+        )
+
+        parameters = Parameters()
+        parameters.allow_rotation = True
+        parameters.minimizer = "LBFGS"
+        parameters.wolfe_line_search = True
         parameters.update_interval = 0.4
         parameters.update_steps = 1
 
@@ -59,3 +59,41 @@ def test_add_box():
     run_application(fn)
 
 
+
+def test_incremental_selection():
+    def fn():
+        FileNew = context.application.plugins.get_action("FileNew")
+        FileNew()
+        universe = context.application.model.root[0]
+        context.application.action_manager.record_primitives = False
+        Atom = context.application.plugins.get_node("Atom")
+        Frame = context.application.plugins.get_node("Frame")
+        frame = Frame()
+        primitive.Add(frame, universe)
+        atoms = [Atom() for i in xrange(10)]
+        primitive.AddMany(atoms[:5], universe)
+        primitive.AddMany(atoms[5:], frame)
+        cache = context.application.cache
+        cache.reset_statistics()
+        main = context.application.main
+        main.select_nodes(atoms[:3])
+        assert cache.nodes == atoms[:3]
+        assert cache.parents == [universe]
+        # extend and shrink the selection
+        main.toggle_selection(atoms[7], on=True)
+        main.toggle_selection(frame, on=True)
+        assert cache.nodes == atoms[:3] + [atoms[7], frame]
+        assert cache.parents == [universe, frame]
+        main.toggle_selection(atoms[1], on=False)
+        assert cache.nodes == [atoms[0], atoms[2], atoms[7], frame]
+        assert cache.nodes_without_children == [atoms[0], atoms[2], frame]
+        assert cache.containers == [frame]
+        # compare with a full analysis
+        for name in "nodes", "parents", "classes", "nodes_by_parent":
+            value = getattr(cache, name)
+            cache.clear()
+            assert value == getattr(cache, name)
+        statistics = dict((row[0], row[1:]) for row in cache.statistics())
+        hits, misses, updates, timing = statistics["nodes"]
+        assert updates > 0
+    run_application(fn)
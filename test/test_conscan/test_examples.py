@@ -33,7 +33,8 @@
 
 
 
-from conscan import Geometry, Connection, ProgressMessage, TriangleScanner, PairScanner
+from conscan import Geometry, Connection, QualityEvaluator, ProgressMessage, \
+    PartialResults, TriangleScanner, PairScanner
 
 from molmod import Rotation, MolecularGraph
 from molmod.periodic import periodic
@@ -47,6 +48,7 @@ class Sender(object):
     def __init__(self, silent=True):
         self.silent = silent
         self.connections = []
+        self.partial_results = []
 
     def __call__(self, message):
         if not self.silent:
@@ -66,6 +68,8 @@ class Sender(object):
             print "=~-~"*20
         if isinstance(message, Connection):
             self.connections.append(message)
+        elif isinstance(message, PartialResults):
+            self.partial_results.append(message)
 
 
 def get_simple_model1():
@@ -247,3 +251,124 @@ def test_pair_ego_precursor_rot():
     scanner.run()
 
 
+
+def test_pair_vectorized_reference():
+    def get_connections(geometry, rot, vectorized):
+        scanner = PairScanner(
+            send=Sender(),
+            geometry1=geometry,
+            geometry2=None,
+            action_radius=5.0,
+            hit_tolerance=0.1,
+            rotation2=rot,
+            vectorized=vectorized,
+        )
+        scanner.generate_connections()
+        return scanner.connections
+
+    geometry = Geometry(*get_precursor_model())
+    for rot in None, Rotation.from_properties(-0.5*np.pi, [-1, 1, 0], False):
+        connections_vec = get_connections(geometry, rot, True)
+        connections_ref = get_connections(geometry, rot, False)
+        assert len(connections_vec) == len(connections_ref)
+        for connection_vec, connection_ref in zip(connections_vec, connections_ref):
+            assert connection_vec.pairs == connection_ref.pairs
+            assert abs(connection_vec.t - connection_ref.t).max() < 1e-10
+
+def test_pair_ego_precursor_parallel():
+    def get_connections(geometry, num_processes):
+        sender = Sender()
+        scanner = PairScanner(
+            send=sender,
+            geometry1=geometry,
+            geometry2=None,
+            action_radius=5.0,
+            hit_tolerance=0.1,
+            rotation2=None,
+            num_processes=num_processes,
+        )
+        scanner.run()
+        return sender.connections
+
+    geometry = Geometry(*get_precursor_model())
+    connections_serial = get_connections(geometry, 1)
+    connections_parallel = get_connections(geometry, 4)
+    assert len(connections_serial) == len(connections_parallel)
+    for connection_serial, connection_parallel in zip(connections_serial, connections_parallel):
+        assert connection_serial.pairs == connection_parallel.pairs
+        assert abs(connection_serial.quality - connection_parallel.quality) < 1e-10
+
+def test_quality_evaluator_precursor():
+    geometry = Geometry(*get_precursor_model())
+    scanner = PairScanner(
+        send=Sender(),
+        geometry1=geometry,
+        geometry2=None,
+        action_radius=5.0,
+        hit_tolerance=0.1,
+        rotation2=None,
+    )
+    scanner.generate_connections()
+    scanner.compute_transformations()
+    quality_evaluator = QualityEvaluator(geometry, geometry)
+    for connection in scanner.connections:
+        reference = Connection(None)
+        reference.transformation = connection.transformation
+        reference.compute_quality(geometry, geometry)
+        quality_evaluator.compute_quality(connection)
+        assert connection.pairs == reference.pairs
+        assert abs(connection.quality - reference.quality) < 1e-10
+
+def test_pair_ego_precursor_max_results():
+    geometry = Geometry(*get_precursor_model())
+    def get_connections(**kwargs):
+        sender = Sender()
+        scanner = PairScanner(
+            send=sender,
+            geometry1=geometry,
+            geometry2=None,
+            action_radius=5.0,
+            hit_tolerance=0.1,
+            rotation2=None,
+            **kwargs
+        )
+        scanner.run()
+        return sender.connections
+
+    connections_all = get_connections()
+    connections_best = get_connections(max_results=10)
+    assert len(connections_best) == min(10, len(connections_all))
+    for connection_all, connection_best in zip(connections_all, connections_best):
+        assert abs(connection_all.quality - connection_best.quality) < 1e-10
+
+    connections_min = get_connections(min_quality=1.0)
+    assert len(connections_min) == len([c for c in connections_all if c.quality >= 1.0])
+
+def test_pair_precursor_partial_results():
+    geometry = Geometry(*get_precursor_model())
+    sender = Sender()
+    scanner = PairScanner(
+        send=sender,
+        geometry1=geometry,
+        geometry2=geometry,
+        action_radius=5.0,
+        hit_tolerance=0.1,
+        rotation2=None,
+        max_results=10,
+    )
+    scanner.run()
+    assert len(sender.partial_results) > 0
+    best = None
+    for partial_results in sender.partial_results:
+        qualities = partial_results.qualities
+        assert len(qualities) <= 10
+        assert qualities == sorted(qualities, reverse=True)
+        # the provisional results only get better
+        if best is not None:
+            assert qualities[0] >= best
+        best = qualities[0]
+    # the last provisional results are the final results
+    qualities = sender.partial_results[-1].qualities
+    assert len(qualities) == len(sender.connections)
+    for quality, connection in zip(qualities, sender.connections):
+        assert abs(quality - connection.quality) < 1e-10
@@ -34,7 +34,11 @@
 
 from common import *
 
+from zeobuilder import context
 from zeobuilder.conversion import express_measure
+from zeobuilder.actions.composed import ActionError
+
+import numpy, tempfile, shutil
 
 
 def test_conversion():
@@ -42,3 +46,91 @@ def test_conversion():
         express_measure(0, "Mass")
     run_application(fn)
 
+
+def test_headless_job():
+    def fn():
+        from zeobuilder.batch import run_action
+        from zeobuilder.moltools import iter_bonds
+        context.application.model.file_open("test/input/tpa.xyz")
+        universe = context.application.model.universe
+        run_action("AutoConnectPhysical", [universe])
+        assert len(list(iter_bonds([universe]))) > 0
+        assert context.application.error_message is None
+        context.application.model.file_save("test/output/tpa_headless.zml")
+        # errors are raised instead of shown in a dialog
+        try:
+            run_action("SuperCell", [universe], foo=2)
+            assert False
+        except ActionError:
+            pass
+    run_headless(fn)
+
+def test_headless_script():
+    def fn():
+        from zeobuilder.batch import run_script
+        f = file("test/output/job.py", "w")
+        print >> f, 'run_action("FileNew")'
+        print >> f, 'run_action("AddAtom", [model.universe])'
+        print >> f, 'run_action("Frame", [model.universe.children[0]])'
+        f.close()
+        run_script("test/output/job.py")
+        universe = context.application.model.universe
+        Frame = context.application.plugins.get_node("Frame")
+        assert len(universe.children) == 1
+        assert isinstance(universe.children[0], Frame)
+    run_headless(fn)
+
+def test_headless_optimize_springs():
+    def fn():
+        from zeobuilder.batch import run_action
+        context.application.model.file_open("test/input/springs.zml")
+        universe = context.application.model.universe
+        springs = universe.children[2:6] + universe.children[7:9]
+        def spring_error():
+            result = 0.0
+            for spring in springs:
+                begin, end = [
+                    child.target.get_absolute_frame().t
+                    for child in spring.children
+                ]
+                result += (numpy.linalg.norm(end - begin) - spring.rest_length)**2
+            return result
+        error_before = spring_error()
+        # the minimizer runs without its report dialog
+        run_action("OptimizeSprings", springs, allow_rotation=False)
+        assert context.application.error_message is None
+        assert spring_error() < error_before
+    run_headless(fn)
+
+def test_lazy_plugins():
+    from zeobuilder.plugins import PluginDescription
+    # the manifest is written in a temporary user directory
+    user_dir = context.user_dir
+    context.user_dir = tempfile.mkdtemp()
+    try:
+        # the first run writes the manifest, the second one can defer modules
+        run_headless(lambda: None)
+        def fn():
+            plugins = context.application.plugins
+            assert len(plugins.deferred) > 0
+            # the menu info of a deferred action is read from the manifest
+            descriptions = plugins.get_descriptions("actions")
+            TetraCoordination = descriptions["TetraCoordination"]
+            assert isinstance(TetraCoordination, PluginDescription)
+            assert TetraCoordination.menu_info.get_label() == "_T-atom coordination"
+            assert TetraCoordination.failed_modules == []
+            assert "TetraCoordination" in plugins.pending["actions"]
+            # a deferred action is imported when it is used
+            assert not TetraCoordination.analyze_selection()
+            assert "TetraCoordination" not in plugins.pending["actions"]
+            SuperCell = plugins.get_action("SuperCell")
+            assert SuperCell.id == "SuperCell"
+            # iterating over a category imports all its modules
+            for plural in "actions", "load_filters", "dump_filters", "interactive_groups":
+                assert len(plugins.__dict__[plural]) > 0
+            assert len(plugins.deferred) == 0
+            assert "xyz" in plugins.load_filters
+        run_headless(fn)
+    finally:
+        shutil.rmtree(context.user_dir)
+        context.user_dir = user_dir
@@ -52,10 +52,93 @@ def test_open_zml():
     helper_file_open("format2_0.1.zml")
     helper_file_open("format3_0.1.zml")
 
+def test_zml_array_encodings():
+    def fn():
+        from zeobuilder.zml import array_encodings, dump_to_file, load_from_file
+        arrays = [
+            numpy.arange(30).reshape((10, 3))*0.25,
+            numpy.arange(12).reshape((3, 4)),
+            numpy.array([True, False, True]),
+        ]
+        for array_encoding in array_encodings:
+            filename = "test/output/arrays_%s.zml" % array_encoding
+            f = file(filename, "w")
+            dump_to_file(f, arrays, array_encoding)
+            f.close()
+            f = file(filename)
+            loaded = load_from_file(f)
+            f.close()
+            for array, loaded_array in zip(arrays, loaded):
+                assert array.shape == loaded_array.shape
+                assert array.dtype == loaded_array.dtype
+                assert (array == loaded_array).all()
+
+        context.application.configuration.zml_array_encoding = "zlib"
+        context.application.model.file_open("test/input/core_objects.zml")
+        context.application.model.file_save("test/output/core_objects_zlib.zml")
+        context.application.model.file_open("test/output/core_objects_zlib.zml")
+        context.application.configuration.zml_array_encoding = "text"
+    run_application(fn)
+
+def test_zml_clone_subtree():
+    def fn():
+        from zeobuilder.zml import dump_to_file, load_from_file, clone_subtree
+        import StringIO
+        context.application.model.file_open("test/input/core_objects.zml")
+        originals = context.application.model.universe.children
+
+        serialized = StringIO.StringIO()
+        dump_to_file(serialized, originals)
+        serialized.seek(0)
+        loaded = load_from_file(serialized)
+        clones = clone_subtree(originals)
+        assert len(clones) == len(loaded)
+        for original, clone in zip(originals, clones):
+            assert clone is not original
+            assert clone.__class__ == original.__class__
+
+        # the copies must be serialized in the same way as the round trip
+        serialized_loaded = StringIO.StringIO()
+        dump_to_file(serialized_loaded, loaded)
+        serialized_clones = StringIO.StringIO()
+        dump_to_file(serialized_clones, clones)
+        assert serialized_loaded.getvalue() == serialized_clones.getvalue()
+    run_application(fn)
+
 def test_open_xyz():
     helper_file_open("tpa.xyz")
     helper_file_open("ethane-ethane-pos.xyz")
 
+def test_xyz_trajectory():
+    def fn():
+        from molmod.io import XYZReader
+        context.application.model.file_open("test/input/ethane-ethane-pos.xyz")
+        universe = context.application.model.universe
+        assert len(universe.trajectory) == 151
+        reader = XYZReader("test/input/ethane-ethane-pos.xyz")
+        frames = list(reader)
+
+        TrajectoryFrame = context.application.plugins.get_action("TrajectoryFrame")
+        parameters = Parameters()
+        parameters.frame = 5
+        TrajectoryFrame(parameters)
+        coordinates = numpy.array([
+            atom.transformation.t for atom in universe.children
+        ])
+        assert abs(coordinates - frames[5][1]).max() < 1e-6
+        # the default is the next frame
+        assert TrajectoryFrame.default_parameters().frame == 6
+        # undoing the frame also restores the default
+        Undo = context.application.plugins.get_action("Undo")
+        assert Undo.analyze_selection()
+        Undo()
+        assert TrajectoryFrame.default_parameters().frame == 1
+        Redo = context.application.plugins.get_action("Redo")
+        assert Redo.analyze_selection()
+        Redo()
+        assert TrajectoryFrame.default_parameters().frame == 6
+    run_application(fn)
+
 def test_open_g03xyz():
     helper_file_open("oniom.g03xyz")
 
@@ -63,6 +146,30 @@ def test_open_pdb():
     helper_file_open("lau.pdb")
     helper_file_open("pept.pdb")
 
+def test_open_pdb_hetatm_conect():
+    def fn():
+        f = file("test/input/pept.pdb")
+        lines = f.readlines()[:4]
+        f.close()
+        lines[3] = "HETATM" + lines[3][6:]
+        f = file("test/output/pept_conect.pdb", "w")
+        f.writelines(lines)
+        print >> f, "CONECT    1    2"
+        print >> f, "CONECT    2    1    3"
+        print >> f, "CONECT    4    3"
+        f.close()
+        context.application.model.file_open("test/output/pept_conect.pdb")
+        Atom = context.application.plugins.get_node("Atom")
+        Bond = context.application.plugins.get_node("Bond")
+        universe = context.application.model.universe
+        atoms = [node for node in universe.children if isinstance(node, Atom)]
+        bonds = [node for node in universe.children if isinstance(node, Bond)]
+        assert len(atoms) == 4
+        assert len(bonds) == 3
+        assert bonds[2].children[0].target == atoms[2]
+        assert bonds[2].children[1].target == atoms[3]
+    run_application(fn)
+
 def test_open_g03zmat():
     helper_file_open("1LJL_Cys10.g03zmat")
 
@@ -70,27 +177,34 @@ def test_open_cml():
     helper_file_open("diethylene_glycol.cml")
 
 
-def helper_file_save(in_filename, out_filename):
+def helper_file_save(in_filename, out_filename, golden_filename=None):
     def fn():
         context.application.model.file_open("test/input/%s" % in_filename)
         context.application.model.file_save("test/output/%s" % out_filename)
     run_application(fn)
+    if golden_filename is not None:
+        # the golden files are written by the original per-atom writers
+        output = file("test/output/%s" % out_filename).read()
+        assert output == file("test/input/%s" % golden_filename).read()
 
 def test_save_zml():
     helper_file_save("core_objects.zml", "core_objects.zml")
 
 def test_save_xyz():
-    helper_file_save("tpa.zml", "tpa.xyz")
+    helper_file_save("tpa.zml", "tpa.xyz", "tpa_dump.xyz")
+    helper_file_save("nested_frames.zml", "nested_frames.xyz", "nested_frames_dump.xyz")
 
 def test_save_g03xyz():
-    helper_file_save("oniom.zml", "oniom.g03xyz")
+    helper_file_save("oniom.zml", "oniom.g03xyz", "oniom_dump.g03xyz")
+    helper_file_save("nested_frames.zml", "nested_frames.g03xyz", "nested_frames_dump.g03xyz")
 
 def test_save_psf():
     helper_file_save("precursor.zml", "precursor.psf")
     helper_file_save("azaallyl_thf_mm.zml", "azaallyl_thf_mm.psf")
 
 def test_save_pdb():
-    helper_file_save("lau.zml", "lau.pdb")
+    helper_file_save("lau.zml", "lau.pdb", "lau_dump.pdb")
+    helper_file_save("nested_frames.zml", "nested_frames.pdb", "nested_frames_dump.pdb")
 
 def test_save_cml():
     helper_file_save("precursor.zml", "precursor.cml")
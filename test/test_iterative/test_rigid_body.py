@@ -127,6 +127,47 @@ def define_cost_function2():
     return cost_function
 
 
+def define_cost_function3(spring_set):
+    numpy.random.seed(1)
+    cost_function = iterative.expr.Root(1, 5, True)
+
+    frames = []
+    for counter in xrange(3):
+        frame = iterative.var.Frame(
+            numpy.linalg.qr(numpy.random.normal(0, 1, (3,3)))[0],
+            numpy.random.normal(0, 2, 3),
+        )
+        cost_function.register_state_variable(frame)
+        constraint = iterative.expr.Orthonormality(1e-6)
+        constraint.register_input_variable(frame)
+        frames.append(frame)
+    for counter in xrange(2):
+        frame = iterative.var.Translation(
+            numpy.linalg.qr(numpy.random.normal(0, 1, (3,3)))[0],
+            numpy.random.normal(0, 2, 3),
+        )
+        cost_function.register_state_variable(frame)
+        frames.append(frame)
+    frames.append(iterative.expr.NoFrame())
+
+    if spring_set:
+        springs = iterative.expr.SpringSet()
+    for counter in xrange(50):
+        index1, index2 = numpy.random.permutation(len(frames))[:2]
+        coordinate1 = numpy.random.normal(0, 2, 3)
+        coordinate2 = numpy.random.normal(0, 2, 3)
+        rest_length = [0.0, 0.5, 1.0][numpy.random.randint(3)]
+        if spring_set:
+            springs.add_spring(frames[index1], coordinate1, frames[index2], coordinate2, rest_length)
+        else:
+            spring = iterative.expr.Spring(rest_length)
+            spring.register_input_variable(frames[index1], coordinate1)
+            spring.register_input_variable(frames[index2], coordinate2)
+
+    cost_function.parse_input()
+    return cost_function
+
+
 def report(status):
     pass
     #print status.step, status.value
@@ -179,6 +220,65 @@ def test_minimize_noincrease2_conjugate_gradient():
     minimize.run(report)
 
 
+def test_minimize_noincrease1_lbfgs():
+    for wolfe in False, True:
+        cost_function = define_cost_function1()
+
+        minimize = iterative.alg.LBFGS(
+            cost_function,
+            numpy.array([0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 1.0, 1.0, 1.0]*2, float),
+            1e-5,
+            wolfe=wolfe,
+        )
+        minimize.run(report)
+
+
+def test_minimize_noincrease2_lbfgs():
+    reference = define_cost_function2()
+    minimize = iterative.alg.ConjugateGradient(
+        reference,
+        numpy.array([1.0, 1.0, 1.0]*2, float),
+        1e-8,
+    )
+    minimize.run(report)
+
+    for wolfe in False, True:
+        cost_function = define_cost_function2()
+
+        minimize = iterative.alg.LBFGS(
+            cost_function,
+            numpy.array([1.0, 1.0, 1.0]*2, float),
+            1e-8,
+            wolfe=wolfe,
+        )
+        minimize.run(report)
+        assert abs(cost_function.outputs[0] - reference.outputs[0]) < 1e-6
+
+
+def test_wolfe_line_search_sufficient_decrease():
+    cost_function = define_cost_function2()
+    minimize = iterative.alg.LBFGS(
+        cost_function,
+        numpy.array([1e3, 1e3, 1e3]*2, float),
+        1e-8,
+        wolfe=True,
+    )
+    minimize.status = iterative.alg.Status()
+    minimize.initialize()
+    # a long step, such that the first trial has not enough decrease, and a
+    # negative c2, such that the curvature condition is never met
+    step = -1e3*minimize.gradient
+    stop = minimize.wolfe_line_search(step, c2=-1e10, max_iter=10)
+    assert not stop
+    assert cost_function.outputs[0] < minimize.original_value
+    assert (cost_function.state != minimize.original_state).any()
+    # the derivatives at the accepted state are available to iterate
+    derivatives = cost_function.derivatives.copy()
+    cost_function.clear_derivatives()
+    cost_function.add_derivatives()
+    assert abs(derivatives - cost_function.derivatives).max() < 1e-10
+
+
 def test_constraint_derivatives():
     expr = define_cost_function1()
 
@@ -204,3 +304,20 @@ def test_constraint_derivatives():
         overlap = (numpy.dot(cluster.constraint_derivatives, cluster.state_derivatives)**2).sum()
         assert overlap < 1e-5
 
+
+
+def test_spring_set():
+    expr_springs = define_cost_function3(False)
+    expr_spring_set = define_cost_function3(True)
+    assert len(expr_spring_set.termini) == 1
+
+    for expr in expr_springs, expr_spring_set:
+        expr.clear()
+        expr.add_outputs()
+        expr.add_derivatives()
+    assert abs(expr_springs.outputs - expr_spring_set.outputs).max() < 1e-10
+    # The order of the variables in the state vector is not fixed.
+    for variable1, variable2 in zip(expr_springs.state_variables, expr_spring_set.state_variables):
+        assert abs(variable1.state - variable2.state).max() < 1e-10
+        assert abs(variable1.mass - variable2.mass).max() < 1e-10
+        assert abs(variable1.derivatives - variable2.derivatives).max() < 1e-10
@@ -39,7 +39,7 @@ from zeobuilder.actions.composed import Parameters
 from zeobuilder.expressions import Expression
 import zeobuilder.actions.primitive as primitive
 
-from molmod import angstrom, Translation
+from molmod import angstrom, Translation, Complete, UnitCell
 from molmod.bonds import BOND_SINGLE
 
 import numpy
@@ -147,6 +147,30 @@ def test_auto_connect_physical_lau():
         AutoConnectPhysical()
     run_application(fn)
 
+def test_create_molecule_framed():
+    def fn():
+        context.application.model.file_open("test/input/tpa.xyz")
+        universe = context.application.model.universe
+        # put half of the atoms in a rotated frame
+        context.application.main.select_nodes(universe.children[:len(universe.children)/2])
+        Frame = context.application.plugins.get_action("Frame")
+        assert Frame.analyze_selection()
+        Frame()
+        FrameNode = context.application.plugins.get_node("Frame")
+        frame = [child for child in universe.children if isinstance(child, FrameNode)][0]
+        frame.set_transformation(Complete.from_properties(0.3, numpy.array([1.0, 2.0, 0.5]), False, numpy.array([1.0, -2.0, 3.0])))
+        from zeobuilder.moltools import create_molecule
+        for parent in None, universe, frame:
+            molecule = create_molecule([universe], parent)
+            for atom, number, coordinate in zip(molecule.atoms, molecule.numbers, molecule.coordinates):
+                assert number == atom.number
+                if parent is None:
+                    expected = atom.get_absolute_frame().t
+                else:
+                    expected = atom.get_frame_relative_to(parent).t
+                assert abs(coordinate - expected).max() < 1e-10
+    run_application(fn)
+
 def test_auto_connect_parameters_tpa():
     def fn():
         context.application.model.file_open("test/input/tpa.zml")
@@ -208,6 +232,74 @@ def test_merge_overlapping_atoms_lau():
         MergeOverlappingAtoms()
     run_application(fn)
 
+def test_spatial_index_lau():
+    def fn():
+        context.application.model.file_open("test/input/lau.zml")
+        universe = context.application.model.universe
+        Atom = context.application.plugins.get_node("Atom")
+        atoms = [child for child in universe.children if isinstance(child, Atom)]
+        spatial_index = universe.get_spatial_index()
+        # compare with all the distances
+        cutoff = 3*angstrom
+        coordinates = numpy.array([atom.transformation.t for atom in atoms])
+        expected = set([])
+        for i0 in xrange(len(atoms)):
+            deltas = universe.cell.shortest_vector(coordinates[:i0] - coordinates[i0])
+            distances = numpy.sqrt((deltas**2).sum(axis=1))
+            for i1 in (distances <= cutoff).nonzero()[0]:
+                expected.add((atoms[i0], atoms[i1]))
+        pairs = set([])
+        for atom0, atom1, delta, distance in spatial_index.iter_pairs(cutoff, atoms):
+            assert abs(numpy.linalg.norm(delta) - distance) < 1e-10
+            pairs.add((atom0, atom1))
+        assert pairs == expected
+        # the index follows the changes in the model
+        context.application.action_manager.record_primitives = False
+        atom = atoms[0]
+        primitive.Transform(atom, Translation(numpy.array([0.3, 0.2, 0.1])))
+        nodes, deltas, distances = spatial_index.query_nearest(atom.transformation.t, 1)
+        assert nodes == [atom]
+        assert distances[0] < 1e-10
+        primitive.Delete(atom)
+        nodes, deltas, distances = spatial_index.query_radius(atom.transformation.t, 1e-3)
+        assert nodes == []
+    run_application(fn)
+
+def test_spatial_index_anisotropic():
+    def fn():
+        FileNew = context.application.plugins.get_action("FileNew")
+        FileNew()
+        universe = context.application.model.universe
+        # two bins along a, one along b and no periodicity along c
+        cell = UnitCell(numpy.diag([7.0, 4.0, 9.0])*angstrom, numpy.array([True, True, False]))
+        universe.set_cell(cell)
+        Atom = context.application.plugins.get_node("Atom")
+        numpy.random.seed(1)
+        atoms = [
+            Atom(number=6, transformation=Translation(numpy.random.uniform(0, 1, 3)*[7.0, 4.0, 9.0]*angstrom))
+            for counter in xrange(60)
+        ]
+        context.application.action_manager.record_primitives = False
+        primitive.AddMany(atoms, universe)
+        spatial_index = universe.get_spatial_index()
+        cutoff = 3.5*angstrom
+        for offset, symmetric in spatial_index.get_offsets(cutoff):
+            opposite = -numpy.array(offset)
+            opposite[spatial_index.periodic] %= spatial_index.divisions[spatial_index.periodic]
+            assert symmetric == (tuple(opposite) == offset)
+        coordinates = numpy.array([atom.transformation.t for atom in atoms])
+        expected = set([])
+        for i0 in xrange(len(atoms)):
+            deltas = cell.shortest_vector(coordinates[:i0] - coordinates[i0])
+            distances = numpy.sqrt((deltas**2).sum(axis=1))
+            for i1 in (distances <= cutoff).nonzero()[0]:
+                expected.add((atoms[i0], atoms[i1]))
+        pairs = set([])
+        for atom0, atom1, delta, distance in spatial_index.iter_pairs(cutoff, atoms):
+            pairs.add((atom0, atom1))
+        assert pairs == expected
+    run_application(fn)
+
 def test_center_of_mass():
     def fn():
         context.application.model.file_open("test/input/tpa.zml")
@@ -363,6 +455,41 @@ def test_strong_ring_distribution():
         StrongRingDistribution()
     run_application(fn)
 
+def test_molecular_graph_cache():
+    def fn():
+        from zeobuilder.moltools import get_molecular_graph, create_molecular_graph
+        context.application.model.file_open("test/input/tpa.xyz")
+        universe = context.application.model.universe
+        atoms = list(universe.children)
+
+        context.application.action_manager.record_primitives = False
+        Frame = context.application.plugins.get_node("Frame")
+        frame1 = Frame()
+        frame2 = Frame()
+        primitive.Add(frame1, universe)
+        primitive.Add(frame2, universe)
+        for atom in atoms[:len(atoms)/2]:
+            primitive.Move(atom, frame1)
+        for atom in atoms[len(atoms)/2:]:
+            primitive.Move(atom, frame2)
+
+        graph1 = get_molecular_graph([frame1])
+        graph2 = get_molecular_graph([frame2])
+        graph_atoms1 = get_molecular_graph(frame1.children)
+        assert get_molecular_graph([frame1]) is graph1
+        assert get_molecular_graph([frame2]) is graph2
+        # a change in one frame does not affect the graph of the other
+        primitive.Transform(frame2.children[0], Translation(numpy.array([1.0, 0.0, 0.0])))
+        assert get_molecular_graph([frame1]) is graph1
+        assert get_molecular_graph([frame2]) is not graph2
+        # moving a frame affects the graph of its children
+        primitive.Transform(frame1, Translation(numpy.array([0.0, 1.0, 0.0])))
+        graph = get_molecular_graph(frame1.children)
+        assert graph is not graph_atoms1
+        expected = create_molecular_graph(frame1.children).molecule.coordinates
+        assert abs(graph.molecule.coordinates - expected).max() < 1e-10
+    run_application(fn)
+
 def test_frame_molecules():
     def fn():
         from molmod import UnitCell
@@ -63,4 +63,59 @@ def test_unset_extra():
         assert universe.extra["foo"] == "bar"
     run_application(fn)
 
+def test_add_many():
+    def fn():
+        FileNew = context.application.plugins.get_action("FileNew")
+        FileNew()
+        universe = context.application.model.root[0]
+        Atom = context.application.plugins.get_node("Atom")
+        context.application.action_manager.record_primitives = False
+        first = Atom(name="first")
+        primitive.Add(first, universe)
+        atoms = [Atom(name="atom %i" % i) for i in xrange(10)]
+        p = primitive.AddMany(atoms, universe, index=0)
+        assert universe.children == atoms + [first]
+        model = context.application.model
+        for index, child in enumerate(universe.children):
+            assert child.parent == universe
+            assert model.get_path(child.iter) == (0, index)
+        p.undo()
+        assert universe.children == [first]
+        for atom in atoms:
+            assert atom.parent is None
+            assert atom.model is None
+        assert model.get_path(first.iter) == (0, 0)
+        p.redo()
+        assert universe.children == atoms + [first]
+        for index, child in enumerate(universe.children):
+            assert model.get_path(child.iter) == (0, index)
+    run_application(fn)
+
+def test_delete_many():
+    def fn():
+        FileNew = context.application.plugins.get_action("FileNew")
+        FileNew()
+        universe = context.application.model.root[0]
+        Atom = context.application.plugins.get_node("Atom")
+        context.application.action_manager.record_primitives = False
+        atoms = [Atom(name="atom %i" % i) for i in xrange(20)]
+        primitive.AddMany(atoms, universe)
+        for atom in atoms:
+            atom.set_selected(True)
+        deleted = []
+        for atom in atoms[::3] + atoms[1::3]:
+            atom.set_selected(False)
+            deleted.append(primitive.Delete(atom))
+        remaining = atoms[2::3]
+        assert universe.children == remaining
+        assert list(context.application.model.selection) == remaining
+        for index, child in enumerate(universe.children):
+            assert child.get_index() == index
+        for p in deleted[::-1]:
+            p.undo()
+        assert universe.children == atoms
+        for index, child in enumerate(universe.children):
+            assert child.get_index() == index
+    run_application(fn)
+
 
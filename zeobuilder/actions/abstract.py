@@ -36,6 +36,7 @@ from zeobuilder import context
 from zeobuilder.actions.composed import Immediate
 from zeobuilder.nodes.glmixin import GLTransformationMixin
 from zeobuilder.nodes.parent_mixin import ContainerMixin
+from zeobuilder.nodes.glcontainermixin import GLContainerMixin
 from zeobuilder.nodes.analysis import common_parent
 import zeobuilder.actions.primitive as primitive
 
@@ -135,23 +136,42 @@ class AutoConnectMixin(object):
                     for subnode in iter_translation_nodes(node.children):
                         yield subnode
 
-        nodes = []
-        coordinates = []
-        for node in iter_translation_nodes(cache.nodes_without_children):
-            nodes.append(node)
-            coordinates.append(node.get_frame_up_to(parent).t)
-        coordinates = numpy.array(coordinates)
-
-        unit_cell = None
-        if isinstance(parent, context.application.plugins.get_node("Universe")):
-            unit_cell = parent.cell
-
+        nodes = list(iter_translation_nodes(cache.nodes_without_children))
+
+        if isinstance(parent, GLContainerMixin) and \
+           all(node.parent is parent for node in nodes):
+            # the common case: use the cell list of the parent
+            pairs = parent.get_spatial_index().iter_pairs(cutoff, nodes)
+        else:
+            coordinates = numpy.array([
+                node.get_frame_up_to(parent).t for node in nodes
+            ])
+            unit_cell = None
+            if isinstance(parent, context.application.plugins.get_node("Universe")):
+                unit_cell = parent.cell
+            pairs = (
+                (nodes[i0], nodes[i1], delta, distance) for i0, i1, delta, distance
+                in PairSearchIntra(coordinates, cutoff, unit_cell)
+            )
+
+        # collect the new vectors per parent and add them in one batch
+        parents = []
+        vectors_by_parent = {}
         vector_counter = 1
-        for i0, i1, delta, distance in PairSearchIntra(coordinates, cutoff, unit_cell):
-            vector = self.get_vector(nodes[i0], nodes[i1], distance)
+        for node0, node1, delta, distance in pairs:
+            vector = self.get_vector(node0, node1, distance)
             if vector is not None:
                 vector.name += " %i" % vector_counter
                 vector_counter += 1
-                primitive.Add(vector, common_parent([nodes[i0], nodes[i1]]))
+                vector_parent = common_parent([node0, node1])
+                vectors = vectors_by_parent.get(vector_parent)
+                if vectors is None:
+                    vectors = []
+                    vectors_by_parent[vector_parent] = vectors
+                    parents.append(vector_parent)
+                vectors.append(vector)
+
+        for vector_parent in parents:
+            primitive.AddMany(vectors_by_parent[vector_parent], vector_parent)
 
 
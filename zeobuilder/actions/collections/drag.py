@@ -55,7 +55,7 @@ class Drag(object):
         self.drag_actions = [
             action
             for action
-            in context.application.plugins.actions.itervalues()
+            in context.application.plugins.get_descriptions("actions").itervalues()
             if action.drag_info is not None
         ]
         self.drag_actions.sort(key=(lambda a: a.drag_info.order))
@@ -177,7 +177,7 @@ class InteractiveBar(gtk.Table):
         actions = [
             action
             for action
-            in context.application.plugins.actions.itervalues()
+            in context.application.plugins.get_descriptions("actions").itervalues()
             if action.interactive_info is not None
         ]
         actions.sort(key=(lambda a: a.interactive_info.order))
@@ -34,6 +34,7 @@
 
 from zeobuilder import context
 from zeobuilder.actions.composed import Action
+from zeobuilder.plugins import PluginDescription
 from zeobuilder.gui import load_image
 
 import gtk.gdk
@@ -150,7 +151,7 @@ class Place(MenuActionContainer):
                     menu_item = gtk.MenuItem(name)
                     menu.append(menu_item)
                     menu_item.set_submenu(new_menu)
-            elif issubclass(item, Action):
+            elif isinstance(item, PluginDescription) or issubclass(item, Action):
                 if not only_show_applicable or item.cached_analyze_selection():
                     something_added = True
                     if item.menu_info.image_name is not None:
@@ -196,7 +197,7 @@ class Menu(object):
         """Runs over all the actions plugins and selects those with a MenuInfo."""
 
         actions = []
-        for action in context.application.plugins.actions.itervalues():
+        for action in context.application.plugins.get_descriptions("actions").itervalues():
             if action.menu_info is not None:
                 actions.append(action)
         actions.sort(key=(lambda a: a.menu_info.order))
@@ -73,7 +73,10 @@ class UserError(Exception):
             self.details += err_msg
 
     def show_message(self):
-        ok_error(self.message, self.details, line_wrap=False)
+        if context.parent_window is None:
+            context.application.error_message = "%s\n%s" % (self.message, self.details)
+        else:
+            ok_error(self.message, self.details, line_wrap=False)
 
 class CancelException(Exception):
     pass
@@ -33,6 +33,7 @@
 
 
 from zeobuilder import context
+from zeobuilder.moltools import graph_cache
 
 import gobject
 
@@ -101,9 +102,14 @@ class ActionManager(gobject.GObject):
         if not primitive.done:
             primitive.init()
             primitive.redo()
+        self.model.touch(*primitive.get_touched())
         if self.record_primitives and self.active:
             self.current_action.primitives.append(primitive)
 
+    def touch_action(self, action):
+        for primitive in action.primitives:
+            self.model.touch(*primitive.get_touched())
+
     def cancel_current_action(self):
         assert self.current_action is not None, "Need a current action to cancel."
         if self.sub_action_counter > 0:
@@ -112,6 +118,7 @@ class ActionManager(gobject.GObject):
             raise
         self.emit("action-cancels")
         self.current_action.undo()
+        self.touch_action(self.current_action)
         self.current_action = None
 
     def end_current_action(self):
@@ -135,6 +142,7 @@ class ActionManager(gobject.GObject):
         action = self.undo_stack.pop()
         self.record_primitives = False
         action.undo()
+        self.touch_action(action)
         self.record_primitives = True
         self.redo_stack.append(action)
         self.emit("model-changed")
@@ -145,6 +153,7 @@ class ActionManager(gobject.GObject):
         action = self.redo_stack.pop()
         self.record_primitives = False
         action.redo()
+        self.touch_action(action)
         self.record_primitives = True
         self.undo_stack.append(action)
         self.emit("model-changed")
@@ -163,6 +172,7 @@ class ActionManager(gobject.GObject):
 
     def on_closed_file(self, model):
         self.reset()
+        graph_cache.clear()
         self.record_primitives = False
 
     def on_busy_file(self, model):
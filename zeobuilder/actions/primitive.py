@@ -71,6 +71,18 @@ class Primitive(object):
         assert self.done, "Primitive action is not yet done. Can not undo it."
         self.done = False
 
+    def get_touched(self):
+        # the nodes that are modified by this primitive, and the parents whose
+        # list of children is modified. See Model.touch
+        victims = list(getattr(self, "victims", []))
+        if getattr(self, "victim", None) is not None:
+            victims.append(self.victim)
+        parents = []
+        for name in "parent", "old_parent", "new_parent":
+            if getattr(self, name, None) is not None:
+                parents.append(getattr(self, name))
+        return victims, parents
+
 
 class Add(Primitive):
     def __init__(self, victim, parent, index=-1):
@@ -110,8 +122,7 @@ class AddMany(Primitive):
 
     def undo(self):
         Primitive.undo(self)
-        for victim in self.victims:
-            self.parent.remove(victim)
+        self.parent.remove_many(self.victims)
 
 
 class SetAttribute(Primitive):
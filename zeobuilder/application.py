@@ -34,12 +34,12 @@
 
 from zeobuilder import context
 
-import gtk
+import gtk, gobject
 
-import sys, traceback
+import sys, os, traceback
 
 
-__all__ = ["Application"]
+__all__ = ["Application", "HeadlessApplication"]
 
 
 class Application(object):
@@ -71,7 +71,10 @@ class Application(object):
 
     def initialize_plugins(self):
         from zeobuilder.plugins import PluginsCollection
-        self.plugins = PluginsCollection()
+        self.plugins = PluginsCollection(lazy=True)
+        # the file dialogs are created when the filters are initialized
+        self.plugins.load_pending("load_filters")
+        self.plugins.load_pending("dump_filters")
 
     def initialize_model(self):
         from zeobuilder.gui.models import Model
@@ -137,3 +140,80 @@ class TestApplication(Application):
             gtk.main_quit()
 
 
+class HeadlessMain(object):
+    """Takes the place of the main window in a HeadlessApplication"""
+    window = None
+
+    def get_current_directory(self):
+        name = context.application.model.filename
+        if name is not None:
+            return os.path.dirname(os.path.expanduser(name))
+
+    def file_new(self, universe, folder):
+        context.application.model.file_close()
+        context.application.model.file_new(universe, folder)
+
+    def file_save(self):
+        context.application.model.file_save()
+        return True
+
+    def file_close(self):
+        context.application.model.file_close()
+        return True
+
+    def toggle_selection(self, node, on=None):
+        if on is None: on = not node.selected
+        node.set_selected(on)
+
+    def select_nodes(self, nodes):
+        for node in list(context.application.model.selection):
+            node.set_selected(False)
+        for node in nodes:
+            node.set_selected(True)
+
+
+class HeadlessApplication(Application):
+    """An application without main window, OpenGL or gtk main loop.
+
+    The model does not keep a tree store, such that the nodes never compile
+    display lists, and all drawing calls go to a VisBackendNull. Actions are
+    applied by calling them directly, e.g. with zeobuilder.batch.run_action.
+    Errors that would be shown in a dialog are stored in error_message. The
+    configuration is read but never saved.
+
+    With lazy_plugins=True, plugin modules that only provide actions, filters
+    or interactive groups are imported when they are first used. This needs
+    the plugin manifest written by an earlier run, see PluginsCollection.
+    """
+    def __init__(self, lazy_plugins=True):
+        self.lazy_plugins = lazy_plugins
+        context.application = self
+        self.error_message = None
+
+        self.initialize_config()
+        self.initialize_model()
+        self.initialize_action_manager()
+        self.initialize_gui()
+        self.initialize_cache()
+        self.initialize_plugins()
+
+    def initialize_model(self):
+        from zeobuilder.models import Model
+        self.model = Model()
+
+    def initialize_plugins(self):
+        from zeobuilder.plugins import PluginsCollection
+        self.plugins = PluginsCollection(lazy=self.lazy_plugins)
+
+    def initialize_gui(self):
+        from zeobuilder.gui.visual.vis_backends import VisBackendNull
+        self.vis_backend = VisBackendNull()
+        self.main = HeadlessMain()
+        context.parent_window = None
+
+    def process_events(self):
+        # run the idle callbacks that are normally handled by gtk.main, e.g.
+        # the cache-invalidated signal.
+        main_context = gobject.main_context_default()
+        while main_context.pending():
+            main_context.iteration(False)
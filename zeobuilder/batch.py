@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+
+"""Apply actions to a model without the graphical user interface
+
+These functions are meant to be used in a HeadlessApplication, see the
+zeobuilder-batch script. A job script is a Python file that is executed with
+the functions below in its namespace, e.g.
+
+    run_action("SuperCell", [model.universe], repetitions_a=2, repetitions_b=2)
+    run_action("AutoConnectPhysical", [model.universe])
+"""
+
+
+from zeobuilder import context
+from zeobuilder.actions.composed import ImmediateWithMemory, ActionError, \
+    Parameters
+
+import numpy
+
+
+__all__ = ["select_nodes", "run_action", "run_script"]
+
+
+def select_nodes(nodes):
+    context.application.main.select_nodes(nodes)
+
+
+def run_action(name, nodes=None, **parameters):
+    """Apply the action with the given name
+
+    Arguments:
+      name  --  the name of the action plugin
+      nodes  --  when given, these nodes are selected first
+
+    The keyword arguments override the default parameters of an
+    ImmediateWithMemory action. An ActionError is raised when the action can
+    not be applied to the selection or when it fails.
+    """
+    application = context.application
+    if nodes is not None:
+        select_nodes(nodes)
+    action = application.plugins.get_action(name)
+    if issubclass(action, ImmediateWithMemory):
+        try:
+            action_parameters = action.default_parameters()
+        except NotImplementedError:
+            action_parameters = Parameters()
+        for key, value in parameters.iteritems():
+            if not hasattr(action_parameters, key):
+                raise ActionError("Action %s has no parameter %s." % (name, key))
+            setattr(action_parameters, key, value)
+        arguments = (action_parameters,)
+    elif len(parameters) > 0:
+        raise ActionError("Action %s does not take parameters." % name)
+    else:
+        arguments = ()
+    if not action.analyze_selection():
+        raise ActionError("Action %s can not be applied to the selection." % name)
+    application.error_message = None
+    action(*arguments)
+    application.process_events()
+    if application.error_message is not None:
+        raise ActionError("Action %s failed: %s" % (name, application.error_message))
+
+
+def run_script(filename):
+    """Execute a job script with the functions of this module"""
+    namespace = {
+        "context": context,
+        "model": context.application.model,
+        "numpy": numpy,
+        "select_nodes": select_nodes,
+        "run_action": run_action,
+    }
+    execfile(filename, namespace)
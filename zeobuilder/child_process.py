@@ -34,9 +34,11 @@
 
 from zeobuilder import context
 from zeobuilder.application import TestApplication
+from zeobuilder.actions.composed import UserError
 from zeobuilder.gui.simple import ok_error
 
 import gobject, gtk, subprocess, cPickle, gobject, os
+from cStringIO import StringIO
 
 
 __all__ = ["ChildProcessDialog"]
@@ -74,9 +76,12 @@ class ChildProcessDialog(object):
             env=env,
         )
         if self.pickle:
-            cPickle.dump(input_data, self.process.stdin, -1)
-        else:
-            self.process.stdin.write(input_data)
+            input_data = cPickle.dumps(input_data, -1)
+
+        if context.parent_window is None:
+            return self.follow_process(input_data)
+
+        self.process.stdin.write(input_data)
         self.process.stdin.close()
 
         #print >> sys.stderr, "ZEOBUILDER, add io_watch"
@@ -93,6 +98,22 @@ class ChildProcessDialog(object):
         #print >> sys.stderr, "result", result
         return result
 
+    def follow_process(self, input_data):
+        """Wait for the child process and pass its output to on_receive"""
+        output, errors = self.process.communicate(input_data)
+        if self.pickle:
+            f = StringIO(output)
+            try:
+                while True: self.on_receive(cPickle.load(f))
+            except EOFError:
+                pass
+        else:
+            for line in output.splitlines():
+                self.on_receive(line)
+        if self.process.returncode != 0:
+            raise UserError("An error occured in the child process.", errors)
+        return gtk.RESPONSE_OK
+
     def response_loop(self):
         response = self.dialog.run()
         while not self.response_active:
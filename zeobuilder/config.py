@@ -90,6 +90,27 @@ class Configuration(object):
             )),
         )
 
+        # 3) file format stuff
+        from zeobuilder.zml import array_encodings
+        def corrector_zml_array_encoding(value):
+            if value not in array_encodings:
+                value = array_encodings[0]
+            return value
+        self.register_setting(
+            "zml_array_encoding",
+            array_encodings[0],
+            DialogFieldInfo("General", (0, 2), fields.edit.ComboBox(
+                choices=[
+                    ("text", "Text"),
+                    ("base64", "Binary (base64)"),
+                    ("zlib", "Compressed binary (zlib, base64)"),
+                ],
+                label_text="Encoding of arrays in ZML files",
+                attribute_name="zml_array_encoding",
+            )),
+            corrector_zml_array_encoding
+        )
+
     def load_from_file(self):
         if os.path.isfile(self.filename):
             from zeobuilder.zml import load_from_file
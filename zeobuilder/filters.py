@@ -33,10 +33,11 @@
 
 
 from zeobuilder import context
+from zeobuilder.nodes.glcontainermixin import GLContainerMixin
 
 import gtk
 
-import os
+import os, itertools
 
 
 __all__= [
@@ -68,9 +69,34 @@ class LoadFilter(Filter):
 
 
 class DumpFilter(Filter):
+    # the number of lines that are formatted and written at once
+    chunk_size = 1024
+
     def __call__(self, f, universe, folder, nodes=None):
         raise NotImplementedError()
 
+    def collect_nodes(self, nodes, classes):
+        """Returns the instances of classes in the given subtrees
+
+        The order is the same as a depth-first traversal. Only containers
+        that are not instances of classes are searched.
+        """
+        result = []
+        def collect(nodes):
+            for node in nodes:
+                if isinstance(node, classes):
+                    result.append(node)
+                elif isinstance(node, GLContainerMixin):
+                    collect(node.children)
+        collect(nodes)
+        return result
+
+    def write_lines(self, f, line_format, rows):
+        """Writes line_format % row for each row, followed by a new line"""
+        for begin in xrange(0, len(rows), self.chunk_size):
+            chunk = rows[begin:begin+self.chunk_size]
+            f.write(("%s\n" % line_format)*len(chunk) % tuple(itertools.chain(*chunk)))
+
 
 class Indenter(object):
     def __init__(self, stream, indent_string=" "):
@@ -106,7 +132,14 @@ class Indenter(object):
         self.new_line = line_break
 
 
+def has_file_dialogs():
+    """Returns False when there is no main window, see HeadlessApplication"""
+    return context.parent_window is not None
+
+
 def init_load_filters(load_filters):
+    if not has_file_dialogs():
+        return
     all_load_ff = gtk.FileFilter()
     all_load_ff.set_name("All known formats")
     load_ffs = [all_load_ff]
@@ -148,6 +181,8 @@ def init_load_filters(load_filters):
 
 
 def init_dump_filters(dump_filters):
+    if not has_file_dialogs():
+        return
     all_dump_ff = gtk.FileFilter()
     all_dump_ff.set_name("All known formats")
     dump_ffs = [all_dump_ff]
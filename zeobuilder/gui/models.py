@@ -51,9 +51,16 @@ class Model(ModelBase, gtk.TreeStore):
         #print "Adding node %s (%i)" % (node.get_name(), id(node))
         if parent is None:
             parent_iter = None
+            siblings = self.root
         else:
             parent_iter = node.parent.iter
-        node.iter = self.insert(parent_iter, index, [node])
+            siblings = node.parent.children
+        if index > 0 and hasattr(siblings[index-1], "iter"):
+            # inserting after the previous sibling avoids a linear search
+            # for the position in the tree store.
+            node.iter = self.insert_after(parent_iter, siblings[index-1].iter, [node])
+        else:
+            node.iter = self.insert(parent_iter, index, [node])
         if isinstance(node, GLMixin): # only the gui model requires gl
             node.initialize_gl()
 
@@ -259,6 +259,51 @@ class Camera(object):
         else:
             return self.window_size
 
+    def get_frustum_planes(self, width, height):
+        """Returns the six planes of the viewing volume in model coordinates
+
+        Arguments
+            width, height  --  the size of the drawing area in pixels
+
+        Returns
+            planes  --  an array with shape (6, 4). A point p is inside the
+                        viewing volume when dot(plane[:3], p) + plane[3] >= 0
+                        for all planes. The normals are normalized.
+        """
+        if width > height:
+            w = 0.5*float(width) / float(height)
+            h = 0.5
+        else:
+            w = 0.5
+            h = 0.5*float(height) / float(width)
+        w *= self.window_size
+        h *= self.window_size
+        znear = self.znear
+        zfar = znear + self.window_depth
+        # planes in eye coordinates, see VisBackendOpenGL.draw
+        if znear > 0.0:
+            planes = numpy.array([
+                [znear, 0, -w, 0], [-znear, 0, -w, 0],
+                [0, znear, -h, 0], [0, -znear, -h, 0],
+            ], float)
+        else:
+            planes = numpy.array([
+                [1, 0, 0, w], [-1, 0, 0, w],
+                [0, 1, 0, h], [0, -1, 0, h],
+            ], float)
+        planes = numpy.concatenate([planes, [[0, 0, -1, -znear], [0, 0, 1, zfar]]])
+        # transform them to model coordinates
+        origin = self.model_to_eye(numpy.zeros(3, float))
+        r = numpy.array([
+            self.model_to_eye(axis) - origin
+            for axis in numpy.identity(3, float)
+        ]).transpose()
+        result = numpy.zeros((6, 4), float)
+        result[:,:3] = numpy.dot(planes[:,:3], r)
+        result[:,3] = numpy.dot(planes[:,:3], origin) + planes[:,3]
+        result /= numpy.sqrt((result[:,:3]**2).sum(axis=1))[:,numpy.newaxis]
+        return result
+
     def vector_in_plane(self, r, p_m):
         """Returns a vector at camera position r in a plane (through p, orthogonal to viewing direction)
 
@@ -33,7 +33,7 @@
 
 
 from zeobuilder import context
-from zeobuilder.actions.composed import UserError
+from zeobuilder.gui.visual.picking import Picker
 
 import gtk.gtkgl, gtk.gdkgl
 from OpenGL.GL import glViewport, glFlush
@@ -53,6 +53,7 @@ class DrawingArea(gtk.gtkgl.DrawingArea):
 
         self.set_flags(gtk.CAN_FOCUS)
         self.set_size_request(300, 300)
+        self.picker = Picker()
 
     def on_realize(self, widget):
         if not self.get_gl_drawable().gl_begin(self.get_gl_context()): return
@@ -78,33 +79,10 @@ class DrawingArea(gtk.gtkgl.DrawingArea):
         self.get_gl_drawable().gl_end()
 
     def iter_hits(self, selection_box):
-        if not self.get_gl_drawable().gl_begin(self.get_gl_context()): return
-        vb = context.application.vis_backend
-        try:
-            for selection in vb.draw(self.allocation.width, self.allocation.height, selection_box):
-                yield vb.names.get(selection[2][-1])
-        except GLerror, e:
-            self.get_gl_drawable().gl_end()
-            if e.errno[0] == 1283:
-                raise UserError("Too many objects in selection. Increase selection buffer size.")
-            else:
-                raise
-        self.get_gl_drawable().gl_end()
+        return self.picker.iter_hits(selection_box, self.allocation.width, self.allocation.height)
 
     def get_nearest(self, x, y):
-        if not self.get_gl_drawable().gl_begin(self.get_gl_context()): return
-        vb = context.application.vis_backend
-        nearest = None
-        for selection in vb.draw(self.allocation.width, self.allocation.height, (x, y, x, y)):
-            if nearest is None:
-                nearest = selection
-            elif selection[0] < nearest[0]:
-                nearest = selection
-        self.get_gl_drawable().gl_end()
-        if nearest is None:
-            return None
-        else:
-            return vb.names.get(nearest[2][-1])
+        return self.picker.get_nearest(x, y, self.allocation.width, self.allocation.height)
 
     def screen_to_camera(self, p, translate=True):
         w = self.allocation.width
@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+
+
+"""Picking of nodes on the screen without a redraw in select mode
+
+The Picker keeps the geometry of all visible nodes in model coordinates in
+a few arrays:
+
+* the spheres and cones of the batchable nodes (atoms and bonds), as they
+  are added to a batch by add_to_batch,
+* thin boxes around the axes of frames,
+* the bounding boxes of all other leaf nodes.
+
+These arrays are only rebuilt when scene.geometry_revision changes. A click
+is turned into a ray that is tested against all shapes at once. A rectangle
+is tested against the projections of the shapes on the screen. The periodic
+images are handled by shifting the ray or the camera instead of copying the
+shapes.
+"""
+
+
+from zeobuilder import context
+from zeobuilder.nodes.glmixin import GLMixin, GLTransformationMixin
+from zeobuilder.nodes.glcontainermixin import GLContainerMixin
+from zeobuilder.nodes.helpers import FrameAxes
+from zeobuilder.nodes.vector import Vector
+from zeobuilder.gui.visual.vis_backends import Batch
+
+from molmod import Translation, Rotation
+
+import numpy
+
+
+__all__ = ["Picker"]
+
+
+def frame_arrays(frame):
+    if isinstance(frame, Rotation):
+        r = frame.r
+    else:
+        r = numpy.identity(3, float)
+    if isinstance(frame, Translation):
+        t = frame.t
+    else:
+        t = numpy.zeros(3, float)
+    return r, t
+
+
+def ray_box_distances(origin, direction, lows, highs):
+    """Returns the distances along a ray to axis aligned boxes, or -1 if missed
+
+    The origin and the direction may be given for each box separately.
+    """
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        t1 = (lows - origin)/direction
+        t2 = (highs - origin)/direction
+    # when the ray is parallel to a slab, it must lie in between
+    parallel = (direction == 0)
+    inside = (origin >= lows) & (origin <= highs)
+    low = numpy.where(parallel, numpy.where(inside, -numpy.inf, numpy.inf), numpy.minimum(t1, t2))
+    high = numpy.where(parallel, numpy.where(inside, numpy.inf, -numpy.inf), numpy.maximum(t1, t2))
+    low = low.max(axis=1)
+    high = high.min(axis=1)
+    return numpy.where((low <= high) & (high >= 0), low.clip(0, numpy.inf), -1)
+
+
+def transform_rows(rotations, translations, points):
+    return (rotations*points[:,numpy.newaxis,:]).sum(axis=2) + translations
+
+
+class PickBatch(Batch):
+    """Collects the shapes of batchable nodes
+
+    The shapes are stored in the frame of the parent node. The index of that
+    frame is stored with each shape, such that all of them can be
+    transformed to model coordinates at once.
+    """
+    def __init__(self):
+        Batch.__init__(self)
+        self.owner = None
+        self.frame_index = None
+        self.sphere_data = []
+        self.cone_data = []
+
+    def add_sphere(self, center, radius, color, quality):
+        self.sphere_data.append((center, radius, self.owner, self.frame_index))
+
+    def add_cone(self, transformation, z, length, radius1, radius2, color, quality):
+        r, t = frame_arrays(transformation)
+        self.cone_data.append((
+            t + r[:,2]*z, t + r[:,2]*(z + length), radius1, radius2,
+            self.owner, self.frame_index
+        ))
+
+
+class Picker(object):
+    def __init__(self):
+        self.revision = None
+        self.nodes = []
+
+    #
+    # Geometry
+    #
+
+    def update(self):
+        scene = context.application.scene
+        if self.revision == scene.geometry_revision:
+            return
+        self.nodes = []
+        self.frames = []
+        self.batch = PickBatch()
+        self.box_data = []
+        universe = context.application.model.universe
+        if universe is not None:
+            self.collect(universe, frame_arrays(universe.get_absolute_parentframe()))
+        frame_rotations = numpy.array([r for r, t in self.frames], float).reshape((-1, 3, 3))
+        frame_translations = numpy.array([t for r, t in self.frames], float).reshape((-1, 3))
+
+        sphere_data = self.batch.sphere_data
+        frames = numpy.array([row[3] for row in sphere_data], int)
+        self.sphere_centers = transform_rows(
+            frame_rotations[frames], frame_translations[frames],
+            numpy.array([row[0] for row in sphere_data], float).reshape((-1, 3)),
+        )
+        self.sphere_radii = numpy.array([row[1] for row in sphere_data], float)
+        self.sphere_owners = numpy.array([row[2] for row in sphere_data], int)
+
+        cone_data = self.batch.cone_data
+        frames = numpy.array([row[5] for row in cone_data], int)
+        self.cone_begins = transform_rows(
+            frame_rotations[frames], frame_translations[frames],
+            numpy.array([row[0] for row in cone_data], float).reshape((-1, 3)),
+        )
+        self.cone_ends = transform_rows(
+            frame_rotations[frames], frame_translations[frames],
+            numpy.array([row[1] for row in cone_data], float).reshape((-1, 3)),
+        )
+        self.cone_radii = numpy.array([(row[2], row[3]) for row in cone_data], float).reshape((-1, 2))
+        self.cone_owners = numpy.array([row[4] for row in cone_data], int)
+
+        box_data = self.box_data
+        self.box_rotations = numpy.array([row[0] for row in box_data], float).reshape((-1, 3, 3))
+        self.box_translations = numpy.array([row[1] for row in box_data], float).reshape((-1, 3))
+        self.box_corners = numpy.array([row[2] for row in box_data], float).reshape((-1, 2, 3))
+        self.box_owners = numpy.array([row[3] for row in box_data], int)
+
+        del self.frames
+        del self.batch
+        del self.box_data
+        self.revision = scene.geometry_revision
+
+    def collect(self, node, parent_frame):
+        """Adds the shapes of a node and its children
+
+        The parent_frame is a rotation matrix and a translation vector that
+        transform the coordinates in the parent frame of the node to model
+        coordinates.
+        """
+        if not (isinstance(node, GLMixin) and node.gl_active and node.visible):
+            return
+        owner = len(self.nodes)
+        self.nodes.append(node)
+        if node.batchable:
+            if self.batch.frame_index is None or self.frames[self.batch.frame_index] is not parent_frame:
+                self.batch.frame_index = len(self.frames)
+                self.frames.append(parent_frame)
+            self.batch.owner = owner
+            node.add_to_batch(self.batch)
+            return
+        if isinstance(node, GLTransformationMixin):
+            r, t = frame_arrays(node.transformation)
+            frame = (numpy.dot(parent_frame[0], r), numpy.dot(parent_frame[0], t) + parent_frame[1])
+        else:
+            frame = parent_frame
+        if isinstance(node, GLContainerMixin):
+            if isinstance(node, FrameAxes) and node.axes_visible:
+                thickness = node.axis_thickness
+                for axis in xrange(3):
+                    corners = numpy.array([[-thickness]*3, [thickness]*3], float)
+                    corners[1, axis] = node.axis_length
+                    self.box_data.append((frame[0], frame[1], corners, owner))
+            for child in node.children:
+                self.collect(child, frame)
+        elif node.bounding_box.corners is not None:
+            if isinstance(node, Vector):
+                # the bounding box of a vector is defined in its orientation
+                r, t = frame_arrays(node.orientation)
+                frame = (numpy.dot(frame[0], r), numpy.dot(frame[0], t) + frame[1])
+            self.box_data.append((frame[0], frame[1], node.bounding_box.corners, owner))
+
+    def get_images(self):
+        """Returns the translations of the periodic images and their bounds
+
+        The bounds are the bounding box of the universe, or None when it is
+        not known.
+        """
+        universe = context.application.model.universe
+        if universe is None or not universe.gl_active or len(universe.image_translations) == 0:
+            return numpy.zeros((1, 3), float), None
+        else:
+            return universe.image_translations, universe.bounding_box.corners
+
+    def clipped(self, points):
+        """Returns a mask for the points that are removed by the clip planes"""
+        result = numpy.zeros(len(points), bool)
+        for plane in context.application.scene.clip_planes:
+            result |= numpy.dot(points, plane[:3]) + plane[3] < 0
+        return result
+
+    #
+    # Nearest node along a ray
+    #
+
+    def get_ray(self, x, y, width, height):
+        """Returns origin, direction and length of the ray through a pixel
+
+        The ray starts at the front clipping plane and ends at the back
+        clipping plane.
+        """
+        camera = context.application.camera
+        c = numpy.array([x - 0.5*width, 0.5*height - y], float)/min(width, height)
+        znear = camera.znear
+        origin_e = numpy.zeros(3, float)
+        origin_e[:2] = c*camera.window_size
+        origin_e[2] = -znear
+        if znear > 0:
+            direction_e = origin_e/numpy.linalg.norm(origin_e)
+        else:
+            direction_e = numpy.array([0, 0, -1], float)
+        length = camera.window_depth/abs(direction_e[2])
+        origin = camera.eye_to_model(origin_e)
+        direction = camera.eye_to_model(origin_e + direction_e) - origin
+        return origin, direction, length
+
+    def get_nearest(self, x, y, width, height):
+        self.update()
+        if len(self.nodes) == 0:
+            return None
+        origin, direction, length = self.get_ray(x, y, width, height)
+        nearest_distance = length
+        nearest_owner = None
+        translations, corners = self.get_images()
+        if corners is not None:
+            # only the images whose bounding box is crossed by the ray
+            distances = ray_box_distances(origin, direction, corners[0] + translations, corners[1] + translations)
+            translations = translations[(distances >= 0) & (distances <= length)]
+        for translation in translations:
+            o = origin - translation
+            for distances, owners in [
+                self.hit_spheres(o, direction),
+                self.hit_cones(o, direction),
+                self.hit_boxes(o, direction),
+            ]:
+                mask = (distances >= 0) & (distances <= nearest_distance)
+                if not mask.any():
+                    continue
+                points = origin + numpy.outer(distances[mask], direction)
+                candidates = numpy.arange(len(distances))[mask][~self.clipped(points)]
+                if len(candidates) == 0:
+                    continue
+                best = candidates[distances[candidates].argmin()]
+                nearest_distance = distances[best]
+                nearest_owner = owners[best]
+        if nearest_owner is None:
+            return None
+        return self.nodes[nearest_owner]
+
+    def hit_spheres(self, origin, direction):
+        # the distance along the ray to the first intersection, or -1
+        delta = self.sphere_centers - origin
+        along = numpy.dot(delta, direction)
+        perp_sq = (delta**2).sum(axis=1) - along**2
+        margin_sq = self.sphere_radii**2 - perp_sq
+        distances = numpy.where(margin_sq >= 0, along - numpy.sqrt(abs(margin_sq)), -1)
+        return distances, self.sphere_owners
+
+    def hit_cones(self, origin, direction):
+        # The cones are truncated and have flat ends. The ray enters a cone
+        # where it enters the slab between the two ends, or where it crosses
+        # the mantle within that slab. Inside the slab, the radius is not
+        # negative, so the mantle is given by a quadratic equation in the
+        # distance along the ray, t:
+        #     |u + t*v|**2 = (c0 + c1*t)**2
+        # where u + t*v is the component of the position orthogonal to the
+        # axis and c0 + c1*t is the radius at that position.
+        axes = self.cone_ends - self.cone_begins
+        lengths = numpy.sqrt((axes**2).sum(axis=1))
+        degenerate = lengths == 0
+        lengths[degenerate] = 1
+        axes /= lengths[:,numpy.newaxis]
+        slopes = (self.cone_radii[:,1] - self.cone_radii[:,0])/lengths
+        w = origin - self.cone_begins
+        e = (axes*w).sum(axis=1)
+        b = numpy.dot(axes, direction)
+        u = w - axes*e[:,numpy.newaxis]
+        v = direction - axes*b[:,numpy.newaxis]
+        c0 = self.cone_radii[:,0] + slopes*e
+        c1 = slopes*b
+        qa = (v**2).sum(axis=1) - c1**2
+        qb = (u*v).sum(axis=1) - c0*c1
+        qc = (u**2).sum(axis=1) - c0**2
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            # the part of the ray in between the planes of the two ends
+            t1 = -e/b
+            t2 = (lengths - e)/b
+            parallel = (b == 0)
+            inside = (e >= 0) & (e <= lengths)
+            lows = numpy.where(parallel, numpy.where(inside, -numpy.inf, numpy.inf), numpy.minimum(t1, t2))
+            highs = numpy.where(parallel, numpy.where(inside, numpy.inf, -numpy.inf), numpy.maximum(t1, t2))
+            # the roots of the quadratic equation, in a stable form that also
+            # covers qa == 0
+            discriminants = qb*qb - qa*qc
+            q = -(qb + numpy.where(qb >= 0, 1, -1)*numpy.sqrt(abs(discriminants)))
+            roots = [q/qa, qc/q]
+            # The first point of the ray inside the cone is either the entry
+            # in the slab or a crossing with the mantle.
+            distances = numpy.zeros(len(lengths)) + numpy.inf
+            enter = numpy.isfinite(lows) & (qa*lows*lows + 2*qb*lows + qc <= 0)
+            distances[enter] = lows[enter]
+            for root in roots:
+                cross = (discriminants >= 0) & (root >= lows) & (root <= highs) & (root < distances)
+                distances[cross] = root[cross]
+        distances[degenerate | ~numpy.isfinite(distances)] = -1
+        return distances, self.cone_owners
+
+    def hit_boxes(self, origin, direction):
+        # the ray in the frame of each box
+        o = ((origin - self.box_translations)[:,:,numpy.newaxis]*self.box_rotations).sum(axis=1)
+        d = (direction[:,numpy.newaxis]*self.box_rotations).sum(axis=1)
+        distances = ray_box_distances(o, d, self.box_corners[:,0], self.box_corners[:,1])
+        return distances, self.box_owners
+
+    #
+    # Nodes in a rectangle on the screen
+    #
+
+    def project(self, points, width, height):
+        """Returns the screen coordinates, depth and pixels per unit length"""
+        camera = context.application.camera
+        origin = camera.model_to_eye(numpy.zeros(3, float))
+        r = numpy.array([
+            camera.model_to_eye(axis) - origin
+            for axis in numpy.identity(3, float)
+        ])
+        eye = numpy.dot(points, r) + origin
+        depths = -eye[:,2]
+        size = min(width, height)
+        znear = camera.znear
+        if znear > 0:
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                scales = size*znear/(camera.window_size*depths)
+        else:
+            scales = numpy.zeros(len(points), float) + size/camera.window_size
+        screen = eye[:,:2]*scales[:,numpy.newaxis]
+        screen[:,0] += 0.5*width
+        screen[:,1] = 0.5*height - screen[:,1]
+        return screen, depths, scales
+
+    def in_rectangle(self, points, radii, rectangle, width, height, clip=True):
+        """Returns a mask for the spheres whose projections overlap the rectangle"""
+        camera = context.application.camera
+        left, top, right, bottom = rectangle
+        screen, depths, scales = self.project(points, width, height)
+        margins = radii*scales
+        result = (
+            (depths + radii >= camera.znear) &
+            (depths - radii <= camera.znear + camera.window_depth) &
+            (screen[:,0] + margins >= left) & (screen[:,0] - margins <= right) &
+            (screen[:,1] + margins >= top) & (screen[:,1] - margins <= bottom)
+        )
+        if clip:
+            result &= ~self.clipped(points)
+        return result
+
+    def iter_hits(self, rectangle, width, height):
+        self.update()
+        if len(self.nodes) == 0:
+            return
+        hits = numpy.zeros(len(self.nodes), bool)
+        translations, corners = self.get_images()
+        if corners is not None:
+            # only the images whose bounding box may overlap the rectangle
+            center = 0.5*(corners[0] + corners[1])
+            radius = 0.5*numpy.linalg.norm(corners[1] - corners[0])
+            translations = translations[self.in_rectangle(
+                center + translations, numpy.zeros(len(translations)) + radius,
+                rectangle, width, height, clip=False
+            )]
+        for translation in translations:
+            owners = self.sphere_owners[self.in_rectangle(
+                self.sphere_centers + translation, self.sphere_radii,
+                rectangle, width, height
+            )]
+            hits[owners] = True
+            # the ends and the middle of each cone
+            radii = self.cone_radii.max(axis=1)
+            for points in self.cone_begins, self.cone_ends, 0.5*(self.cone_begins + self.cone_ends):
+                owners = self.cone_owners[self.in_rectangle(
+                    points + translation, radii, rectangle, width, height
+                )]
+                hits[owners] = True
+            # the centers of the boxes, with the half diagonal as radius
+            centers = 0.5*(self.box_corners[:,0] + self.box_corners[:,1])
+            centers = (self.box_rotations*centers[:,numpy.newaxis,:]).sum(axis=2) + self.box_translations
+            radii = 0.5*numpy.sqrt(((self.box_corners[:,1] - self.box_corners[:,0])**2).sum(axis=1))
+            owners = self.box_owners[self.in_rectangle(
+                centers + translation, radii, rectangle, width, height
+            )]
+            hits[owners] = True
+        for owner in hits.nonzero()[0]:
+            yield self.nodes[owner]
@@ -69,9 +69,22 @@ class Scene(object):
             10.0*angstrom,
             None,
         )
+        config.register_setting(
+            "batched_rendering",
+            False,
+            None,
+        )
+        config.register_setting(
+            "level_of_detail",
+            True,
+            None,
+        )
 
         self.revalidations = []
         self.clip_planes = []
+        # incremented when the shape, the position or the visibility of a
+        # node changes, see Picker
+        self.geometry_revision = 0
 
     def initialize_draw(self):
         vb = context.application.vis_backend
@@ -128,6 +141,14 @@ class Scene(object):
         universe = context.application.model.universe
         if universe is not None:
             universe.invalidate_box_list()
+            # switch the containers to or from batched rendering
+            from zeobuilder.nodes.glcontainermixin import GLContainerMixin
+            def invalidate_containers(node):
+                if isinstance(node, GLContainerMixin):
+                    node.invalidate_draw_list()
+                    for child in node.children:
+                        invalidate_containers(child)
+            invalidate_containers(universe)
         context.application.main.drawing_area.queue_draw()
 
     def get_model_center(self):
@@ -141,7 +162,7 @@ class Scene(object):
     def add_revalidation(self, revalidation):
         self.revalidations.append(revalidation)
 
-    def draw(self):
+    def draw(self, frustum=None):
         vb = context.application.vis_backend
         for plane_i, coefficients in enumerate(self.clip_planes):
             vb.set_clip_plane(plane_i, coefficients)
@@ -150,8 +171,10 @@ class Scene(object):
         for revalidation in self.revalidations:
             revalidation()
         self.revalidations = []
+        vb.update_lod()
         universe = context.application.model.universe
         if universe is not None:
+            universe.update_images_list(frustum)
             vb.call_list(universe.total_list)
 
         for plane_i in xrange(len(self.clip_planes)):
@@ -42,24 +42,58 @@ from OpenGL.GLU import gluCylinder, gluDisk, gluNewQuadric, gluPickMatrix, \
     gluQuadricNormals, gluQuadricOrientation, gluSphere, GLU_INSIDE, \
     GLU_OUTSIDE, GLU_SMOOTH
 from OpenGL.GL import glBegin, glCallList, glClear, glClearColor, glClipPlane, \
-    glCullFace, glDeleteLists, glDepthFunc, glDisable, glEnable, glEnd, \
-    glEndList, glFogfv, glFrustum, glGenLists, glInitNames, glLight, \
-    glLineWidth, glLoadIdentity, glMaterial, glMatrixMode, glMultMatrixf, \
-    glNewList, glNormal3fv, glOrtho, glPopMatrix, \
-    glPopName, glPushMatrix, glPushName, glRenderMode, glRotate, \
-    glSelectBuffer, glShadeModel, glTranslate, glTranslatef, glVertex, \
+    glColorMaterial, glColorPointer, glCullFace, glDeleteLists, glDepthFunc, \
+    glDisable, glDisableClientState, glDrawElements, glEnable, \
+    glEnableClientState, glEnd, glEndList, glFogfv, glFrustum, glGenLists, \
+    glInitNames, glLight, glLineWidth, glLoadIdentity, glMaterial, \
+    glMatrixMode, glMultMatrixf, glNewList, glNormal3fv, glNormalPointer, \
+    glOrtho, glPopMatrix, glPopName, glPushMatrix, glPushName, glRenderMode, \
+    glRotate, glScalef, glSelectBuffer, glShadeModel, glTranslate, \
+    glTranslatef, glVertex, glVertexPointer, \
     GL_AMBIENT, GL_AMBIENT_AND_DIFFUSE, GL_BACK, GL_CLIP_PLANE0, \
     GL_CLIP_PLANE1, GL_CLIP_PLANE2, GL_CLIP_PLANE3, GL_CLIP_PLANE4, \
-    GL_CLIP_PLANE5, GL_COLOR_BUFFER_BIT, GL_COMPILE, GL_DEPTH_BUFFER_BIT, \
-    GL_DEPTH_TEST, GL_FOG, GL_FOG_COLOR, GL_FOG_END, GL_FOG_MODE, \
-    GL_FOG_START, GL_FRONT, GL_LESS, GL_LIGHT0, GL_LIGHTING, GL_LINEAR, \
-    GL_LINES, GL_MODELVIEW, GL_POLYGON, GL_POSITION, GL_PROJECTION, GL_QUADS, \
+    GL_CLIP_PLANE5, GL_COLOR_ARRAY, GL_COLOR_BUFFER_BIT, GL_COLOR_MATERIAL, \
+    GL_COMPILE, GL_DEPTH_BUFFER_BIT, GL_DEPTH_TEST, GL_FLOAT, GL_FOG, \
+    GL_FOG_COLOR, GL_FOG_END, GL_FOG_MODE, GL_FOG_START, GL_FRONT, GL_LESS, \
+    GL_LIGHT0, GL_LIGHTING, GL_LINEAR, GL_LINES, GL_MODELVIEW, GL_NORMALIZE, \
+    GL_NORMAL_ARRAY, GL_POLYGON, GL_POSITION, GL_PROJECTION, GL_QUADS, \
     GL_QUAD_STRIP, GL_RENDER, GL_SELECT, GL_SHININESS, GL_SMOOTH, \
-    GL_SPECULAR, GL_TRIANGLES, GL_TRIANGLE_STRIP
+    GL_SPECULAR, GL_TRIANGLES, GL_TRIANGLE_STRIP, GL_UNSIGNED_INT, \
+    GL_VERTEX_ARRAY
 
 import numpy
 
-__all__ = ["VisBackend", "VisBackendOpenGL"]
+__all__ = ["Batch", "VisBackend", "VisBackendOpenGL", "VisBackendNull"]
+
+
+class Batch(object):
+    """Collects spheres and cones that are drawn at once with draw_batch.
+
+    The shapes are grouped by quality, such that each group can be drawn
+    with copies of a single mesh.
+    """
+    def __init__(self):
+        self.spheres = {}
+        self.cones = {}
+
+    def add_sphere(self, center, radius, color, quality):
+        spheres = self.spheres.get(quality)
+        if spheres is None:
+            spheres = []
+            self.spheres[quality] = spheres
+        spheres.append((center, radius, color))
+
+    def add_cone(self, transformation, z, length, radius1, radius2, color, quality):
+        # The cone is oriented along the z-axis of the given transformation,
+        # like the cones drawn with draw_cone.
+        cones = self.cones.get(quality)
+        if cones is None:
+            cones = []
+            self.cones[quality] = cones
+        cones.append((transformation, z, length, radius1, radius2, color))
+
+    def is_empty(self):
+        return len(self.spheres) == 0 and len(self.cones) == 0
 
 
 class VisBackend(object):
@@ -88,6 +122,9 @@ class VisBackend(object):
     def call_list(self, l):
         raise NotImplementedError
 
+    def create_batch(self):
+        return Batch()
+
     #
     # Names
     #
@@ -167,6 +204,19 @@ class VisBackend(object):
     def set_quadric_inside(self):
         raise NotImplementedError
 
+    def draw_batch(self, batch):
+        raise NotImplementedError
+
+    #
+    # Level of detail
+    #
+
+    def set_interactive(self, interactive):
+        raise NotImplementedError
+
+    def update_lod(self):
+        raise NotImplementedError
+
     #
     # Clip functions
     #
@@ -191,6 +241,51 @@ class VisBackend(object):
         raise NotImplementedError
 
 
+def sphere_mesh(quality):
+    """Returns the vertices and the triangles of a unit sphere
+
+    The number of slices and stacks is the same as for draw_sphere.
+    """
+    slices = quality
+    stacks = max(quality/2, 2)
+    phi = numpy.linspace(0, numpy.pi, stacks+1)
+    theta = numpy.arange(slices)*(2*numpy.pi/slices)
+    vertices = numpy.zeros((stacks+1, slices, 3), numpy.float32)
+    vertices[:,:,0] = numpy.outer(numpy.sin(phi), numpy.cos(theta))
+    vertices[:,:,1] = numpy.outer(numpy.sin(phi), numpy.sin(theta))
+    vertices[:,:,2] = numpy.cos(phi)[:,numpy.newaxis]
+    i = numpy.arange(stacks)[:,numpy.newaxis]
+    j = numpy.arange(slices)[numpy.newaxis,:]
+    a = i*slices + j
+    b = i*slices + (j+1)%slices
+    c = a + slices
+    d = b + slices
+    triangles = numpy.array([a, c, b, b, c, d], numpy.uint32)
+    triangles = triangles.transpose((1, 2, 0)).reshape((-1, 3))
+    vertices = vertices.reshape((-1, 3))
+    # drop the degenerate triangles at the poles
+    corners = vertices[triangles]
+    areas = numpy.cross(corners[:,1] - corners[:,0], corners[:,2] - corners[:,0])
+    triangles = triangles[(areas**2).sum(axis=1) > 1e-12]
+    return vertices, triangles.ravel()
+
+
+def cone_mesh(quality):
+    """Returns the angles around the axis and the triangles of a cone
+
+    The vertices of the bottom ring come first, followed by the vertices of
+    the top ring.
+    """
+    theta = numpy.arange(quality)*(2*numpy.pi/quality)
+    j = numpy.arange(quality)
+    a = j
+    b = (j+1)%quality
+    c = a + quality
+    d = b + quality
+    triangles = numpy.array([a, b, c, b, d, c], numpy.uint32).transpose().ravel()
+    return numpy.cos(theta), numpy.sin(theta), triangles
+
+
 def gl_apply(transformation):
     # OpenGL uses an algebra with row vectors instead of column vectors.
     if not isinstance(transformation, Rotation):
@@ -221,6 +316,16 @@ def gl_apply_inverse(transformation):
 
 class VisBackendOpenGL(VisBackend):
     select_buffer_size = 1024*64
+    # the maximum number of shapes in one call to glDrawElements
+    batch_size = 4096
+    # the number of slices of the precompiled meshes
+    lod_levels = [4, 6, 8, 12, 16, 24, 32, 48]
+    # the number of slices while the user rotates or translates the world
+    lod_interactive_slices = 6
+    # the desired length of the edges of the meshes on screen, in pixels
+    lod_edge_length = 4.0
+    # the maximum number of triangles in all the spheres, cones and disks
+    lod_budget = 1000000
 
     def __init__(self, scene, camera):
         VisBackend.__init__(self)
@@ -229,6 +334,24 @@ class VisBackendOpenGL(VisBackend):
         self.names = {}
         self.clip_constants = [GL_CLIP_PLANE0, GL_CLIP_PLANE1, GL_CLIP_PLANE2, GL_CLIP_PLANE3, GL_CLIP_PLANE4, GL_CLIP_PLANE5]
         self.tool = Tool()
+        self.sphere_meshes = {}
+        self.cone_meshes = {}
+        self.quadric_inside = False
+        # Each shape is drawn by calling a small list that calls the mesh of
+        # the current level of detail. Changing the level only requires the
+        # recompilation of these small lists.
+        self.lod_shapes = {}
+        self.lod_current = {}
+        self.lod_meshes = {}
+        self.lod_enabled = False
+        self.lod_interactive = False
+        self.lod_pixel_scale = None
+        self.lod_budget_slices = None
+        # the number of spheres and other shapes in each display list
+        self.current_list = None
+        self.list_counts = {}
+        self.num_spheres = 0
+        self.num_others = 0
 
     #
     # Generic stuff
@@ -247,6 +370,8 @@ class VisBackendOpenGL(VisBackend):
         glDepthFunc(GL_LESS)
         glEnable(GL_DEPTH_TEST)
         glCullFace(GL_BACK)
+        # the cones are scaled along their axis
+        glEnable(GL_NORMALIZE)
         VisBackend.initialize_draw(self)
         self.tool.initialize_gl()
 
@@ -287,6 +412,8 @@ class VisBackendOpenGL(VisBackend):
 
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
+        # The number of pixels per unit of length at the rotation center
+        self.lod_pixel_scale = min(width, height)/camera.window_size
         # Move to eye position (reverse)
         gl_apply_inverse(camera.eye)
         glTranslatef(0.0, 0.0, -znear)
@@ -301,7 +428,7 @@ class VisBackendOpenGL(VisBackend):
         gl_apply_inverse(camera.rotation_center)
         gl_apply_inverse(scene.model_center)
 
-        scene.draw()
+        scene.draw(camera.get_frustum_planes(width, height))
 
         if selection_box is not None:
             # now let the caller analyze the hits by returning the selection
@@ -327,12 +454,33 @@ class VisBackendOpenGL(VisBackend):
         glDeleteLists(l, 1)
         if l in self.names:
             del self.names[l]
+        self.reset_counts(l)
 
     def begin_list(self, l):
         glNewList(l, GL_COMPILE)
+        self.reset_counts(l)
+        self.current_list = l
 
     def end_list(self):
         glEndList()
+        self.current_list = None
+
+    def reset_counts(self, l):
+        counts = self.list_counts.pop(l, None)
+        if counts is not None:
+            self.num_spheres -= counts[0]
+            self.num_others -= counts[1]
+
+    def add_counts(self, num_spheres, num_others):
+        if self.current_list is None: return
+        counts = self.list_counts.get(self.current_list)
+        if counts is None:
+            counts = [0, 0]
+            self.list_counts[self.current_list] = counts
+        counts[0] += num_spheres
+        counts[1] += num_others
+        self.num_spheres += num_spheres
+        self.num_others += num_others
 
     def call_list(self, l):
         glCallList(l)
@@ -450,22 +598,219 @@ class VisBackendOpenGL(VisBackend):
         glEnd()
 
     def draw_sphere(self, radius, quality):
-        gluSphere(self.quadric, radius, quality, quality/2)
+        self.draw_shape(("sphere", radius, radius, self.quadric_inside), quality)
+        self.add_counts(1, 0)
 
     def draw_cylinder(self, radius, length, quality):
-        gluCylinder(self.quadric, radius, radius, length, quality, 1)
+        self.draw_cone(radius, radius, length, quality)
 
     def draw_cone(self, radius1, radius2, length, quality):
-        gluCylinder(self.quadric, radius1, radius2, length, quality, 1)
+        # All cones with the same radii share their meshes.
+        glPushMatrix()
+        glScalef(1.0, 1.0, length)
+        self.draw_shape(("cone", radius1, radius2, self.quadric_inside), quality)
+        glPopMatrix()
+        self.add_counts(0, 1)
 
     def draw_disk(self, radius, quality):
-        gluDisk(self.quadric, 0, radius, quality, 1)
+        self.draw_shape(("disk", radius, radius, self.quadric_inside), quality)
+        self.add_counts(0, 1)
 
     def set_quadric_outside(self):
         gluQuadricOrientation(self.quadric, GLU_OUTSIDE)
+        self.quadric_inside = False
 
     def set_quadric_inside(self):
         gluQuadricOrientation(self.quadric, GLU_INSIDE)
+        self.quadric_inside = True
+
+    def draw_batch(self, batch):
+        if batch.is_empty(): return
+        glEnable(GL_COLOR_MATERIAL)
+        glColorMaterial(GL_FRONT, GL_AMBIENT_AND_DIFFUSE)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        # The level of detail is fixed when the batch is compiled.
+        spheres_per_slices = {}
+        for quality, spheres in batch.spheres.iteritems():
+            for sphere in spheres:
+                slices = self.get_lod_slices(quality, sphere[1], False)
+                spheres_per_slices.setdefault(slices, []).append(sphere)
+        for slices, spheres in spheres_per_slices.iteritems():
+            for begin in xrange(0, len(spheres), self.batch_size):
+                self.draw_spheres(spheres[begin:begin+self.batch_size], slices)
+        cones_per_slices = {}
+        for quality, cones in batch.cones.iteritems():
+            for cone in cones:
+                slices = self.get_lod_slices(quality, max(cone[3], cone[4]), False)
+                cones_per_slices.setdefault(slices, []).append(cone)
+        for slices, cones in cones_per_slices.iteritems():
+            for begin in xrange(0, len(cones), self.batch_size):
+                self.draw_cones(cones[begin:begin+self.batch_size], slices)
+        self.add_counts(
+            sum(len(spheres) for spheres in batch.spheres.itervalues()),
+            sum(len(cones) for cones in batch.cones.itervalues()),
+        )
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisable(GL_COLOR_MATERIAL)
+
+    def draw_spheres(self, spheres, quality):
+        mesh = self.sphere_meshes.get(quality)
+        if mesh is None:
+            mesh = sphere_mesh(quality)
+            self.sphere_meshes[quality] = mesh
+        unit, triangles = mesh
+        size = len(spheres)
+        centers = numpy.array([center for center, radius, color in spheres], numpy.float32)
+        radii = numpy.array([radius for center, radius, color in spheres], numpy.float32)
+        colors = numpy.array([color for center, radius, color in spheres], numpy.float32)
+        vertices = centers[:,numpy.newaxis,:] + radii[:,numpy.newaxis,numpy.newaxis]*unit
+        normals = numpy.tile(unit, (size, 1))
+        colors = colors.repeat(len(unit), axis=0)
+        indices = triangles + (len(unit)*numpy.arange(size, dtype=numpy.uint32))[:,numpy.newaxis]
+        self.draw_triangle_arrays(vertices.reshape((-1, 3)), normals, colors, indices.ravel())
+
+    def draw_cones(self, cones, quality):
+        mesh = self.cone_meshes.get(quality)
+        if mesh is None:
+            mesh = cone_mesh(quality)
+            self.cone_meshes[quality] = mesh
+        cos, sin, triangles = mesh
+        size = len(cones)
+        rotations = numpy.zeros((size, 3, 3), float)
+        translations = numpy.zeros((size, 3), float)
+        rings = numpy.zeros((size, 2, 3), float)
+        colors = numpy.zeros((size, 4), numpy.float32)
+        for index, (transformation, z, length, radius1, radius2, color) in enumerate(cones):
+            if isinstance(transformation, Rotation):
+                rotations[index] = transformation.r
+            else:
+                rotations[index] = numpy.identity(3)
+            if isinstance(transformation, Translation):
+                translations[index] = transformation.t
+            # radius, z and slope of the bottom and the top ring
+            rings[index] = [[radius1, z, radius1 - radius2], [radius2, z + length, radius1 - radius2]]
+            rings[index,:,2] /= length
+            colors[index] = color
+        num_ring = len(cos)
+        local = numpy.zeros((size, 2, num_ring, 3), float)
+        local[:,:,:,0] = rings[:,:,0,numpy.newaxis]*cos
+        local[:,:,:,1] = rings[:,:,0,numpy.newaxis]*sin
+        local[:,:,:,2] = rings[:,:,1,numpy.newaxis]
+        local_normals = numpy.zeros((size, 2, num_ring, 3), float)
+        local_normals[:,:,:,0] = cos
+        local_normals[:,:,:,1] = sin
+        local_normals[:,:,:,2] = rings[:,:,2,numpy.newaxis]
+        local_normals /= numpy.sqrt((local_normals**2).sum(axis=3))[:,:,:,numpy.newaxis]
+        local = local.reshape((size, 2*num_ring, 3))
+        local_normals = local_normals.reshape((size, 2*num_ring, 3))
+        rotations = rotations[:,numpy.newaxis,:,:]
+        vertices = (rotations*local[:,:,numpy.newaxis,:]).sum(axis=3)
+        vertices += translations[:,numpy.newaxis,:]
+        normals = (rotations*local_normals[:,:,numpy.newaxis,:]).sum(axis=3)
+        colors = colors.repeat(2*num_ring, axis=0)
+        indices = triangles + (2*num_ring*numpy.arange(size, dtype=numpy.uint32))[:,numpy.newaxis]
+        self.draw_triangle_arrays(
+            vertices.reshape((-1, 3)).astype(numpy.float32),
+            normals.reshape((-1, 3)).astype(numpy.float32),
+            colors, indices.ravel()
+        )
+
+    def draw_triangle_arrays(self, vertices, normals, colors, indices):
+        # The arrays are dereferenced by glDrawElements, also when a display
+        # list is being compiled.
+        glVertexPointer(3, GL_FLOAT, 0, vertices)
+        glNormalPointer(GL_FLOAT, 0, normals)
+        glColorPointer(4, GL_FLOAT, 0, colors)
+        glDrawElements(GL_TRIANGLES, len(indices), GL_UNSIGNED_INT, indices)
+
+    #
+    # Level of detail
+    #
+
+    def set_interactive(self, interactive):
+        self.lod_interactive = interactive
+
+    def get_lod_slices(self, quality, radius, interactive):
+        """Returns the number of slices for a shape with the given radius"""
+        if not self.lod_enabled or self.lod_pixel_scale is None:
+            return quality
+        slices = 2*numpy.pi*radius*self.lod_pixel_scale/self.lod_edge_length
+        if self.lod_budget_slices is not None:
+            slices = min(slices, self.lod_budget_slices)
+        if interactive:
+            slices = min(slices, self.lod_interactive_slices)
+        if slices >= quality:
+            return quality
+        for level in reversed(self.lod_levels):
+            if level <= slices:
+                return min(level, quality)
+        return min(self.lod_levels[0], quality)
+
+    def draw_shape(self, shape, quality):
+        key = (quality,) + shape
+        l = self.lod_shapes.get(key)
+        if l is None:
+            l = glGenLists(1)
+            self.lod_shapes[key] = l
+            if self.current_list is None:
+                self.update_shape(key, l)
+            # else: the list is compiled in update_lod, before it is called
+        glCallList(l)
+
+    def update_shape(self, key, l):
+        quality, kind, radius1, radius2, inside = key
+        slices = self.get_lod_slices(quality, max(radius1, radius2), self.lod_interactive)
+        if self.lod_current.get(key) == slices:
+            return
+        mesh_key = (slices,) + key[1:]
+        mesh = self.lod_meshes.get(mesh_key)
+        if mesh is None:
+            mesh = glGenLists(1)
+            glNewList(mesh, GL_COMPILE)
+            if inside:
+                gluQuadricOrientation(self.quadric, GLU_INSIDE)
+            else:
+                gluQuadricOrientation(self.quadric, GLU_OUTSIDE)
+            if kind == "sphere":
+                gluSphere(self.quadric, radius1, slices, max(slices/2, 2))
+            elif kind == "cone":
+                gluCylinder(self.quadric, radius1, radius2, 1.0, slices, 1)
+            else:
+                gluDisk(self.quadric, 0, radius1, slices, 1)
+            glEndList()
+            if self.quadric_inside:
+                gluQuadricOrientation(self.quadric, GLU_INSIDE)
+            else:
+                gluQuadricOrientation(self.quadric, GLU_OUTSIDE)
+            self.lod_meshes[mesh_key] = mesh
+        glNewList(l, GL_COMPILE)
+        glCallList(mesh)
+        glEndList()
+        self.lod_current[key] = slices
+
+    def update_lod(self):
+        """Selects the meshes for the current zoom, interaction and model size
+
+        This must be called when no display list is being compiled.
+        """
+        self.lod_enabled = context.application.configuration.level_of_detail
+        # The largest number of slices for which the total number of
+        # triangles does not exceed the budget. (A sphere with n slices has
+        # about n*n triangles, the other shapes about 2*n.)
+        a = float(self.num_spheres)
+        b = 2.0*self.num_others
+        if a > 0:
+            self.lod_budget_slices = (-b + numpy.sqrt(b*b + 4*a*self.lod_budget))/(2*a)
+        elif b > 0:
+            self.lod_budget_slices = self.lod_budget/b
+        else:
+            self.lod_budget_slices = None
+        for key, l in self.lod_shapes.iteritems():
+            self.update_shape(key, l)
 
     #
     # Clip functions
@@ -496,3 +841,131 @@ class VisBackendOpenGL(VisBackend):
         glClearColor(*color)
 
 
+class VisBackendNull(VisBackend):
+    """A backend that draws nothing, used by the HeadlessApplication
+
+    Nodes in a model without a tree store never compile display lists, so
+    these calls only happen when a plugin uses the backend directly.
+    """
+
+    def __init__(self):
+        VisBackend.__init__(self)
+        self.list_counter = 0
+
+    def initialize_draw(self):
+        pass
+
+    def draw(self, width, height, selection_box=None):
+        pass
+
+    def tool(self, name, *args, **kwargs):
+        pass
+
+    def create_list(self, owner=None):
+        self.list_counter += 1
+        return self.list_counter
+
+    def delete_list(self, l):
+        pass
+
+    def begin_list(self, l):
+        pass
+
+    def end_list(self):
+        pass
+
+    def call_list(self, l):
+        pass
+
+    def push_name(self, name):
+        pass
+
+    def pop_name(self):
+        pass
+
+    def push_matrix(self):
+        pass
+
+    def translate(self, x, y, z):
+        pass
+
+    def rotate(self, angle, x, y, z):
+        pass
+
+    def transform(self, transformation):
+        pass
+
+    def pop_matrix(self):
+        pass
+
+    def set_color(self, r, g, b, a=1.0):
+        pass
+
+    def set_bright(self, bright):
+        pass
+
+    def set_specular(self, specular):
+        pass
+
+    def set_line_width(self, width):
+        pass
+
+    def draw_line(self, *points):
+        pass
+
+    def draw_polygon(self, *data):
+        pass
+
+    def draw_triangles(self, *data):
+        pass
+
+    def draw_triangle_strip(self, *data):
+        pass
+
+    def draw_quads(self, *data):
+        pass
+
+    def draw_quad_strip(self, *data):
+        pass
+
+    def draw_sphere(self, radius, quality):
+        pass
+
+    def draw_cylinder(self, radius, length, quality):
+        pass
+
+    def draw_cone(self, radius1, radius2, length, quality):
+        pass
+
+    def draw_disk(self, radius, quality):
+        pass
+
+    def set_quadric_outside(self):
+        pass
+
+    def set_quadric_inside(self):
+        pass
+
+    def draw_batch(self, batch):
+        pass
+
+    def set_interactive(self, interactive):
+        pass
+
+    def update_lod(self):
+        pass
+
+    def set_clip_plane(self, index, coefficients):
+        pass
+
+    def unset_clip_plane(self, index):
+        pass
+
+    def unset_fog(self):
+        pass
+
+    def set_fog(self, color, start, end):
+        pass
+
+    def set_background_color(self, color):
+        pass
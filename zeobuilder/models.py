@@ -39,7 +39,7 @@ from zeobuilder import context
 import gzip, bz2, gobject, os
 
 
-__all__ = ["Model", "FilenameError"]
+__all__ = ["Model", "FilenameError", "OrderedSet"]
 
 
 class FilenameError(Exception):
@@ -51,6 +51,68 @@ class FilenameError(Exception):
         return "%s:\n%s" % (self.about, self.msg)
 
 
+class OrderedSet(object):
+    """A set that remembers the order in which the items were added
+
+    Adding, removing and membership tests take constant time. A removed item
+    leaves a hole in the list of items, which is cleaned up when there are
+    more holes than items or when an item is looked up by its position.
+    """
+
+    def __init__(self, items=()):
+        self.items = []
+        self.positions = {}
+        self.num_holes = 0
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def remove(self, item):
+        position = self.positions.pop(item, None)
+        if position is None:
+            raise ValueError("OrderedSet.remove(x): x not in set")
+        if position == len(self.items) - 1:
+            self.items.pop()
+        else:
+            self.items[position] = None
+            self.num_holes += 1
+            if self.num_holes > len(self.positions):
+                self.compact()
+
+    def compact(self):
+        if self.num_holes > 0:
+            self.items = [item for item in self.items if item is not None]
+            self.positions = dict((item, position) for position, item in enumerate(self.items))
+            self.num_holes = 0
+
+    def clear(self):
+        self.items = []
+        self.positions = {}
+        self.num_holes = 0
+
+    def index(self, item):
+        self.compact()
+        return self.positions[item]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def __iter__(self):
+        self.compact()
+        return iter(self.items)
+
+    def __getitem__(self, index):
+        self.compact()
+        return self.items[index]
+
+
 class Model(gobject.GObject):
     def __init__(self):
         gobject.GObject.__init__(self)
@@ -58,18 +120,38 @@ class Model(gobject.GObject):
         self.universe = None
         self.folder = None
         self.filename = None
+        self.revision = 0
 
-        self.selection = []
+        self.selection = OrderedSet()
 
     # selection stuff
 
     def add_to_selection(self, node):
-        self.selection.append(node)
-        context.application.cache.queue_invalidate()
+        self.selection.add(node)
+        context.application.cache.queue_select(node)
 
     def remove_from_selection(self, node):
         self.selection.remove(node)
-        context.application.cache.queue_invalidate()
+        context.application.cache.queue_deselect(node)
+
+    # revisions
+
+    def touch(self, nodes, parents=[]):
+        """Mark the given nodes and their ancestors as modified
+
+        The revision of the model is increased and stored in the revision
+        attribute of the nodes. The subtree_revision attribute of the nodes,
+        the parents and all their ancestors is updated too. Data derived from
+        a part of the model remains valid as long as these attributes do not
+        change.
+        """
+        self.revision += 1
+        for node in nodes:
+            node.revision = self.revision
+        for node in nodes + parents:
+            while node is not None and node.subtree_revision != self.revision:
+                node.subtree_revision = self.revision
+                node = node.parent
 
     # internal functions
 
@@ -34,14 +34,18 @@
 
 from zeobuilder import context
 from zeobuilder.nodes.parent_mixin import ContainerMixin
+from zeobuilder.nodes.glmixin import GLMixin, GLTransformationMixin
 
 from molmod.periodic import periodic
-from molmod import Molecule, MolecularGraph
+from molmod import Molecule, MolecularGraph, Complete, GraphSearch, RingPattern
+
+import numpy
 
 
 __all__ = [
-    "iter_atoms", "iter_bonds", "chemical_formula",
-    "create_molecule", "create_molecular_graph"
+    "iter_atoms", "iter_bonds", "chemical_formula", "get_coordinates",
+    "create_molecule", "create_molecular_graph", "MolecularGraphCache",
+    "graph_cache", "get_molecular_graph", "get_rings"
 ]
 
 
@@ -90,17 +94,95 @@ def chemical_formula(atoms, markup=False):
     return total, formula
 
 
-def create_molecule(selected_nodes, parent=None):
-    numbers = []
-    coordinates = []
-    atoms = list(iter_atoms(selected_nodes))
-    for atom in atoms:
-        numbers.append(atom.number)
+def get_coordinates(nodes, parent=None, exact=False):
+    """Returns the positions of the given nodes in an array with shape (N, 3)
+
+    The positions are absolute, or relative to the frame of parent when it is
+    given. The absolute frame of each container is composed only once, and
+    the positions of the children of a container are transformed in one go.
+    This gives the same result as get_absolute_frame and
+    get_frame_relative_to, but it avoids walking up the tree for every node.
+
+    The transformation of many positions at once may differ in the last bit
+    from the one of a single position. With exact=True, the result is
+    identical to get_absolute_frame().t or get_frame_relative_to(parent).t,
+    as needed for byte-identical output of the dump filters. The nodes whose
+    parent is not the given parent are then transformed one by one.
+    """
+    frames = {}
+    def get_frame(node):
+        # the absolute frame of a node, see GLMixin.get_absolute_frame
+        if not isinstance(node, GLMixin):
+            return Complete.identity()
+        frame = frames.get(node)
+        if frame is None:
+            if isinstance(node.parent, GLMixin):
+                frame = get_frame(node.parent)
+                if isinstance(node, GLTransformationMixin):
+                    frame = frame*node.transformation
+            elif isinstance(node, GLTransformationMixin):
+                frame = node.transformation
+            else:
+                frame = Complete.identity()
+            frames[node] = frame
+        return frame
+
+    def get_exact_frame(node_parent):
+        # the frame used by get_absolute_frame or get_frame_relative_to, or
+        # None when there is no such frame
+        if parent is None:
+            if isinstance(node_parent, GLMixin):
+                return node_parent.get_absolute_frame()
+        elif parent in node_parent.trace():
+            return node_parent.get_frame_up_to(parent)
+
+    def get_exact_position(node):
         if parent is None:
-            coordinates.append(atom.get_absolute_frame().t)
+            return node.get_absolute_frame().t
+        else:
+            return node.get_frame_relative_to(parent).t
+
+    rows_by_parent = {}
+    for row, node in enumerate(nodes):
+        rows = rows_by_parent.get(node.parent)
+        if rows is None:
+            rows = []
+            rows_by_parent[node.parent] = rows
+        rows.append(row)
+
+    if parent is not None:
+        parent_frame_inv = get_frame(parent).inv
+    result = numpy.zeros((len(nodes), 3), float)
+    for node_parent, rows in rows_by_parent.iteritems():
+        translations = numpy.array([nodes[row].transformation.t for row in rows])
+        if node_parent is parent:
+            result[rows] = translations
+        elif exact:
+            frame = get_exact_frame(node_parent)
+            for row in rows:
+                if frame is None:
+                    result[row] = get_exact_position(nodes[row])
+                else:
+                    result[row] = (frame*nodes[row].transformation).t
         else:
-            coordinates.append(atom.get_frame_relative_to(parent).t)
-    result = Molecule(numbers, coordinates)
+            frame = get_frame(node_parent)
+            if parent is not None:
+                frame = parent_frame_inv*frame
+            result[rows] = frame*translations
+    if exact and parent is not None:
+        # get_frame_relative_to composes with an identity frame, which may
+        # change the sign of zeros.
+        for row in numpy.flatnonzero((result == 0).any(axis=1)):
+            result[row] = get_exact_position(nodes[row])
+    return result
+
+
+def create_molecule(selected_nodes, parent=None):
+    atoms = list(iter_atoms(selected_nodes))
+    numbers = numpy.zeros(len(atoms), int)
+    for index, atom in enumerate(atoms):
+        numbers[index] = atom.number
+    result = Molecule(numbers, get_coordinates(atoms, parent))
     result.atoms = atoms
     return result
 
@@ -125,3 +207,93 @@ def create_molecular_graph(selected_nodes, parent=None):
     return graph
 
 
+class MolecularGraphEntry(object):
+    def __init__(self, graph, revision):
+        self.graph = graph
+        self.revision = revision
+        self.rings = {}
+
+    def get_rings(self, max_size):
+        result = self.rings.get(max_size)
+        if result is None:
+            match_generator = GraphSearch(RingPattern(max_size))
+            result = list(match_generator(self.graph))
+            self.rings[max_size] = result
+        return result
+
+
+class MolecularGraphCache(object):
+    """Keeps the molecular graphs of the most recently analyzed selections
+
+    An entry is reused as long as the selected nodes, their descendants, their
+    ancestors and the parent frame are not touched by the action manager, see
+    Model.touch. The graphs (and their cached attributes, e.g. neighbors and
+    distances) must be treated as read-only.
+    """
+    size = 8
+
+    def __init__(self):
+        self.entries = []
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries = []
+
+    def get_revision(self, selected_nodes, parent):
+        # the last revision of the model that affects the graph, or None when
+        # some nodes are not part of the model.
+        done = set()
+        def check_ancestors(node, result):
+            while node is not None and node not in done:
+                done.add(node)
+                result = max(result, node.revision)
+                node = node.parent
+            return result
+        result = 0
+        for node in selected_nodes:
+            if node.model is None:
+                return None
+            result = max(result, node.subtree_revision)
+            result = check_ancestors(node.parent, result)
+        if parent is not None:
+            if parent.model is None:
+                return None
+            result = check_ancestors(parent, result)
+        return result
+
+    def get_entry(self, selected_nodes, parent=None):
+        selected_nodes = tuple(selected_nodes)
+        revision = self.get_revision(selected_nodes, parent)
+        if revision is None:
+            self.misses += 1
+            return MolecularGraphEntry(create_molecular_graph(selected_nodes, parent), None)
+        key = (selected_nodes, parent)
+        for index, (other_key, entry) in enumerate(self.entries):
+            if other_key == key:
+                del self.entries[index]
+                if entry.revision == revision:
+                    self.hits += 1
+                    self.entries.append((key, entry))
+                    return entry
+                break
+        self.misses += 1
+        entry = MolecularGraphEntry(create_molecular_graph(selected_nodes, parent), revision)
+        self.entries.append((key, entry))
+        if len(self.entries) > self.size:
+            del self.entries[0]
+        return entry
+
+
+graph_cache = MolecularGraphCache()
+
+
+def get_molecular_graph(selected_nodes, parent=None):
+    """Returns a cached version of create_molecular_graph(selected_nodes, parent)"""
+    return graph_cache.get_entry(selected_nodes, parent).graph
+
+
+def get_rings(selected_nodes, max_size=20, parent=None):
+    """Returns the graph and its rings up to the given size, both cached"""
+    entry = graph_cache.get_entry(selected_nodes, parent)
+    return entry.graph, entry.get_rings(max_size)
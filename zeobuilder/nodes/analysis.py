@@ -69,8 +69,10 @@ def some_fixed(nodes):
 
 def list_classes(nodes):
     result = []
+    seen = set([])
     for node in nodes:
-        if node.__class__ not in result:
+        if node.__class__ not in seen:
+            seen.add(node.__class__)
             result.append(node.__class__)
     return result
 
@@ -82,22 +84,32 @@ def list_children(parents):
 
 def list_parents(nodes):
     result = []
+    seen = set([])
     for node in nodes:
-        if node.parent not in result:
+        if node.parent not in seen:
+            seen.add(node.parent)
             result.append(node.parent)
     return result
 
-def list_without_children(nodes_by_parent, traces_by_parent, selection):
-    selection = set(selection)
+def list_without_children(traces_by_parent, selection):
+    # keeps the order of the selection
+    selected = set(selection)
+    skipped = set([])
     for parent, trace in traces_by_parent.iteritems():
         for super_parent in trace:
-            if super_parent in selection:
-                del nodes_by_parent[parent]
+            if super_parent in selected:
+                skipped.add(parent)
                 break
-    result = []
-    for nodes in nodes_by_parent.itervalues():
-        result.extend(nodes)
-    return result
+    return [node for node in selection if node.parent not in skipped]
+
+def update_list(nodes, added, removed, condition=None):
+    # returns a new list, the original may be in use elsewhere
+    if len(removed) > 0:
+        nodes = [node for node in nodes if node not in removed]
+    if condition is None:
+        return nodes + added
+    else:
+        return nodes + [node for node in added if condition(node)]
 
 def list_by_parent(nodes):
     result = {}
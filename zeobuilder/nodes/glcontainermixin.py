@@ -34,6 +34,7 @@
 
 from parent_mixin import ContainerMixin
 from glmixin import GLMixin
+from spatial_index import SpatialIndex
 
 from zeobuilder import context
 
@@ -42,6 +43,7 @@ __all__ = ["GLContainerMixin"]
 
 
 class GLContainerMixin(ContainerMixin):
+    spatial_index = None
 
     #
     # Tree
@@ -49,16 +51,44 @@ class GLContainerMixin(ContainerMixin):
 
     def add(self, model_object, index=-1):
         ContainerMixin.add(self, model_object, index)
+        if self.spatial_index is not None:
+            self.spatial_index.add(model_object)
         self.invalidate_all_lists()
 
     def add_many(self, model_objects, index=-1):
         ContainerMixin.add_many(self, model_objects, index)
+        if self.spatial_index is not None:
+            self.spatial_index.add_many(model_objects)
         self.invalidate_all_lists()
 
     def remove(self, model_object):
         ContainerMixin.remove(self, model_object)
+        if self.spatial_index is not None:
+            self.spatial_index.remove(model_object)
         self.invalidate_all_lists()
 
+    def remove_many(self, model_objects):
+        ContainerMixin.remove_many(self, model_objects)
+        if self.spatial_index is not None:
+            self.spatial_index.remove_many(model_objects)
+        self.invalidate_all_lists()
+
+    def get_spatial_index(self):
+        # The index is created on demand and kept up to date afterwards.
+        if self.spatial_index is None:
+            self.spatial_index = SpatialIndex(self)
+        return self.spatial_index
+
+    #
+    # Invalidation
+    #
+
+    def invalidate_batch(self):
+        # In batched mode, the batchable children are drawn as a part of the
+        # draw list of their parent.
+        if self.gl_active and context.application.configuration.batched_rendering:
+            self.invalidate_draw_list()
+
     @classmethod
     def check_add(Class, ModelObjectClass):
         if not ContainerMixin.check_add(ModelObjectClass): return False
@@ -77,8 +107,19 @@ class GLContainerMixin(ContainerMixin):
         vb.set_bright(False)
 
     def draw(self):
-        for child in self.children:
-            child.call_list()
+        if context.application.configuration.batched_rendering:
+            vb = context.application.vis_backend
+            batch = vb.create_batch()
+            for child in self.children:
+                if child.batchable and not child.selected:
+                    if child.visible:
+                        child.add_to_batch(batch)
+                else:
+                    child.call_list()
+            vb.draw_batch(batch)
+        else:
+            for child in self.children:
+                child.call_list()
 
 
     #
@@ -55,6 +55,9 @@ class GLMixin(gobject.GObject):
 
     __metaclass__ = NodeClass
     double_sided = False
+    # batchable nodes can be drawn by their parent with add_to_batch when
+    # batched rendering is enabled.
+    batchable = False
 
     #
     # State
@@ -75,6 +78,8 @@ class GLMixin(gobject.GObject):
         elif self.visible != visible:
             self.visible = visible
             self.invalidate_total_list()
+            if self.gl_active:
+                context.application.scene.geometry_revision += 1
 
     properties = [
         Property("visible", True, lambda self: self.visible, set_visible)
@@ -130,6 +135,7 @@ class GLMixin(gobject.GObject):
         del self.draw_list_valid
         del self.boundingbox_list_valid
         del self.total_list_valid
+        context.application.scene.geometry_revision += 1
         if isinstance(self.parent, GLMixin):
             self.parent.invalidate_all_lists()
 
@@ -143,10 +149,12 @@ class GLMixin(gobject.GObject):
             self.draw_list_valid = False
             context.application.main.drawing_area.queue_draw()
             context.application.scene.add_revalidation(self.revalidate_draw_list)
+            context.application.scene.geometry_revision += 1
             self.emit("on-draw-list-invalidated")
             ##print "EMIT %s: on-draw-list-invalidated" % self.get_name()
             if isinstance(self.parent, GLMixin):
                 self.parent.invalidate_boundingbox_list()
+                if self.batchable: self.parent.invalidate_batch()
 
 
     def invalidate_boundingbox_list(self):
@@ -169,6 +177,7 @@ class GLMixin(gobject.GObject):
             ##print "EMIT %s: on-total-list-invalidated" % self.get_name()
             if isinstance(self.parent, GLMixin):
                 self.parent.invalidate_boundingbox_list()
+                if self.batchable: self.parent.invalidate_batch()
 
     def invalidate_all_lists(self):
         self.invalidate_total_list()
@@ -240,6 +249,9 @@ class GLMixin(gobject.GObject):
     def finish_draw(self):
         pass
 
+    def add_to_batch(self, batch):
+        raise NotImplementedError
+
     #
     # Frame
     #
@@ -335,6 +347,9 @@ class GLTransformationMixin(GLMixin):
         self.transformation = transformation
         if not init:
             self.invalidate_transformation_list()
+            spatial_index = getattr(self.parent, "spatial_index", None)
+            if spatial_index is not None:
+                spatial_index.move(self)
 
     properties = [
         Property("transformation", default_transformation, lambda self: self.transformation, set_transformation)
@@ -389,10 +404,12 @@ class GLTransformationMixin(GLMixin):
             self.transformation_list_valid = False
             context.application.main.drawing_area.queue_draw()
             context.application.scene.add_revalidation(self.revalidate_transformation_list)
+            context.application.scene.geometry_revision += 1
             self.emit("on-transformation-list-invalidated")
             ##print "EMIT %s: on-transformation-list-invalidated" % self.get_name()
             if isinstance(self.parent, GLMixin):
                 self.parent.invalidate_boundingbox_list()
+                if self.batchable: self.parent.invalidate_batch()
 
     def invalidate_all_lists(self):
         self.invalidate_transformation_list()
@@ -49,6 +49,10 @@ class NodeInfo(object):
 class Node(gobject.GObject):
     __metaclass__ = NodeClass
 
+    # see Model.touch
+    revision = 0
+    subtree_revision = 0
+
     def __init__(self):
         gobject.GObject.__init__(self)
         self.model = None
@@ -78,7 +82,7 @@ class Node(gobject.GObject):
             if self.model is None:
                 return None
             else:
-                self.model.root.index(self)
+                return self.model.root.index(self)
         else:
             return self.parent.children.index(self)
 
@@ -34,7 +34,94 @@
 from meta import NodeClass, Property
 from reference import Reference
 
-__all__ = ["ParentMixin", "ContainerMixin", "ReferentMixin"]
+__all__ = ["ChildList", "ParentMixin", "ContainerMixin", "ReferentMixin"]
+
+
+class ChildList(list):
+    """A list of children that finds the index of a child in constant time
+
+    The positions of the children are cached in a dictionary. Only the
+    positions before num_valid can be trusted. A change in the list only
+    invalidates the positions from the first changed item on, so adding or
+    removing children one by one does not make the lookups quadratic.
+    """
+
+    def __init__(self, items=()):
+        list.__init__(self, items)
+        self.positions = {}
+        self.num_valid = 0
+
+    def invalidate(self, index):
+        if index < self.num_valid:
+            self.num_valid = max(index, 0)
+
+    def normalize(self, index):
+        if index < 0:
+            index += len(self)
+        return min(max(index, 0), len(self))
+
+    def index(self, item, *args):
+        if len(args) > 0:
+            return list.index(self, item, *args)
+        position = self.positions.get(item)
+        if position is not None and position < self.num_valid:
+            if position < len(self) and list.__getitem__(self, position) is item:
+                return position
+            # the cache is shared with a copy of this list
+            self.num_valid = 0
+        # extend the valid part of the cache up to the item
+        for position in xrange(self.num_valid, len(self)):
+            child = list.__getitem__(self, position)
+            self.positions[child] = position
+            self.num_valid = position + 1
+            if child is item:
+                return position
+        raise ValueError("list.index(x): x not in list")
+
+    def remove(self, item):
+        del self[self.index(item)]
+        self.positions.pop(item, None)
+
+    def insert(self, index, item):
+        index = self.normalize(index)
+        list.insert(self, index, item)
+        self.invalidate(index)
+
+    def pop(self, index=-1):
+        self.invalidate(self.normalize(index))
+        item = list.pop(self, index)
+        self.positions.pop(item, None)
+        return item
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            self.invalidate(index.indices(len(self))[0])
+        else:
+            self.invalidate(self.normalize(index))
+        list.__setitem__(self, index, value)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            self.invalidate(index.indices(len(self))[0])
+        else:
+            self.invalidate(self.normalize(index))
+        list.__delitem__(self, index)
+
+    def __setslice__(self, i, j, sequence):
+        self.invalidate(i)
+        list.__setslice__(self, i, j, sequence)
+
+    def __delslice__(self, i, j):
+        self.invalidate(i)
+        list.__delslice__(self, i, j)
+
+    def sort(self, *args, **kwargs):
+        self.invalidate(0)
+        list.sort(self, *args, **kwargs)
+
+    def reverse(self):
+        self.invalidate(0)
+        list.reverse(self)
 
 
 class ParentMixin(object):
@@ -73,6 +160,8 @@ class ContainerMixin(ParentMixin):
     #
 
     def set_children(self, children, init=False):
+        if not isinstance(children, ChildList):
+            children = ChildList(children)
         self.children = children
         if not init:
             for child in self.children:
@@ -100,11 +189,12 @@ class ContainerMixin(ParentMixin):
     def add_many(self, model_objects, index=-1):
         if index == -1: index = len(self.children)
         #print "ADD MANY TO " + self.name + ":", [model_object.name for model_object in model_objects], index
-        for model_object in model_objects[::-1]:
-            self.children.insert(index, model_object)
+        self.children[index:index] = model_objects
+        for model_object in model_objects:
             model_object.parent = self
             if self.model is not None:
                 model_object.set_model(self.model, self, index)
+            index += 1
 
     def remove(self, model_object):
         #print "REMOVE FROM " + self.name + ":", model_object.name
@@ -113,6 +203,17 @@ class ContainerMixin(ParentMixin):
         model_object.parent = None
         self.children.remove(model_object)
 
+    def remove_many(self, model_objects):
+        #print "REMOVE MANY FROM " + self.name + ":", [model_object.name for model_object in model_objects]
+        for model_object in model_objects:
+            if self.model is not None:
+                model_object.unset_model()
+            model_object.parent = None
+        model_objects = set(model_objects)
+        self.children[:] = [child for child in self.children if child not in model_objects]
+        for model_object in model_objects:
+            self.children.positions.pop(model_object, None)
+
     def delete_referents(self):
         for child in self.children:
             child.delete_referents()
@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+# Zeobuilder is an extensible GUI-toolkit for molecular model construction.
+# Copyright (C) 2007 - 2012 Toon Verstraelen <Toon.Verstraelen@UGent.be>, Center
+# for Molecular Modeling (CMM), Ghent University, Ghent, Belgium; all rights
+# reserved unless otherwise stated.
+#
+# This file is part of Zeobuilder.
+#
+# Zeobuilder is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 3
+# of the License, or (at your option) any later version.
+#
+# In addition to the regulations of the GNU General Public License,
+# publications and communications based in parts on this program or on
+# parts of this program are required to cite the following article:
+#
+# "ZEOBUILDER: a GUI toolkit for the construction of complex molecules on the
+# nanoscale with building blocks", Toon Verstraelen, Veronique Van Speybroeck
+# and Michel Waroquier, Journal of Chemical Information and Modeling, Vol. 48
+# (7), 1530-1541, 2008
+# DOI:10.1021/ci8000748
+#
+# Zeobuilder is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, see <http://www.gnu.org/licenses/>
+#
+#--
+
+
+from glmixin import GLTransformationMixin
+
+from molmod import Translation, angstrom
+
+import numpy
+
+
+__all__ = ["SpatialIndex"]
+
+
+class SpatialIndex(object):
+    """A cell list of the positions of the children of a container
+
+    Only the children with a translation (atoms, frames, points, ...) are
+    indexed, with their position in the frame of the container. When the
+    container has a cell with active cell vectors, the bins wrap around and
+    the distances follow the minimum image convention, like PairSearchIntra.
+
+    The container updates the index when children are added or removed, the
+    children update it when their transformation changes. The index is
+    rebuilt when the list of children or the cell of the container is
+    replaced.
+    """
+
+    def __init__(self, container, bin_size=3.0*angstrom):
+        self.container = container
+        self.bin_size = bin_size
+        self.rebuild()
+
+    def rebuild(self):
+        container = self.container
+        self.children = container.children
+        # periodic containers have a cell attribute
+        self.container_cell = getattr(container, "cell", None)
+        if self.container_cell is None or not self.container_cell.active.any():
+            self.cell = None
+            grid_matrix = numpy.identity(3, float)*self.bin_size
+            self.divisions = numpy.zeros(3, int)
+        else:
+            self.cell = self.container_cell
+            matrix = self.cell.matrix
+            spacings = 1.0/numpy.sqrt((numpy.linalg.inv(matrix)**2).sum(axis=1))
+            divisions = numpy.floor(spacings/self.bin_size).astype(int)
+            divisions[divisions < 1] = 1
+            grid_matrix = matrix/divisions
+            self.divisions = divisions*self.cell.active
+        self.periodic = self.divisions > 0
+        self.grid_matrix = grid_matrix
+        self.grid_inverse = numpy.linalg.inv(grid_matrix)
+        self.grid_spacings = 1.0/numpy.sqrt((self.grid_inverse**2).sum(axis=1))
+
+        self.slots = {}
+        self.nodes = []
+        self.free = []
+        self.positions = numpy.zeros((0, 3), float)
+        self.keys = numpy.zeros((0, 3), int)
+        self.used = numpy.zeros(0, bool)
+        self.bins = {}
+        self.add_many(container.children)
+
+    def check(self):
+        if self.container.children is not self.children or \
+           getattr(self.container, "cell", None) is not self.container_cell:
+            self.rebuild()
+
+    def accept(self, node):
+        return isinstance(node, GLTransformationMixin) and \
+               isinstance(node.transformation, Translation)
+
+    def compute_keys(self, positions):
+        keys = numpy.floor(numpy.dot(positions, self.grid_inverse.transpose())).astype(int)
+        keys[:,self.periodic] %= self.divisions[self.periodic]
+        return keys
+
+    #
+    # Updates
+    #
+
+    def add_many(self, nodes):
+        nodes = [node for node in nodes if self.accept(node) and node not in self.slots]
+        if len(nodes) == 0:
+            return
+        positions = numpy.array([node.transformation.t for node in nodes])
+        keys = self.compute_keys(positions)
+        # assign the slots, reuse the free ones first
+        num_new = max(len(nodes) - len(self.free), 0)
+        slots = self.free[len(self.free)-len(nodes)+num_new:]
+        del self.free[len(self.free)-len(slots):]
+        slots.extend(xrange(len(self.nodes), len(self.nodes) + num_new))
+        self.nodes.extend([None]*num_new)
+        if len(self.nodes) > len(self.positions):
+            capacity = max(len(self.nodes), 2*len(self.positions))
+            self.positions = numpy.resize(self.positions, (capacity, 3))
+            self.keys = numpy.resize(self.keys, (capacity, 3))
+            used = numpy.zeros(capacity, bool)
+            used[:len(self.used)] = self.used
+            self.used = used
+        slots = numpy.array(slots)
+        self.positions[slots] = positions
+        self.keys[slots] = keys
+        self.used[slots] = True
+        for node, slot, key in zip(nodes, slots, keys):
+            self.nodes[slot] = node
+            self.slots[node] = slot
+            key = tuple(key)
+            bin = self.bins.get(key)
+            if bin is None:
+                bin = []
+                self.bins[key] = bin
+            bin.append(slot)
+
+    def add(self, node):
+        self.add_many([node])
+
+    def remove(self, node):
+        slot = self.slots.pop(node, None)
+        if slot is None:
+            return
+        key = tuple(self.keys[slot])
+        bin = self.bins[key]
+        bin.remove(slot)
+        if len(bin) == 0:
+            del self.bins[key]
+        self.nodes[slot] = None
+        self.used[slot] = False
+        self.free.append(slot)
+
+    def remove_many(self, nodes):
+        for node in nodes:
+            self.remove(node)
+
+    def move(self, node):
+        slot = self.slots.get(node)
+        if slot is None or not self.accept(node):
+            # the type of transformation may have changed
+            self.remove(node)
+            self.add(node)
+            return
+        position = node.transformation.t
+        key = tuple(self.compute_keys(position.reshape((1, 3)))[0])
+        self.positions[slot] = position
+        old_key = tuple(self.keys[slot])
+        if key != old_key:
+            bin = self.bins[old_key]
+            bin.remove(slot)
+            if len(bin) == 0:
+                del self.bins[old_key]
+            self.keys[slot] = key
+            bin = self.bins.get(key)
+            if bin is None:
+                bin = []
+                self.bins[key] = bin
+            bin.append(slot)
+
+    #
+    # Queries
+    #
+
+    def shortest_vectors(self, deltas):
+        if self.cell is None:
+            return deltas
+        else:
+            return self.cell.shortest_vector(deltas)
+
+    def get_offsets(self, cutoff):
+        # returns the relative bin keys within the cutoff. Of each pair of
+        # opposite offsets, only one is included. An offset is symmetric
+        # when it is its own opposite, e.g. zero.
+        margins = numpy.ceil(cutoff/self.grid_spacings).astype(int)
+        offsets = numpy.array([
+            (o0, o1, o2)
+            for o0 in xrange(-margins[0], margins[0]+1)
+            for o1 in xrange(-margins[1], margins[1]+1)
+            for o2 in xrange(-margins[2], margins[2]+1)
+        ])
+        lengths = numpy.sqrt((self.grid_matrix**2).sum(axis=0))
+        overlaps = numpy.dot(self.grid_matrix.transpose(), self.grid_matrix)
+        if abs(overlaps - numpy.diag(lengths**2)).max() < 1e-10*lengths.max()**2:
+            # with rectangular bins, drop the ones that are too far away
+            gaps = numpy.maximum(abs(offsets) - 1, 0)*lengths
+            offsets = offsets[(gaps**2).sum(axis=1) <= cutoff**2]
+        offsets[:,self.periodic] %= self.divisions[self.periodic]
+        unique = set(tuple(offset) for offset in offsets.tolist())
+        result = []
+        for offset in sorted(unique):
+            opposite = -numpy.array(offset)
+            opposite[self.periodic] %= self.divisions[self.periodic]
+            opposite = tuple(opposite.tolist())
+            if opposite == offset:
+                result.append((offset, True))
+            elif opposite not in unique or offset < opposite:
+                # without its opposite, the pairs are found only once too
+                result.append((offset, False))
+        return result
+
+    def find(self, position, radius):
+        # returns the slots, deltas and distances within the radius and
+        # a flag that tells whether all bins were inspected
+        g = numpy.dot(self.grid_inverse, position)
+        margins = radius/self.grid_spacings
+        lows = numpy.floor(g - margins).astype(int)
+        highs = numpy.floor(g + margins).astype(int)
+        ranges = []
+        for i in xrange(3):
+            if self.periodic[i]:
+                n = self.divisions[i]
+                if highs[i] - lows[i] + 1 >= n:
+                    ranges.append(range(n))
+                else:
+                    ranges.append([k % n for k in xrange(lows[i], highs[i] + 1)])
+            else:
+                ranges.append(range(lows[i], highs[i] + 1))
+        slots = []
+        exhaustive = len(ranges[0])*len(ranges[1])*len(ranges[2]) >= len(self.bins)
+        if exhaustive:
+            allowed = [set(r) for r in ranges]
+            for key, bin in self.bins.iteritems():
+                if key[0] in allowed[0] and key[1] in allowed[1] and key[2] in allowed[2]:
+                    slots.extend(bin)
+        else:
+            for k0 in ranges[0]:
+                for k1 in ranges[1]:
+                    for k2 in ranges[2]:
+                        bin = self.bins.get((k0, k1, k2))
+                        if bin is not None:
+                            slots.extend(bin)
+        slots = numpy.array(slots, int)
+        deltas = self.shortest_vectors(self.positions[slots] - position)
+        distances = numpy.sqrt((deltas**2).sum(axis=1))
+        mask = distances <= radius
+        slots = slots[mask]
+        deltas = deltas[mask]
+        distances = distances[mask]
+        order = distances.argsort()
+        return slots[order], deltas[order], distances[order], exhaustive
+
+    def query_radius(self, position, radius):
+        """Returns the children within a given distance from a position
+
+        Arguments
+            position  --  a point in the frame of the container
+            radius  --  the maximum distance
+
+        Returns
+            nodes  --  the children, sorted by distance
+            deltas  --  the relative vectors from the position to the children
+            distances  --  the distances from the position to the children
+        """
+        self.check()
+        slots, deltas, distances, exhaustive = self.find(position, radius)
+        return [self.nodes[slot] for slot in slots], deltas, distances
+
+    def query_nearest(self, position, k=1):
+        """Returns the k children closest to a position
+
+        The return values are the same as for query_radius.
+        """
+        self.check()
+        radius = self.grid_spacings.min()
+        while True:
+            slots, deltas, distances, exhaustive = self.find(position, radius)
+            if len(slots) >= k or exhaustive:
+                break
+            radius *= 2
+        return [self.nodes[slot] for slot in slots[:k]], deltas[:k], distances[:k]
+
+    def iter_pairs(self, cutoff, nodes=None):
+        """Iterates over all pairs of children within a cutoff distance
+
+        Arguments
+            cutoff  --  the maximum distance between two children
+
+        Optional argument
+            nodes  --  only consider pairs of these nodes. Nodes that are not
+                       in the index are ignored.
+
+        Yields (node0, node1, delta, distance) in the same way as
+        PairSearchIntra yields (i0, i1, delta, distance), where i0 and i1 are
+        the positions in the list of nodes, or in the list of children when
+        no nodes are given.
+        """
+        self.check()
+        if nodes is None:
+            nodes = self.children
+        nodes = [node for node in nodes if node in self.slots]
+        if len(nodes) < 2:
+            return
+        slots = numpy.array([self.slots[node] for node in nodes])
+        positions = self.positions[slots]
+        keys = self.keys[slots]
+
+        # a dense numbering of the bins, with room for the neighbors
+        margins = numpy.ceil(cutoff/self.grid_spacings).astype(int)
+        lows = keys.min(axis=0) - margins
+        dims = keys.max(axis=0) + margins - lows + 1
+        lows[self.periodic] = 0
+        dims[self.periodic] = self.divisions[self.periodic]
+        def get_ids(keys):
+            shifted = keys - lows
+            return (shifted[:,0]*dims[1] + shifted[:,1])*dims[2] + shifted[:,2]
+        ids = get_ids(keys)
+        order = ids.argsort(kind="mergesort")
+        sorted_ids = ids[order]
+        starts = numpy.concatenate([[True], sorted_ids[1:] != sorted_ids[:-1]]).nonzero()[0]
+        counts = numpy.diff(numpy.concatenate([starts, [len(ids)]]))
+        bin_ids = sorted_ids[starts]
+        bin_keys = keys[order[starts]]
+
+        pairs0 = []
+        pairs1 = []
+        deltas = []
+        distances = []
+        for offset, symmetric in self.get_offsets(cutoff):
+            neighbor_keys = bin_keys + offset
+            neighbor_keys[:,self.periodic] %= self.divisions[self.periodic]
+            neighbor_ids = get_ids(neighbor_keys)
+            found = numpy.searchsorted(bin_ids, neighbor_ids)
+            found[found == len(bin_ids)] = 0
+            mask = bin_ids[found] == neighbor_ids
+            b0 = mask.nonzero()[0]
+            b1 = found[mask]
+            # all combinations of the members of the bins b0 and b1
+            sizes = counts[b0]*counts[b1]
+            total = sizes.sum()
+            if total == 0:
+                continue
+            pair_bins = numpy.repeat(numpy.arange(len(b0)), sizes)
+            within = numpy.arange(total) - numpy.repeat(sizes.cumsum() - sizes, sizes)
+            width = counts[b1][pair_bins]
+            i0 = order[starts[b0][pair_bins] + within/width]
+            i1 = order[starts[b1][pair_bins] + within%width]
+            if symmetric:
+                # both orders of each pair are present
+                mask = i1 < i0
+                i0 = i0[mask]
+                i1 = i1[mask]
+            else:
+                i0, i1 = numpy.maximum(i0, i1), numpy.minimum(i0, i1)
+            pair_deltas = self.shortest_vectors(positions[i1] - positions[i0])
+            pair_distances = numpy.sqrt((pair_deltas**2).sum(axis=1))
+            mask = pair_distances <= cutoff
+            pairs0.append(i0[mask])
+            pairs1.append(i1[mask])
+            deltas.append(pair_deltas[mask])
+            distances.append(pair_distances[mask])
+
+        if len(pairs0) == 0:
+            return
+        pairs0 = numpy.concatenate(pairs0)
+        pairs1 = numpy.concatenate(pairs1)
+        deltas = numpy.concatenate(deltas)
+        distances = numpy.concatenate(distances)
+        order = numpy.lexsort((pairs1, pairs0))
+        for i0, i1, delta, distance in zip(pairs0[order].tolist(), pairs1[order].tolist(), deltas[order], distances[order].tolist()):
+            yield nodes[i0], nodes[i1], delta, distance
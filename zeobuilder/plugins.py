@@ -34,15 +34,26 @@
 
 from zeobuilder import context
 
-import os, imp
+import os, imp, cPickle, sys
 
 
 class PluginCategory(object):
-    def __init__(self, singular, plural, init, authors=[]):
+    def __init__(self, singular, plural, init, authors=[], lazy=None, manifest_attributes=[]):
         self.singular = singular
         self.plural = plural
         self.init = init
         self.authors = authors
+        # When the plugins are loaded lazily (see PluginsCollection), a module
+        # with plugins of this category is imported when
+        #  - lazy="plugin": one of its plugins is used. The init function is
+        #    called for the new plugins only.
+        #  - lazy="category": any plugin of this category is used. All modules
+        #    are then imported before the init function is called.
+        #  - lazy=None: at startup.
+        self.lazy = lazy
+        # The attributes of the plugins that are stored in the manifest. They
+        # are available before the module is imported, see PluginDescription.
+        self.manifest_attributes = manifest_attributes
 
 
 def init_nodes(nodes):
@@ -75,14 +86,21 @@ def init_utility_functions(utility_functions):
 builtin_categories = [
     PluginCategory("plugin_category", "plugin_categories", None),
     PluginCategory("node", "nodes", init_nodes),
-    PluginCategory("action", "actions", init_actions),
-    PluginCategory("load_filter", "load_filters", init_load_filters),
-    PluginCategory("dump_filter", "dump_filters", init_dump_filters),
-    PluginCategory("interactive_group", "interactive_groups", None),
+    PluginCategory("action", "actions", init_actions, lazy="plugin", manifest_attributes=[
+        "description", "menu_info", "interactive_info", "drag_info",
+        "required_modules",
+    ]),
+    PluginCategory("load_filter", "load_filters", init_load_filters, lazy="category"),
+    PluginCategory("dump_filter", "dump_filters", init_dump_filters, lazy="category"),
+    PluginCategory("interactive_group", "interactive_groups", None, lazy="category"),
     PluginCategory("cache_plugin", "cache_plugins", init_cache_plugins),
     PluginCategory("utility_function", "utility_functions", init_utility_functions)
 ]
 
+lazy_plurals = set(
+    category.plural for category in builtin_categories
+    if category.lazy is not None
+)
 
 
 class PluginNotFoundError(Exception):
@@ -91,15 +109,115 @@ class PluginNotFoundError(Exception):
         Exception.__init__(self, "Plugin %s not found" % name)
 
 
+class PluginDescription(object):
+    """Stands in for a plugin whose module is not imported yet.
+
+    The attributes that are stored in the manifest are available right away.
+    Any other use of the plugin imports its module, see
+    PluginsCollection.get_descriptions.
+    """
+    def __init__(self, collection, plural, id, attributes):
+        self.__dict__.update(attributes)
+        self.collection = collection
+        self.category = plural
+        self.id = id
+
+    def get_plugin(self):
+        return self.collection.__dict__[self.category][self.id]
+
+    def __getattr__(self, name):
+        category = self.collection.categories[self.category]
+        if name in category.manifest_attributes:
+            # the plugin does not have this attribute
+            raise AttributeError(name)
+        return getattr(self.get_plugin(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.get_plugin()(*args, **kwargs)
+
+
+class PluginDict(dict):
+    """The plugins of one category, see PluginsCollection.
+
+    The modules that are not imported yet, are imported before the plugins
+    are iterated or looked up.
+    """
+    def __init__(self, collection, plural):
+        dict.__init__(self)
+        self.collection = collection
+        self.plural = plural
+
+    def complete(self, name=None):
+        self.collection.load_pending(self.plural, name)
+
+    def __len__(self):
+        self.complete()
+        return dict.__len__(self)
+
+    def __iter__(self):
+        self.complete()
+        return dict.__iter__(self)
+
+    def __contains__(self, name):
+        self.complete(name)
+        return dict.__contains__(self, name)
+
+    def __getitem__(self, name):
+        self.complete(name)
+        return dict.__getitem__(self, name)
+
+    def get(self, name, default=None):
+        self.complete(name)
+        return dict.get(self, name, default)
+
+    def keys(self):
+        self.complete()
+        return dict.keys(self)
+
+    def values(self):
+        self.complete()
+        return dict.values(self)
+
+    def items(self):
+        self.complete()
+        return dict.items(self)
+
+    def iterkeys(self):
+        self.complete()
+        return dict.iterkeys(self)
+
+    def itervalues(self):
+        self.complete()
+        return dict.itervalues(self)
+
+    def iteritems(self):
+        self.complete()
+        return dict.iteritems(self)
+
+
 class PluginsCollection(object):
-    def __init__(self):
+    """Finds, imports and initializes the plugins.
+
+    A manifest in the user directory records the plugin ids in each module,
+    and the manifest attributes of the plugins (see PluginCategory), together
+    with the modification time of the module. With lazy=True, the modules
+    that only contain lazy categories and that did not change since the
+    manifest was written, are imported on first use.
+    """
+    manifest_version = 2
+
+    def __init__(self, lazy=False):
+        self.lazy = lazy
         self.module_descriptions = set([])
         for directory in context.share_dir, context.user_dir:
             self.find_modules(os.path.join(directory, "plugins"))
         #self.module_descriptions = list(sorted(self.module_descriptions))
+        self.manifest_filename = os.path.join(context.user_dir, "plugins_manifest")
+        self.load_manifest()
         self.load_modules()
         self.all = {}
         self.load_plugins()
+        self.save_manifest()
 
     def find_modules(self, directory):
         if not os.path.isdir(directory):
@@ -111,80 +229,241 @@ class PluginsCollection(object):
             elif filename.endswith(".py"):
                 self.module_descriptions.add((directory, filename[:-3]))
 
+    def load_manifest(self):
+        self.manifest = None
+        if os.path.isfile(self.manifest_filename):
+            try:
+                f = file(self.manifest_filename, "rb")
+                try:
+                    self.manifest = cPickle.load(f)
+                finally:
+                    f.close()
+            except Exception:
+                pass
+        if self.manifest is None or self.manifest.get("version") != self.manifest_version:
+            self.manifest = {"version": self.manifest_version, "categories": None, "modules": {}}
+        self.manifest_changed = False
+
+    def save_manifest(self):
+        if not self.manifest_changed:
+            return
+        # the manifest is only a cache, failures are ignored.
+        try:
+            if not os.path.isdir(context.user_dir):
+                os.mkdir(context.user_dir)
+            # several processes may start at the same time
+            tmp_filename = "%s.%i" % (self.manifest_filename, os.getpid())
+            f = file(tmp_filename, "wb")
+            cPickle.dump(self.manifest, f, 2)
+            f.close()
+            os.rename(tmp_filename, self.manifest_filename)
+        except (IOError, OSError):
+            pass
+
+    def get_manifest_entry(self, filename):
+        # The entry is None when the module is not in the manifest, when it
+        # has changed or when its plugins can not be described in the
+        # manifest.
+        record = self.manifest["modules"].get(filename)
+        if record is not None and record[0] == os.path.getmtime(filename):
+            return record[1]
+
     def load_modules(self):
         self.modules = []
+        self.deferred = {}
         for directory, name in self.module_descriptions:
-            #print name, directory
-            (f, pathname, description) = imp.find_module(name, [directory])
-            try:
-                self.modules.append(imp.load_module(name, f, pathname, description))
-            finally:
-                f.close()
+            filename = os.path.join(directory, "%s.py" % name)
+            entry = self.get_manifest_entry(filename)
+            if self.lazy and entry is not None and lazy_plurals.issuperset(entry):
+                self.deferred[(directory, name)] = entry
+            else:
+                self.import_module(directory, name)
+
+    def import_module(self, directory, name):
+        #print name, directory
+        (f, pathname, description) = imp.find_module(name, [directory])
+        try:
+            module = imp.load_module(name, f, pathname, description)
+        finally:
+            f.close()
+        self.modules.append(module)
+        return module
 
     def load_plugins(self):
-        for category in builtin_categories:
-            self.load_category(category)
-
-        for category in self.plugin_categories.itervalues():
+        self.categories = {}
+        self.initialized = set([])
+        self.pending = {}
+
+        self.load_category(builtin_categories[0])
+        all_categories = builtin_categories + self.plugin_categories.values()
+        plurals = sorted(category.plural for category in all_categories)
+        if plurals != self.manifest["categories"]:
+            # the manifest was written with other plugin categories
+            for description in self.deferred:
+                self.import_module(*description)
+            self.deferred = {}
+            self.manifest["categories"] = plurals
+            self.manifest["modules"] = {}
+        for description, entry in self.deferred.iteritems():
+            for plural, ids in entry.iteritems():
+                pending = self.pending.setdefault(plural, {})
+                for id in ids:
+                    pending[id] = description
+
+        for category in all_categories[1:]:
             self.load_category(category)
 
         for category in builtin_categories:
             self.plugin_categories[category.plural] = category
 
-    def load_category(self, category):
-        d = {}
-        all = []
-
-        def check_required_modules(plugin):
-            if not hasattr(plugin, "required_modules"):
-                plugin.required_modules = []
-                plugin.failed_modules = []
-                return True
-            all_success = True
+        for module in self.modules:
+            self.update_manifest(module)
+
+    def update_manifest(self, module):
+        # __file__ may refer to the compiled module
+        filename = "%s.py" % os.path.splitext(module.__file__)[0]
+        mtime = os.path.getmtime(filename)
+        record = self.manifest["modules"].get(filename)
+        if record is not None and record[0] == mtime:
+            return
+        self.manifest["modules"][filename] = (mtime, self.describe_module(module))
+        self.manifest_changed = True
+
+    def describe_module(self, module):
+        # Returns None when the plugins can not be described in the manifest:
+        # instances of classes that are defined in a plugin module can not be
+        # unpickled before that module is imported.
+        entry = {}
+        for plural, category in self.categories.iteritems():
+            plugins = module.__dict__.get(plural)
+            if plugins is None:
+                continue
+            entry[plural] = {}
+            for id, plugin in plugins.iteritems():
+                attributes = {}
+                for name in category.manifest_attributes:
+                    if hasattr(plugin, name):
+                        value = getattr(plugin, name)
+                        if sys.modules.get(type(value).__module__) in self.modules:
+                            return None
+                        attributes[name] = value
+                entry[plural][id] = attributes
+        return entry
+
+    def get_descriptions(self, plural):
+        """The plugins of a category, without importing pending modules.
+
+        The plugins in modules that are not imported yet, are represented by
+        a PluginDescription.
+        """
+        d = self.__dict__[plural]
+        result = dict(dict.iteritems(d))
+        for id, description in self.pending.get(plural, {}).iteritems():
+            if dict.__contains__(d, id):
+                continue
+            attributes = self.deferred[description][plural][id]
+            plugin = PluginDescription(self, plural, id, attributes)
+            if self.check_required_modules(plugin):
+                result[id] = plugin
+        return result
+
+    def check_required_modules(self, plugin):
+        if not hasattr(plugin, "required_modules"):
+            plugin.required_modules = []
             plugin.failed_modules = []
-            for module_name in plugin.required_modules:
-                try:
-                    f, filename, description = imp.find_module(module_name)
-                    if f is not None:
-                        f.close()
-                except ImportError:
-                    plugin.failed_modules.append(module_name)
-                    all_success = False
-            return all_success
-
+            return True
+        all_success = True
+        plugin.failed_modules = []
+        for module_name in plugin.required_modules:
+            try:
+                f, filename, description = imp.find_module(module_name)
+                if f is not None:
+                    f.close()
+            except ImportError:
+                plugin.failed_modules.append(module_name)
+                all_success = False
+        return all_success
+
+    def add_plugins(self, category, module):
+        # returns the plugins in the module that are added successfully
+        d = self.__dict__[category.plural]
+        result = {}
+        #print "  %s.py" % module.__name__
+        plugins = module.__dict__.get(category.plural)
+        if plugins is not None:
+            for id, plugin in plugins.iteritems():
+                #print "    %s" % id
+                plugin.module = module
+                plugin.category = category.plural
+                plugin.id = id
+                if dict.__contains__(d, id):
+                    plugin.status = "Failed: A plugin with id '%s' already exists in this category." % id
+                elif not self.check_required_modules(plugin):
+                    plugin.status = "Failed: Some required modules could not be found: %s." % plugin.failed_modules
+                else:
+                    plugin.status = "Success"
+                    dict.__setitem__(d, id, plugin)
+                    result[id] = plugin
+                self.all[category.plural].append(plugin)
+        return result
 
+    def load_category(self, category):
         #print category.plural
+        d = PluginDict(self, category.plural)
+        self.__dict__[category.plural] = d
+        self.categories[category.plural] = category
+        self.all[category.plural] = []
         for module in self.modules:
-            #print "  %s.py" % module.__name__
-            plugins = module.__dict__.get(category.plural)
-            if plugins is not None:
-                for id, plugin in plugins.iteritems():
-                    #print "    %s" % id
-                    plugin.module = module
-                    plugin.category = category.plural
-                    plugin.id = id
-                    if id in d:
-                        plugin.status = "Failed: A plugin with id '%s' already exists in this category." % id
-                    elif not check_required_modules(plugin):
-                        plugin.status = "Failed: Some required modules could not be found: %s." % plugin.failed_modules
-                    else:
-                        plugin.status = "Success"
-                        d[id] = plugin
-                    all.append(plugin)
-
-        self.all[category.plural] = all
-
-        if category.init is not None:
-            category.init(d)
+            self.add_plugins(category, module)
 
-        self.__dict__[category.plural] = d
+        if category.lazy != "category" or len(self.pending.get(category.plural, {})) == 0:
+            self.initialized.add(category.plural)
+            if category.init is not None:
+                category.init(dict(dict.iteritems(d)))
 
         def get_plugin(name):
-            plugin = d.get(name)
+            self.load_pending(category.plural, name)
+            plugin = dict.get(d, name)
             if plugin is None:
                 raise PluginNotFoundError(name)
             else:
                 return plugin
         self.__dict__["get_%s" % category.singular] = get_plugin
 
-
+    def load_pending(self, plural, name=None):
+        """Import the modules with plugins of the given category
+
+        When the category is lazy per plugin and a name is given, only the
+        module with that plugin is imported.
+        """
+        category = self.categories[plural]
+        pending = self.pending.get(plural, {})
+        if category.lazy == "plugin" and name is not None:
+            descriptions = [pending[name]] if name in pending else []
+        else:
+            descriptions = set(pending.itervalues())
+        for description in descriptions:
+            self.load_deferred(description)
+        if plural not in self.initialized:
+            self.initialized.add(plural)
+            if category.init is not None:
+                category.init(dict(dict.iteritems(self.__dict__[plural])))
+
+    def load_deferred(self, description):
+        entry = self.deferred.pop(description, None)
+        if entry is None:
+            return
+        for plural, ids in entry.iteritems():
+            pending = self.pending[plural]
+            for id in ids:
+                if pending.get(id) == description:
+                    del pending[id]
+        module = self.import_module(*description)
+        for plural, category in self.categories.iteritems():
+            added = self.add_plugins(category, module)
+            if plural in self.initialized and category.init is not None and len(added) > 0:
+                category.init(added)
+
+    def load_all(self):
+        for plural in self.categories:
+            self.load_pending(plural)
@@ -33,32 +33,66 @@
 
 
 from zeobuilder import context
+from zeobuilder.models import OrderedSet
 from zeobuilder.nodes.parent_mixin import ContainerMixin, ReferentMixin
 from zeobuilder.nodes.glmixin import GLTransformationMixin
 import zeobuilder.nodes.analysis as analysis
 
 from molmod import Translation, Rotation
 
-import gobject
+import gobject, time
 
 
 __all__ = ["SelectionCache"]
 
 
 class SelectionCache(gobject.GObject):
+    """Lazily computes and caches the analysis of the selection
+
+    Each cached variable is computed by a get_* method (or a cache plugin).
+    While a variable is computed, the cache records which other variables
+    it uses. When nodes are (de)selected, the changes are collected and
+    applied the next time a variable is requested: the variables that
+    depend on the selection are updated with their update_* method, or
+    dropped when they have none. Changes to the model clear everything.
+    """
+
     analysis_functions = {}
+    update_functions = {}
 
     def __init__(self):
         gobject.GObject.__init__(self)
         self.waiting_to_emit = False
+        self.reset_statistics()
         self.clear()
 
-    def queue_invalidate(self):
-        self.clear()
+    def queue_emit(self):
         if not self.waiting_to_emit:
             self.waiting_to_emit = True
             gobject.idle_add(self.emit_invalidate)
 
+    def queue_invalidate(self):
+        self.clear()
+        self.queue_emit()
+
+    def queue_select(self, node):
+        if node in self.removed:
+            # the node moves to the end of the selection
+            self.removed.remove(node)
+            self.readded.add(node)
+        self.added.add(node)
+        self.queue_emit()
+
+    def queue_deselect(self, node):
+        if node in self.added:
+            self.added.remove(node)
+            if node in self.readded:
+                self.readded.remove(node)
+                self.removed.add(node)
+        else:
+            self.removed.add(node)
+        self.queue_emit()
+
     def emit_invalidate(self):
         self.emit("cache-invalidated")
         #print "EMIT: cache-invalidated"
@@ -66,18 +100,93 @@ class SelectionCache(gobject.GObject):
 
     def clear(self):
         self.items = {}
+        self.dependents = {}
+        self.evaluating = []
+        self.added = OrderedSet()
+        self.readded = set([])
+        self.removed = set([])
+
+    def reset_statistics(self):
+        self.hits = {}
+        self.misses = {}
+        self.updates = {}
+        self.timings = {}
+
+    def statistics(self):
+        """Returns a list with the usage of each cached variable
+
+        Each item is a tuple (name, hits, misses, updates, time), where time
+        is the total time spent computing the variable after a miss. The
+        most expensive variables come first.
+        """
+        names = set(self.hits) | set(self.misses) | set(self.updates)
+        result = [(
+            name, self.hits.get(name, 0), self.misses.get(name, 0),
+            self.updates.get(name, 0), self.timings.get(name, 0.0),
+        ) for name in names]
+        result.sort(key=(lambda row: row[4]), reverse=True)
+        return result
+
+    def apply_changes(self):
+        added = list(self.added)
+        removed = self.removed | self.readded
+        self.added = OrderedSet()
+        self.readded = set([])
+        self.removed = set([])
+        num_after = len(context.application.model.selection)
+        num_before = num_after - len(added) + len(removed)
+        if num_before == 0 or num_after == 0 or len(added) + len(removed) > num_after:
+            # the fall back to the universe or a large change
+            self.items = {}
+            self.dependents = {}
+            return
+        # all variables that depend on the selection
+        todo = ["nodes"]
+        affected = set(todo)
+        while len(todo) > 0:
+            for dependent in self.dependents.get(todo.pop(), ()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    todo.append(dependent)
+        for name in affected:
+            if name not in self.items:
+                continue
+            update = self.update_functions.get(name)
+            if update is not None:
+                result = update(self, self.items[name], added, removed)
+                if result is not None:
+                    self.items[name] = result
+                    self.updates[name] = self.updates.get(name, 0) + 1
+                    continue
+            del self.items[name]
 
     def __getattr__(self, name):
+        if len(self.added) > 0 or len(self.removed) > 0:
+            self.apply_changes()
+        if len(self.evaluating) > 0:
+            dependents = self.dependents.get(name)
+            if dependents is None:
+                dependents = set([])
+                self.dependents[name] = dependents
+            dependents.add(self.evaluating[-1])
         if name not in self.items:
             function = self.analysis_functions.get(name)
             if function is None:
                 raise AttributeError, "Cached variables %s does not exist." % name
             else:
-                result = function(self)
+                self.evaluating.append(name)
+                t0 = time.time()
+                try:
+                    result = function(self)
+                finally:
+                    self.evaluating.pop()
+                self.timings[name] = self.timings.get(name, 0.0) + time.time() - t0
+                self.misses[name] = self.misses.get(name, 0) + 1
             #print "GET %s: %s" % (name, result)
             self.items[name] = result
             return result
         else:
+            self.hits[name] = self.hits.get(name, 0) + 1
             return self.items[name]
 
     #
@@ -90,7 +199,10 @@ class SelectionCache(gobject.GObject):
         if len(result) == 0:
             return [context.application.model.universe]
         else:
-            return result
+            return list(result)
+
+    def update_nodes(self, nodes, added, removed):
+        return analysis.update_list(nodes, added, removed)
 
     def get_last(self):
         if len(self.nodes) > 0:
@@ -107,6 +219,12 @@ class SelectionCache(gobject.GObject):
     def get_some_nodes_fixed(self):
         return analysis.some_fixed(self.nodes)
 
+    def update_some_nodes_fixed(self, some_nodes_fixed, added, removed):
+        if not some_nodes_fixed:
+            return analysis.some_fixed(added)
+        elif len(removed) == 0:
+            return True
+
     def get_node(self):
         # This one is tricky. Use it when you only want one model object to be selected
         if len(self.nodes) == 1:
@@ -117,22 +235,46 @@ class SelectionCache(gobject.GObject):
     def get_containers(self):
         return [node for node in self.nodes if isinstance(node, ContainerMixin)]
 
+    def update_containers(self, containers, added, removed):
+        return analysis.update_list(containers, added, removed,
+            lambda node: isinstance(node, ContainerMixin))
+
     def get_containers_with_children(self):
         return [container for container in self.containers if len(container.children) > 0]
 
     def get_referents(self):
         return [node for node in self.nodes if isinstance(node, ReferentMixin)]
 
+    def update_referents(self, referents, added, removed):
+        return analysis.update_list(referents, added, removed,
+            lambda node: isinstance(node, ReferentMixin))
+
     def get_referents_with_children(self):
         return [referent for referent in self.referents if len(referent.children) > 0]
 
     def get_classes(self):
         return analysis.list_classes(self.nodes)
 
+    def update_classes(self, classes, added, removed):
+        # the order of first appearance may change after a removal
+        if len(removed) == 0:
+            return classes + [
+                cls for cls in analysis.list_classes(added)
+                if cls not in classes
+            ]
+
     # parents
     def get_parents(self):
         return analysis.list_parents(self.nodes)
 
+    def update_parents(self, parents, added, removed):
+        if len(removed) == 0:
+            known = set(parents)
+            return parents + [
+                parent for parent in analysis.list_parents(added)
+                if parent not in known
+            ]
+
     def get_parent(self):
         if len(self.parents) == 1:
             return self.parents[0]
@@ -165,12 +307,26 @@ class SelectionCache(gobject.GObject):
     def get_transformed_nodes(self):
         return [node for node in self.nodes if isinstance(node, GLTransformationMixin)]
 
+    def update_transformed_nodes(self, transformed_nodes, added, removed):
+        return analysis.update_list(transformed_nodes, added, removed,
+            lambda node: isinstance(node, GLTransformationMixin))
+
     def get_translated_nodes(self):
         return [node for node in self.transformed_nodes if isinstance(node.transformation, Translation)]
 
+    def update_translated_nodes(self, translated_nodes, added, removed):
+        return analysis.update_list(translated_nodes, added, removed,
+            lambda node: isinstance(node, GLTransformationMixin) and
+                         isinstance(node.transformation, Translation))
+
     def get_rotated_nodes(self):
         return [node for node in self.transformed_nodes if isinstance(node.transformation, Rotation)]
 
+    def update_rotated_nodes(self, rotated_nodes, added, removed):
+        return analysis.update_list(rotated_nodes, added, removed,
+            lambda node: isinstance(node, GLTransformationMixin) and
+                         isinstance(node.transformation, Rotation))
+
     def get_translations(self):
         return [node.transformation for node in self.translated_nodes]
 
@@ -227,14 +383,38 @@ class SelectionCache(gobject.GObject):
     def get_traces_by_parent(self):
         return analysis.list_traces_by(self.parents)
 
+    def update_traces_by_parent(self, traces_by_parent, added, removed):
+        # a parent without selected nodes would be left behind after a removal
+        if len(removed) == 0:
+            result = dict(traces_by_parent)
+            result.update(analysis.list_traces_by(
+                parent for parent in analysis.list_parents(added)
+                if parent not in result
+            ))
+            return result
+
     def get_nodes_by_parent(self):
         return analysis.list_by_parent(self.nodes)
 
+    def update_nodes_by_parent(self, nodes_by_parent, added, removed):
+        result = dict(nodes_by_parent)
+        for parent in analysis.list_parents(removed):
+            if parent not in result:
+                return None
+            nodes = [node for node in result[parent] if node not in removed]
+            if len(nodes) > 0:
+                result[parent] = nodes
+            else:
+                del result[parent]
+        for parent, nodes in analysis.list_by_parent(added).iteritems():
+            result[parent] = result.get(parent, []) + nodes
+        return result
+
     def get_nodes_without_children(self):
         #print "DEBUG self.nodes_by_parent:", self.nodes_by_parent
         #print "DEBUG self.traces_by_parent:", self.traces_by_parent
         return analysis.list_without_children(
-            self.nodes_by_parent, self.traces_by_parent, self.nodes
+            self.traces_by_parent, self.nodes
         )
 
     def get_some_nodes_without_children_fixed(self):
@@ -251,6 +431,8 @@ class SelectionCache(gobject.GObject):
 for name, method in SelectionCache.__dict__.iteritems():
     if name.startswith("get"):
         SelectionCache.analysis_functions[name[4:]] = method
+    elif name.startswith("update_"):
+        SelectionCache.update_functions[name[7:]] = method
 
 
 def init_cache_plugins(cache_plugins):
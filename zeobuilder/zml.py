@@ -45,29 +45,42 @@ import xml.sax
 from xml.sax.saxutils import XMLFilterBase, quoteattr, escape
 from xml.sax.xmlreader import AttributesImpl as Attributes
 from xml.sax.handler import ContentHandler
-import base64, numpy, types, StringIO
+import base64, numpy, types, StringIO, zlib
 
 
-__all__ = ["dump_to_file", "load_from_file", "load_from_string"]
+__all__ = [
+    "array_encodings", "dump_to_file", "load_from_file", "load_from_string",
+    "clone_subtree"
+]
 
 
-def dump_to_file(f, node):
+# The supported encodings for numpy arrays:
+#  - text: all cells are written as space separated text (the default).
+#  - base64: the raw bytes of the array are written in base64.
+#  - zlib: the raw bytes of the array are compressed with zlib and written
+#    in base64.
+array_encodings = ["text", "base64", "zlib"]
 
+
+def collect_identifiers(node):
+    """Assign an identifier to each model_object in node that can be copied
+
+    Referents whose targets are not part of node are left out.
+    """
     identifiers = {}
 
-    def dump_stage1(node):
+    def collect_stage1(node):
         cls = node.__class__
         if issubclass(cls, ModelObject):
             identifiers[node] = len(identifiers)
             if issubclass(cls, ContainerMixin):
                 for child in node.children:
-                    dump_stage1(child)
-        elif cls == list:
+                    collect_stage1(child)
+        elif issubclass(cls, list):
             for item in node:
-                dump_stage1(item)
+                collect_stage1(item)
 
-
-    def dump_stage2():
+    def collect_stage2():
         deleted_some = True
         while deleted_some:
             to_be_deleted = []
@@ -81,6 +94,16 @@ def dump_to_file(f, node):
             for model_object in to_be_deleted:
                 del identifiers[model_object]
 
+    collect_stage1(node)
+    collect_stage2()
+    return identifiers
+
+
+def dump_to_file(f, node, array_encoding="text"):
+    if array_encoding not in array_encodings:
+        raise ValueError("Unknown array encoding: %s" % array_encoding)
+
+    identifiers = collect_identifiers(node)
 
     def dump_stage3(indenter, node, use_references, name=None):
         cls = type(node)
@@ -99,7 +122,7 @@ def dump_to_file(f, node):
             indenter.write_line("<int%s>%s</int>" % (name_key, str(node)))
         elif cls == Undefined:
             pass
-        elif cls == list:
+        elif issubclass(cls, list):
             indenter.write_line("<list%s>" % name_key, 1)
             for item in node: dump_stage3(indenter, item, use_references)
             indenter.write_line("</list>", -1)
@@ -114,7 +137,7 @@ def dump_to_file(f, node):
             indenter.write_line("<tuple%s>" % name_key, 1)
             for item in node: dump_stage3(indenter, item, use_references)
             indenter.write_line("</tuple>", -1)
-        elif cls == numpy.ndarray:
+        elif cls == numpy.ndarray and (array_encoding == "text" or node.dtype.hasobject):
             shape = node.shape
             indenter.write_line("<array%s>" % name_key, 1)
             indenter.write("<shape>")
@@ -126,6 +149,19 @@ def dump_to_file(f, node):
                 indenter.write("%s " % value)
             indenter.write("</cells>", True)
             indenter.write_line("</array>", -1)
+        elif cls == numpy.ndarray:
+            indenter.write_line("<array%s dtype=%s>" % (name_key, quoteattr(node.dtype.str)), 1)
+            indenter.write("<shape>")
+            for value in node.shape:
+                indenter.write("%s " % value)
+            indenter.write("</shape>", True)
+            data = numpy.ascontiguousarray(node).tostring()
+            if array_encoding == "zlib":
+                data = zlib.compress(data)
+            indenter.write("<data encoding='%s'>" % array_encoding)
+            indenter.write(base64.b64encode(data))
+            indenter.write("</data>", True)
+            indenter.write_line("</array>", -1)
         elif cls == StringIO.StringIO:
             indenter.write("<binary%s>" % name_key)
             node.seek(0)
@@ -164,8 +200,6 @@ def dump_to_file(f, node):
             raise FilterError, "Can not handle node %s of class %s" % (node, cls)
 
     indenter = Indenter(f)
-    dump_stage1(node)
-    dump_stage2()
     indenter.write_line("<?xml version='1.0'?>")
     indenter.write_line("<zml_file version='0.2'>", 1)
     dump_stage3(indenter, node, False)
@@ -179,142 +213,145 @@ def dump_to_file(f, node):
 
 
 class ZMLTag(object):
+    __slots__ = ["name", "label", "attributes", "content", "children", "target_ids"]
+
+    # only these tags carry character data, whitespace in all other tags is
+    # discarded right away.
+    text_tags = frozenset([
+        "str", "float", "int", "bool", "shape", "cells", "data", "grid",
+        "binary", "expression"
+    ])
+
     def __init__(self, name, attributes):
         self.name = name
-        if "label" in attributes: self.label = str(attributes["label"])
-        else: self.label = None
+        label = attributes.get("label")
+        if label is None: self.label = None
+        else: self.label = str(label)
         self.attributes = attributes
-        if self.name == "binary":
-            self.binary_content = True
-            self.content = StringIO.StringIO()
-        else:
-            self.binary_content = False
-            self.content = ""
-        self.value = None
-        self.being_processed = True
-
-    def add_content(self, content):
-        if self.binary_content: self.content.write(content)
-        else: self.content += content
+        if name in self.text_tags: self.content = []
+        else: self.content = None
+        self.children = []
+        self.target_ids = None
 
-    def close(self):
-        self.being_processed = False
+    def get_content(self):
+        return "".join(self.content)
 
 
 class ZMLHandler(ContentHandler):
     def __init__(self):
         self.root = None
-        self.model_object_tags = {}
-        self.target_ids = {}
-
-        self.hierarchy = []
-        # contains a recursive list of nodes being produced, based on the parsed XML
-        # each item is a list/dict and the last subitem is related to tag not yet closed
-        # in the xml file. The rest of the subitems are completed tags at the same tag-depth. Each
-        # subitem is a ZMLtag object where name may be None or a string.
+        # id -> model_object, filled as soon as a model_object tag is closed
+        self.nodes = {}
+        # referents whose targets were not loaded yet when they were closed
+        self.unresolved = []
+        # the stack of open tags. A tag is dropped as soon as it is closed,
+        # only its value is kept in the children list of the parent tag.
+        self.stack = [ZMLTag(None, {})]
 
     def startElement(self, name, attrs):
         if name == "zml_file":
             if attrs.getValue("version") != "0.2":
                 raise FilterError, "Only format 0.2 is supported in this handler."
         else:
-            new_tag = ZMLTag(name, dict((name, attrs.getValue(name)) for name in attrs.getNames()))
-            if (len(self.hierarchy) == 0) or (self.hierarchy[-1][-1].being_processed):
-                self.hierarchy.append([new_tag])
-            else:
-                self.hierarchy[-1].append(new_tag)
+            self.stack.append(ZMLTag(name, dict((key, attrs.getValue(key)) for key in attrs.getNames())))
 
     def characters(self, content):
-        if len(content) > 0 and len(self.hierarchy) > 0 and len(self.hierarchy[-1]) > 0 and self.hierarchy[-1][-1].being_processed:
-            #print "\"" + content + "\"", len(self.hierarchy), len(self.hierarchy[-1]), self.hierarchy[-1][-1].name
-            self.hierarchy[-1][-1].add_content(content)
+        content_list = self.stack[-1].content
+        if content_list is not None:
+            content_list.append(content)
 
     def endElement(self, name):
         if name == "zml_file": return
         # now that we have gatherd all information of this tag, create an appropriate object
-
-        # first find the tags involved in this operation
-        current_tag = self.hierarchy[-1][-1]
-        child_tags = []
-        if not current_tag.being_processed:
-            current_tag = self.hierarchy[-2][-1]
-            child_tags = self.hierarchy[-1]
+        current_tag = self.stack.pop()
+        child_tags = current_tag.children
 
         # do it
-        if name == "str": current_tag.value = str(current_tag.content)
-        elif name == "float": current_tag.value = float(current_tag.content)
-        elif name == "int": current_tag.value = int(current_tag.content)
+        if name == "str": value = str(current_tag.get_content())
+        elif name == "float": value = float(current_tag.get_content())
+        elif name == "int": value = int(current_tag.get_content())
         elif name == "bool":
-            temp = current_tag.content.lower().strip()
-            if temp == 'true': current_tag.value = True
-            else: current_tag.value = False
-        elif name == "list": current_tag.value = [tag.value for tag in child_tags]
-        elif name == "dict": current_tag.value = dict((tag.label, tag.value) for tag in child_tags)
-        elif name == "tuple": current_tag.value = tuple(tag.value for tag in child_tags)
+            value = (current_tag.get_content().lower().strip() == 'true')
+        elif name == "list": value = [child[2] for child in child_tags]
+        elif name == "dict": value = dict((child[1], child[2]) for child in child_tags)
+        elif name == "tuple": value = tuple(child[2] for child in child_tags)
         elif name == "shape":
-            current_tag.value = tuple(int(item) for item in current_tag.content.split())
+            value = tuple(int(item) for item in current_tag.get_content().split())
         elif name == "cells":
-            current_tag.value = numpy.array([eval(item) for item in current_tag.content.split()])
+            value = numpy.array([eval(item) for item in current_tag.get_content().split()])
+        elif name == "data":
+            value = base64.b64decode(current_tag.get_content())
+            if current_tag.attributes.get("encoding") == "zlib":
+                value = zlib.decompress(value)
         elif name == "array":
-            child_dict = dict((tag.name, tag.value) for tag in child_tags)
-            current_tag.value = numpy.reshape(child_dict["cells"], child_dict["shape"])
+            child_dict = dict((child[0], child[2]) for child in child_tags)
+            if "data" in child_dict:
+                dtype = numpy.dtype(str(current_tag.attributes["dtype"]))
+                cells = numpy.frombuffer(child_dict["data"], dtype).copy()
+            else:
+                cells = child_dict["cells"]
+            value = numpy.reshape(cells, child_dict["shape"])
         elif name == "grid":
-            current_tag.value = numpy.reshape(numpy.array([eval(item) for item in current_tag.content.split()]), (int(current_tag.attributes["rows"]), int(current_tag.attributes["cols"]), -1))
+            value = numpy.reshape(numpy.array([eval(item) for item in current_tag.get_content().split()]), (int(current_tag.attributes["rows"]), int(current_tag.attributes["cols"]), -1))
         elif name == "binary":
-            current_tag.value = StringIO.StringIO()
-            current_tag.content.seek(0)
-            base64.decode(current_tag.content, current_tag.value)
+            value = StringIO.StringIO(base64.decodestring(current_tag.get_content()))
         elif name == "translation":
-            current_tag.value = Translation(child_tags[0].value)
+            value = Translation(child_tags[0][2])
         elif name == "rotation":
-            current_tag.value = Rotation(child_tags[0].value)
+            value = Rotation(child_tags[0][2])
         elif name == "transformation":
-            child_dict = dict((tag.label, tag.value) for tag in child_tags)
-            current_tag.value = Complete(
+            child_dict = dict((child[1], child[2]) for child in child_tags)
+            value = Complete(
                 child_dict["rotation_matrix"],
                 child_dict["translation_vector"],
             )
         elif name == "unit_cell":
-            child_dict = dict((tag.label, tag.value) for tag in child_tags)
-            current_tag.value = UnitCell(
+            child_dict = dict((child[1], child[2]) for child in child_tags)
+            value = UnitCell(
                 child_dict["matrix"],
                 child_dict["active"],
             )
         elif name == "expression":
-            current_tag.value = Expression(current_tag.content)
+            value = Expression(current_tag.get_content())
         elif name == "reference":
-            current_tag.value = None
-            referent_tag = self.hierarchy[-3][-1]
-            target_ids = self.target_ids.get(referent_tag)
-            if target_ids is None:
-                target_ids = []
-                self.target_ids[referent_tag] = target_ids
-            target_ids.append(int(current_tag.attributes["to"]))
+            value = None
+            # the referent is the model_object tag that encloses the targets list
+            referent_tag = self.stack[-2]
+            if referent_tag.target_ids is None:
+                referent_tag.target_ids = []
+            referent_tag.target_ids.append(int(current_tag.attributes["to"]))
         elif name == "model_object":
             Class = context.application.plugins.get_node(str(current_tag.attributes["class"]))
-            current_tag.state = dict((tag.label, tag.value) for tag in child_tags)
-            current_tag.value = Class()
-            self.model_object_tags[int(current_tag.attributes["id"])] = current_tag
-        else: pass
+            state = dict((child[1], child[2]) for child in child_tags)
+            target_ids = current_tag.target_ids
+            if target_ids is None:
+                value = Class(**state)
+            else:
+                targets = [self.nodes.get(target_id) for target_id in target_ids]
+                if None in targets:
+                    # some targets come later in the file (or enclose this
+                    # referent), postpone the initialization of the state
+                    value = Class()
+                    self.unresolved.append((value, state, target_ids))
+                else:
+                    state["targets"] = targets
+                    value = Class(**state)
+            self.nodes[int(current_tag.attributes["id"])] = value
+        else: value = None
 
-        # close the door
-        current_tag.content = None
-        current_tag.close()
-        if len(child_tags) > 0: self.hierarchy.pop()
+        # hand over the value to the parent tag, the current tag is discarded
+        self.stack[-1].children.append((name, current_tag.label, value))
 
     def endDocument(self):
-        self.root = self.hierarchy[0][0].value
-        self.hierarchy = []
-
-        # fix the targets:
-        for referent_tag, target_ids in self.target_ids.iteritems():
-            referent_tag.state["targets"] = [
-                self.model_object_tags[target_id].value for target_id in target_ids
-            ]
+        self.root = self.stack[0].children[0][2]
+        self.stack = []
 
-        # set the states of all the model_objects:
-        for model_object_tag in self.model_object_tags.itervalues():
-            model_object_tag.value.initstate(**model_object_tag.state)
+        # set the states of the referents with forward references:
+        for model_object, state, target_ids in self.unresolved:
+            state["targets"] = [self.nodes[target_id] for target_id in target_ids]
+            model_object.initstate(**state)
+        self.unresolved = []
+        self.nodes = {}
 
 
 class Convertor1(XMLFilterBase):
@@ -433,3 +470,107 @@ def load_from_string(s):
     return root
 
 
+
+
+def clone_subtree(node):
+    """Create a copy of node without a round trip through the ZML format
+
+    The same objects are copied as with dump_to_file followed by
+    load_from_file, but the states of the model_objects are transfered
+    directly with __getstate__ and initstate. References among the copied
+    model_objects are remapped to the copies.
+    """
+    identifiers = collect_identifiers(node)
+    clones = {}
+    unresolved = []
+
+    def clone_value(value, use_references):
+        cls = type(value)
+        if cls == types.InstanceType: cls = value.__class__ # For old style stuff
+
+        if issubclass(cls, str):
+            return str(value)
+        elif issubclass(cls, float):
+            return float(value)
+        elif issubclass(cls, bool):
+            return bool(value)
+        elif issubclass(cls, int):
+            return int(value)
+        elif cls == Undefined:
+            return value
+        elif issubclass(cls, list):
+            result = [clone_value(item, use_references) for item in value]
+            return [item for item in result if not isinstance(item, Undefined)]
+        elif cls == dict:
+            result = {}
+            for key, val in value.iteritems():
+                if not isinstance(key, str):
+                    raise FilterError("ZML supports only strings as dictionary keys.")
+                val = clone_value(val, use_references)
+                if not isinstance(val, Undefined):
+                    result[key] = val
+            return result
+        elif cls == tuple:
+            result = [clone_value(item, use_references) for item in value]
+            return tuple(item for item in result if not isinstance(item, Undefined))
+        elif cls == numpy.ndarray:
+            return value.copy()
+        elif cls == StringIO.StringIO:
+            return StringIO.StringIO(value.getvalue())
+        elif cls == Translation:
+            return Translation(value.t.copy())
+        elif cls == Rotation:
+            return Rotation(value.r.copy())
+        elif cls == Complete:
+            return Complete(value.r.copy(), value.t.copy())
+        elif cls == UnitCell:
+            return UnitCell(value.matrix.copy(), value.active.copy())
+        elif cls == Expression:
+            return Expression(value.code)
+        elif issubclass(cls, ModelObject):
+            if value not in identifiers:
+                return Undefined()
+            elif use_references:
+                return clones.get(value)
+            else:
+                return clone_model_object(value)
+        else:
+            raise FilterError, "Can not handle node %s of class %s" % (value, cls)
+
+    def clone_model_object(model_object):
+        state = {}
+        for key, value in model_object.__getstate__().iteritems():
+            if key == "targets" and isinstance(model_object, ReferentMixin):
+                continue
+            value = clone_value(value, key!="children")
+            if not isinstance(value, Undefined):
+                state[key] = value
+        Class = model_object.__class__
+        if isinstance(model_object, ReferentMixin):
+            targets = model_object.get_targets()
+            if all(target in clones for target in targets):
+                state["targets"] = [clones[target] for target in targets]
+                result = Class(**state)
+            else:
+                # some targets are not copied yet, set the state at the end
+                result = Class()
+                unresolved.append((result, state, targets))
+        else:
+            result = Class(**state)
+        clones[model_object] = result
+        return result
+
+    result = clone_value(node, False)
+
+    # set the states of the referents with forward references:
+    for model_object, state, targets in unresolved:
+        state["targets"] = [clones[target] for target in targets]
+        model_object.initstate(**state)
+
+    if isinstance(result, list):
+        for node in result:
+            if isinstance(node, ParentMixin):
+                node.reparent()
+    elif isinstance(result, ParentMixin):
+        result.reparent()
+    return result